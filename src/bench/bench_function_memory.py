@@ -0,0 +1,89 @@
+import argparse
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from parser.program_parser import DEFAULT_MAX_TREE_COUNT, TSAnalyzer
+from bench.bench_line_index import generate_c_file
+
+
+def get_rss() -> int:
+    """
+    Get the resident set size of the current process in bytes, which is 0 if /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm_file:
+            return int(statm_file.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return 0
+
+
+def get_peak_rss() -> int:
+    """
+    Get the peak resident set size of the current process in bytes.
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def measure(file_count: int, function_count: int, max_tree_count: int) -> Dict[str, float]:
+    """
+    Analyze a synthetic project in a fresh process, and measure the memory and the time of the analysis.
+    :param max_tree_count: the number of parse trees kept in memory
+    """
+    code_in_projects = {
+        f"synthetic_{index}.c": generate_c_file(function_count) for index in range(file_count)
+    }
+    base_rss = get_rss()
+
+    start_time = time.perf_counter()
+    ts_analyzer = TSAnalyzer(code_in_projects, "C", max_tree_count=max_tree_count)
+    analyzer_time = time.perf_counter() - start_time
+    analyzer_rss = get_rss()
+
+    # Visit the parse tree of every function, which re-parses the released trees
+    start_time = time.perf_counter()
+    for function in ts_analyzer.environment.values():
+        ts_analyzer.get_parse_tree_root_node(function)
+    revisit_time = time.perf_counter() - start_time
+
+    return {
+        "functions": len(ts_analyzer.environment),
+        "analyzer_time": analyzer_time,
+        "revisit_time": revisit_time,
+        "rss": analyzer_rss - base_rss,
+        "peak_rss": get_peak_rss() - base_rss,
+        "record_size": sys.getsizeof(next(iter(ts_analyzer.environment.values()))),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the memory of the functions and the parse trees")
+    parser.add_argument("--files", type=int, default=100, help="Specify the number of synthetic C files")
+    parser.add_argument("--functions", type=int, default=200, help="Specify the number of functions per file")
+    parser.add_argument(
+        "--max-trees", type=int, default=DEFAULT_MAX_TREE_COUNT, help="Specify the number of parse trees kept in memory"
+    )
+    args = parser.parse_args()
+
+    settings = [("All trees retained", args.files), (f"LRU of {args.max_trees} trees", args.max_trees)]
+    for (description, max_tree_count) in settings:
+        # Each setting runs in a fresh process so that the peak memory is not shared
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(measure, args.files, args.functions, max_tree_count).result()
+        print(f"{description}:")
+        print(f"    Functions:              {result['functions']}")
+        print(f"    Bytes per record:       {result['record_size']}")
+        print(f"    Resident memory:        {result['rss'] / 1024 / 1024:.1f} MB")
+        print(f"    Peak resident memory:   {result['peak_rss'] / 1024 / 1024:.1f} MB")
+        print(f"    TSAnalyzer:             {result['analyzer_time']:.3f}s")
+        print(f"    Revisit all functions:  {result['revisit_time']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+SRC_PATH = str(Path(__file__).resolve().parent.parent)
+sys.path.append(SRC_PATH)
+
+# The mock server accepts any key, which is set before the keys are read from the environment
+os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+
+from bench.bench_line_index import generate_c_file
+from model.llm import LLM
+from parser.response_parser import parse_verdict, stop_at_verdict
+from pipeline.metascan import MetaScanPipeline
+
+PROMPT_TEMPLATE = """Does the following function check its parameters before using them?
+```
+{function_code}
+```
+Please think step by step and give the answer in the following format:
+Answer: [Your explanation]
+Yes/No.
+"""
+
+# The canned responses, where a verdict line follows the explanation, and the model keeps generating after it
+CANNED_RESPONSES = [
+    "Answer: The function dereferences buf after checking that it is not NULL and that len is positive, "
+    "and the loop index stays within len, so the parameters are checked before they are used.\nYes.\n"
+    "To make the function more robust, c could also be checked against NULL before c->limit is read, "
+    "and the helper could report its errors to the caller instead of ignoring them.",
+    "Answer: The function reads c->limit in the loop without checking whether c is NULL, "
+    "so one of the parameters is used before it is checked.\nNo.\n"
+    "A check of c at the beginning of the function, next to the checks of buf and len, would fix it, "
+    "and the callers passing a NULL context should be reviewed as well.",
+]
+
+
+def start_mock_server(server_args: List[str]) -> tuple:
+    """
+    Start the mock server in a separate process, so that it does not compete with the client for the GIL.
+    :return: the process and the base URL of the server
+    """
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / "mock_llm_server.py"), "--port", "0"] + server_args,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    first_line = process.stdout.readline().strip()
+    if not first_line.startswith("Listening on "):
+        process.kill()
+        raise RuntimeError(f"The mock server failed to start: {first_line}")
+    return (process, first_line[len("Listening on "):])
+
+
+def get_server_stats(base_url: str) -> Dict:
+    with urllib.request.urlopen(base_url + "/stats") as response:
+        return json.loads(response.read())
+
+
+def get_percentile(values: List[float], percent: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def send_prompts(
+    model: LLM, prompts: List[str], mode: str, concurrency: int, stop_condition=None, max_output_tokens: int = None
+) -> tuple:
+    """
+    Send the prompts through LLM.infer in threads, or through the asyncio engine of LLM.infer_batch.
+    :param stop_condition: the stop condition of the streamed responses in the threads mode
+    :param max_output_tokens: the maximal number of output tokens in the threads mode
+    :return: the outputs, and the latencies of the calls of LLM.infer, which are not measured in the batch mode
+    """
+    latencies = []
+    if mode == "batch":
+        results = model.infer_batch(prompts, max_concurrency_per_key=concurrency, tokens_per_minute=10**9)
+        return ([output for (output, _, _) in results], latencies)
+
+    def infer(prompt: str) -> str:
+        start_time = time.perf_counter()
+        (output, _, _) = model.infer(prompt, False, stop_condition, max_output_tokens)
+        latencies.append(time.perf_counter() - start_time)
+        return output
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        outputs = list(executor.map(infer, prompts))
+    return (outputs, latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark a scanner querying an LLM against the local mock server")
+    parser.add_argument("--project-path", type=str, default=None, help="Specify the C project to scan, or omit it for synthetic files")
+    parser.add_argument("--files", type=int, default=4, help="Specify the number of synthetic C files")
+    parser.add_argument("--functions", type=int, default=50, help="Specify the number of functions per synthetic file")
+    parser.add_argument("--mode", choices=["threads", "batch"], default="threads",
+                        help="Send the prompts through LLM.infer in threads, or through the asyncio engine of LLM.infer_batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="Specify the number of concurrent requests")
+    parser.add_argument("--latency", type=float, default=0.05, help="Specify the median latency of the mock server")
+    parser.add_argument("--latency-distribution", type=str, default="lognormal")
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Specify the seconds to generate each output token")
+    parser.add_argument("--stop-at-verdict", action="store_true",
+                        help="Stream the responses and stop them once the verdict line is received, in the threads mode")
+    parser.add_argument("--max-output-tokens", type=int, default=None, help="Specify the cap of the output tokens")
+    args = parser.parse_args()
+
+    if args.project_path is not None:
+        all_files = {}
+        for file_path in Path(args.project_path).rglob("*.[ch]"):
+            all_files[str(file_path)] = file_path.read_text(errors="replace")
+    else:
+        all_files = {f"synthetic_{index}.c": generate_c_file(args.functions) for index in range(args.files)}
+
+    (process, base_url) = start_mock_server(
+        [
+            "--latency", str(args.latency),
+            "--latency-distribution", args.latency_distribution,
+            "--latency-spread", str(args.latency_spread),
+            "--error-rate", str(args.error_rate),
+            "--rate-limit-rate", str(args.rate_limit_rate),
+            "--retry-after", str(args.retry_after),
+            "--token-latency", str(args.token_latency),
+            "--response-mode", "canned",
+            "--canned-response", *CANNED_RESPONSES,
+            "--seed", "0",
+        ]
+    )
+    try:
+        start_time = time.perf_counter()
+        pipeline = MetaScanPipeline("bench_inference", "C", all_files, "gpt-3.5-turbo-0125", "", 0.0, llm_base_url=base_url)
+        prompts = [
+            PROMPT_TEMPLATE.format(function_code=function.function_code)
+            for function in pipeline.ts_analyzer.environment.values()
+        ]
+        parse_time = time.perf_counter() - start_time
+
+        # A warm-up request imports the OpenAI SDK and creates its client, which are not part of the steady state
+        with contextlib.redirect_stdout(io.StringIO()):
+            pipeline.model.infer("warm-up")
+        warm_up_stats = get_server_stats(base_url)
+
+        start_time = time.perf_counter()
+        # The progress messages of each request are discarded, which keeps the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            (outputs, latencies) = send_prompts(
+                pipeline.model,
+                prompts,
+                args.mode,
+                args.concurrency,
+                stop_at_verdict if args.stop_at_verdict else None,
+                args.max_output_tokens,
+            )
+        inference_time = time.perf_counter() - start_time
+        server_stats = get_server_stats(base_url)
+        server_stats = {name: server_stats[name] - warm_up_stats[name] for name in server_stats}
+    finally:
+        process.terminate()
+        process.wait()
+
+    failure_count = sum(1 for output in outputs if output == "")
+    verdict_count = sum(1 for output in outputs if parse_verdict(output) is not None)
+    print(f"Scanned {len(prompts)} functions: parsing {parse_time:.2f}s, inference {inference_time:.2f}s")
+    print(f"Throughput:                   {len(prompts) / inference_time:.1f} requests/s ({failure_count} failed)")
+    print(f"Server requests:              {server_stats['request_count']} "
+          f"({server_stats['rate_limit_count']} rate limited, {server_stats['error_count']} errors)")
+    print(f"Output tokens generated:      {server_stats['generated_token_count']} "
+          f"({server_stats['cancelled_count']} responses cancelled, {verdict_count} verdicts parsed)")
+    server_latency = server_stats["total_latency"] / max(1, server_stats["request_count"])
+    if len(latencies) > 0:
+        print(f"Client latency:               p50 {get_percentile(latencies, 50) * 1000:.1f}ms, "
+              f"p99 {get_percentile(latencies, 99) * 1000:.1f}ms")
+        # The retries are part of the client latency, so the overhead is only meaningful without injected errors
+        print(f"Client overhead per call:     {(statistics.mean(latencies) - server_latency) * 1000:.2f}ms "
+              f"(mean server latency {server_latency * 1000:.1f}ms)")
+    else:
+        print(f"Mean server latency:          {server_latency * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
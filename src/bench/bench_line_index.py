@@ -0,0 +1,111 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from parser.line_index import LineIndex
+from parser.program_parser import TSAnalyzer, TSParser
+
+C_FUNCTION_TEMPLATE = """
+int function_{index}(int *buf, int len, struct ctx *c)
+{{
+    int sum = 0;
+    if (buf == NULL || len <= 0) {{
+        return -1;
+    }}
+    for (int i = 0; i < len; i++) {{
+        sum += buf[i];
+        if (sum > c->limit) {{
+            sum = c->limit;
+        }} else {{
+            helper_{index}(c, sum);
+        }}
+    }}
+    while (sum > 0) {{
+        sum = reduce(sum);
+    }}
+    return sum;
+}}
+"""
+
+
+def generate_c_file(function_count: int) -> str:
+    """
+    Generate a large C file with the given number of functions.
+    :param function_count: The number of functions in the file.
+    """
+    return "".join(C_FUNCTION_TEMPLATE.format(index=index) for index in range(function_count))
+
+
+def bench_lookups(source_code: str, ts_parser: TSParser) -> None:
+    """
+    Compare prefix counting against the line index over the offsets of all the nodes in the file.
+    """
+    source_bytes = bytes(source_code, "utf8")
+    tree = ts_parser.parser.parse(source_bytes)
+    offsets = []
+    cursor = tree.walk()
+    visited_children = False
+    while True:
+        if not visited_children:
+            offsets.append(cursor.node.start_byte)
+            offsets.append(cursor.node.end_byte)
+            if cursor.goto_first_child():
+                continue
+        if cursor.goto_next_sibling():
+            visited_children = False
+        elif cursor.goto_parent():
+            visited_children = True
+        else:
+            break
+
+    start_time = time.perf_counter()
+    prefix_lines = [source_bytes[:offset].count(b"\n") + 1 for offset in offsets]
+    prefix_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    line_index = LineIndex(source_bytes)
+    index_lines = [line_index.line_number(offset) for offset in offsets]
+    index_time = time.perf_counter() - start_time
+
+    assert prefix_lines == index_lines
+    print(f"Offsets looked up:      {len(offsets)}")
+    print(f"Prefix counting:        {prefix_time:.3f}s")
+    print(f"LineIndex with build:   {index_time:.3f}s")
+    print(f"Speedup:                {prefix_time / max(index_time, 1e-9):.1f}x")
+
+
+def bench_analyzer(file_path: str, source_code: str) -> None:
+    """
+    Measure the end-to-end time of extracting the meta data of all the functions in the file.
+    """
+    start_time = time.perf_counter()
+    ts_analyzer = TSAnalyzer({file_path: source_code}, "C")
+    analyzer_time = time.perf_counter() - start_time
+    print(f"TSAnalyzer:             {analyzer_time:.3f}s for {len(ts_analyzer.environment)} functions")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the line index on a large C file")
+    parser.add_argument("--file", type=str, help="Specify a C file. A synthetic file is generated if omitted")
+    parser.add_argument("--functions", type=int, default=1000, help="Specify the number of synthetic functions")
+    args = parser.parse_args()
+
+    if args.file:
+        file_path = args.file
+        with open(file_path, "r") as c_file:
+            source_code = c_file.read()
+    else:
+        file_path = "synthetic.c"
+        source_code = generate_c_file(args.functions)
+    line_count = source_code.count("\n") + 1
+    print(f"File: {file_path} ({len(source_code)} bytes, {line_count} lines)")
+
+    bench_lookups(source_code, TSParser({}, "C"))
+    bench_analyzer(file_path, source_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_PATH = str(Path(__file__).resolve().parent.parent)
+
+# The modules which should not be imported by a scan without inference
+PROVIDER_MODULES = ["openai", "google.generativeai", "replicate", "tiktoken", "networkx"]
+
+# Each measurement runs in a fresh interpreter, so that no module is imported in advance
+STARTUP_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+import scan
+import_time = time.perf_counter() - start_time
+from bench.bench_line_index import generate_c_file
+from pipeline.metascan import MetaScanPipeline
+files = {{f"synthetic_{{index}}.c": generate_c_file({function_count}) for index in range({file_count})}}
+start_time = time.perf_counter()
+MetaScanPipeline("startup", "C", files, "gpt-3.5-turbo-0125", "", 0.0)
+pipeline_time = time.perf_counter() - start_time
+print(json.dumps({{
+    "import_time": import_time,
+    "pipeline_time": pipeline_time,
+    "provider_modules": [name for name in {provider_modules!r} if name in sys.modules],
+}}))
+"""
+
+PROVIDER_IMPORT_SCRIPT = """
+import time
+start_time = time.perf_counter()
+import openai, google.generativeai, replicate, tiktoken
+print(time.perf_counter() - start_time)
+"""
+
+
+def run_python(script: str, env: dict) -> str:
+    completed = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", script],
+        cwd=SRC_PATH,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        text=True,
+    )
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the startup of a metascan without keys or network")
+    parser.add_argument("--runs", type=int, default=5, help="Specify the number of fresh interpreters")
+    parser.add_argument("--files", type=int, default=2, help="Specify the number of synthetic C files")
+    parser.add_argument("--functions", type=int, default=20, help="Specify the number of functions per file")
+    args = parser.parse_args()
+
+    # The keys are removed, and the proxies point to a closed port, so that any network access fails
+    env = {name: value for (name, value) in os.environ.items() if name not in ["OPENAI_API_KEY", "REPLICATE_API_TOKEN", "GEMINI_KEY"]}
+    env.update({"HTTP_PROXY": "http://127.0.0.1:9", "HTTPS_PROXY": "http://127.0.0.1:9"})
+
+    script = STARTUP_SCRIPT.format(function_count=args.functions, file_count=args.files, provider_modules=PROVIDER_MODULES)
+    results = [json.loads(run_python(script, env)) for _ in range(args.runs)]
+    import_times = [result["import_time"] for result in results]
+    pipeline_times = [result["pipeline_time"] for result in results]
+    print(f"Import scan.py:               median {statistics.median(import_times):.3f}s, max {max(import_times):.3f}s")
+    print(f"Construct MetaScanPipeline:   median {statistics.median(pipeline_times):.3f}s, max {max(pipeline_times):.3f}s")
+    print(f"Provider modules imported:    {results[0]['provider_modules'] or 'none'}")
+
+    try:
+        provider_import_time = float(run_python(PROVIDER_IMPORT_SCRIPT, env))
+        print(f"Import the provider SDKs:     {provider_import_time:.3f}s (avoided at startup)")
+    except (subprocess.CalledProcessError, ValueError):
+        print("Import the provider SDKs:     unavailable")
+
+
+if __name__ == "__main__":
+    main()
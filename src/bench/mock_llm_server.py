@@ -0,0 +1,295 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from model.inference_engine import estimate_token_count
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+RESPONSE_MODES = ["echo", "canned"]
+# The output is generated in pieces of a word with its leading whitespace, which stand for the tokens
+TOKEN_PATTERN = re.compile(r"\s*\S+|\s+$")
+
+
+class MockLLMConfig:
+    """
+    The behavior of the mock server, i.e., the latency of the responses, the injected errors, and the outputs.
+    """
+
+    def __init__(
+        self,
+        latency_distribution: str = "fixed",
+        latency: float = 0.0,
+        latency_spread: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        response_mode: str = "echo",
+        canned_responses: List[str] = None,
+        seed: int = None,
+        token_latency: float = 0.0,
+    ) -> None:
+        """
+        :param latency_distribution: "fixed", "uniform" within the spread around the latency,
+        or "lognormal" with the latency as the median and the spread as the sigma
+        :param latency: the latency of a response in seconds
+        :param latency_spread: the spread of the latency
+        :param error_rate: the ratio of the requests failing with 500
+        :param rate_limit_rate: the ratio of the requests failing with 429 and a Retry-After header
+        :param retry_after: the seconds in the Retry-After header
+        :param response_mode: "echo" to return the prompt, or "canned" to return the canned responses in turn
+        :param canned_responses: the canned responses
+        :param seed: the seed of the random latencies and errors
+        :param token_latency: the seconds to generate each output token after the latency of the first token
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        if response_mode not in RESPONSE_MODES:
+            raise ValueError(f"Unknown response mode: {response_mode}")
+        self.latency_distribution = latency_distribution
+        self.latency = latency
+        self.latency_spread = latency_spread
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.response_mode = response_mode
+        self.canned_responses = canned_responses if canned_responses else ["Yes"]
+        self.random = random.Random(seed)
+        self.token_latency = token_latency
+
+    def sample_latency(self) -> float:
+        if self.latency_distribution == "uniform":
+            return max(0.0, self.random.uniform(self.latency - self.latency_spread, self.latency + self.latency_spread))
+        if self.latency_distribution == "lognormal" and self.latency > 0:
+            return self.random.lognormvariate(0.0, self.latency_spread) * self.latency
+        return self.latency
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the OpenAI chat completions API, which serves each request in a thread.
+    It also serves its statistics at GET /stats, so that the overhead of the clients can be told apart from the
+    latency injected by the server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, config: MockLLMConfig) -> None:
+        super().__init__((host, port), MockLLMHandler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.canned_index = 0
+        self.stats = {
+            "request_count": 0,
+            "error_count": 0,
+            "rate_limit_count": 0,
+            "total_latency": 0.0,
+            "generated_token_count": 0,
+            "cancelled_count": 0,
+        }
+
+    def record_generation(self, token_count: int, is_cancelled: bool) -> None:
+        with self.lock:
+            self.stats["generated_token_count"] += token_count
+            self.stats["total_latency"] += token_count * self.config.token_latency
+            if is_cancelled:
+                self.stats["cancelled_count"] += 1
+
+    def get_base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def next_canned_response(self) -> str:
+        with self.lock:
+            response = self.config.canned_responses[self.canned_index % len(self.config.canned_responses)]
+            self.canned_index += 1
+        return response
+
+    def sample_outcome(self) -> tuple:
+        """
+        Sample the latency and the status of a request.
+        :return: the latency in seconds and the status code
+        """
+        with self.lock:
+            latency = self.config.sample_latency()
+            draw = self.config.random.random()
+            status_code = 200
+            if draw < self.config.rate_limit_rate:
+                status_code = 429
+                self.stats["rate_limit_count"] += 1
+            elif draw < self.config.rate_limit_rate + self.config.error_rate:
+                status_code = 500
+                self.stats["error_count"] += 1
+            self.stats["request_count"] += 1
+            self.stats["total_latency"] += latency
+        return (latency, status_code)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are written separately, which would otherwise wait for the delayed ACKs of the client
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+    def send_json(self, status_code: int, body: Dict, headers: Dict[str, str] = None) -> None:
+        payload = json.dumps(body).encode("utf8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for (header_name, header_value) in (headers or {}).items():
+            self.send_header(header_name, header_value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.lock:
+                self.send_json(200, dict(self.server.stats))
+            return
+        self.send_json(404, {"error": {"message": f"Unknown path: {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        (latency, status_code) = self.server.sample_outcome()
+        time.sleep(latency)
+        if status_code == 429:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                {"Retry-After": str(self.server.config.retry_after)},
+            )
+            return
+        if status_code == 500:
+            self.send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            return
+
+        messages = request.get("messages", [])
+        prompt = "".join(message.get("content", "") for message in messages)
+        if self.server.config.response_mode == "echo":
+            output = messages[-1].get("content", "") if len(messages) > 0 else ""
+        else:
+            output = self.server.next_canned_response()
+        output_tokens = TOKEN_PATTERN.findall(output)
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens", request.get("max_completion_tokens"))
+        if max_tokens is not None and len(output_tokens) > max_tokens:
+            output_tokens = output_tokens[:max_tokens]
+            finish_reason = "length"
+        if request.get("stream", False):
+            self.send_stream(request, output_tokens, finish_reason)
+            return
+
+        time.sleep(len(output_tokens) * self.server.config.token_latency)
+        self.server.record_generation(len(output_tokens), False)
+        output = "".join(output_tokens)
+        prompt_tokens = estimate_token_count(prompt)
+        completion_tokens = len(output_tokens)
+        self.send_json(
+            200,
+            {
+                "id": f"chatcmpl-mock-{self.server.stats['request_count']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": finish_reason}
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def send_stream(self, request: Dict, output_tokens: List[str], finish_reason: str) -> None:
+        """
+        Stream the output tokens as server-sent events. The generation stops when the client closes the connection.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(delta: Dict, chunk_finish_reason: str = None) -> None:
+            chunk = {
+                "id": "chatcmpl-mock-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": chunk_finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf8"))
+            self.wfile.flush()
+
+        generated_token_count = 0
+        try:
+            send_event({"role": "assistant", "content": ""})
+            for token in output_tokens:
+                time.sleep(self.server.config.token_latency)
+                generated_token_count += 1
+                send_event({"content": token})
+            send_event({}, finish_reason)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.record_generation(generated_token_count, True)
+            return
+        self.server.record_generation(generated_token_count, False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible mock of the chat completions API")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Specify the host to listen on")
+    parser.add_argument("--port", type=int, default=0, help="Specify the port to listen on, or 0 for a free port")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency", type=float, default=0.0, help="Specify the (median) latency in seconds")
+    parser.add_argument("--latency-spread", type=float, default=0.0, help="Specify the spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Specify the ratio of the requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Specify the ratio of the requests failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Specify the Retry-After seconds of the 429 responses")
+    parser.add_argument("--response-mode", choices=RESPONSE_MODES, default="echo")
+    parser.add_argument("--canned-response", nargs="*", default=None, help="Specify the canned responses")
+    parser.add_argument("--seed", type=int, default=None, help="Specify the seed of the random latencies and errors")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Specify the seconds to generate each output token")
+    args = parser.parse_args()
+
+    config = MockLLMConfig(
+        args.latency_distribution,
+        args.latency,
+        args.latency_spread,
+        args.error_rate,
+        args.rate_limit_rate,
+        args.retry_after,
+        args.response_mode,
+        args.canned_response,
+        args.seed,
+        args.token_latency,
+    )
+    server = MockLLMServer(args.host, args.port, config)
+    # The first line tells the clients where to connect when a free port is chosen
+    print(f"Listening on {server.get_base_url()}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
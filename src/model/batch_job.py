@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Tuple
+
+# The endpoint of the requests in a batch file
+BATCH_ENDPOINT = "/v1/chat/completions"
+# The limit of the requests in a batch file of OpenAI
+DEFAULT_MAX_REQUESTS_PER_JOB = 50000
+DEFAULT_POLL_INTERVAL = 60
+# The statuses of a job after which it no longer changes
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+JOB_STATE_FILE_NAME = "jobs.json"
+
+
+def get_custom_id(*parts: str) -> str:
+    """
+    Get a stable custom id of a request from the parts identifying it, e.g., the scanner, the file path,
+    the function name, and the prompt, so that a re-run writes the same batch file and resumes the same jobs.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(str(part).encode("utf8", errors="surrogatepass") + b"\0")
+    return "request-" + hasher.hexdigest()[:32]
+
+
+class BatchProvider(ABC):
+    """
+    Interface of a provider running batch jobs, which takes a batch file of requests,
+    and returns an output file with a line per request in the format of the OpenAI Batch API.
+    """
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """
+        Submit a batch file.
+        :return: the id of the job
+        """
+
+    @abstractmethod
+    def get_status(self, job_id: str) -> str:
+        """
+        :return: the status of the job, e.g., "in_progress" or one of TERMINAL_STATUSES
+        """
+
+    @abstractmethod
+    def download_results(self, job_id: str, output_path: str) -> None:
+        """
+        Download the output lines of a finished job, including the lines of the failed requests.
+        """
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """
+    The OpenAI Batch API, which completes the jobs within 24 hours at a lower price and out of the rate limits.
+    """
+
+    def __init__(self, key: str, base_url: str = None) -> None:
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=key, base_url=base_url)
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as input_file:
+            input_file_id = self.client.files.create(file=input_file, purpose="batch").id
+        batch = self.client.batches.create(
+            input_file_id=input_file_id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+        )
+        return batch.id
+
+    def get_status(self, job_id: str) -> str:
+        return self.client.batches.retrieve(job_id).status
+
+    def download_results(self, job_id: str, output_path: str) -> None:
+        batch = self.client.batches.retrieve(job_id)
+        with open(output_path, "wb") as output_file:
+            for file_id in [batch.output_file_id, batch.error_file_id]:
+                if file_id is not None:
+                    output_file.write(self.client.files.content(file_id).read())
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    File-based stand-in of a batch provider, which answers the requests locally, e.g., in tests.
+    A job stays in progress for the completion delay, and its output is written when it is first seen completed.
+    """
+
+    def __init__(self, job_dir: str, respond: Callable[[Dict], str] = None, completion_delay: float = 0.0) -> None:
+        """
+        :param job_dir: the directory of the jobs
+        :param respond: the function answering the body of a request, which echoes the last message if it is None
+        :param completion_delay: the seconds for which a job stays in progress
+        """
+        self.job_dir = job_dir
+        self.respond = respond if respond is not None else (lambda body: body["messages"][-1]["content"])
+        self.completion_delay = completion_delay
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def get_job_path(self, job_id: str, file_name: str) -> str:
+        return os.path.join(self.job_dir, job_id, file_name)
+
+    def submit(self, input_path: str) -> str:
+        job_id = "batch-" + hashlib.sha256(f"{input_path}\0{time.time()}".encode("utf8")).hexdigest()[:24]
+        os.makedirs(os.path.join(self.job_dir, job_id))
+        shutil.copyfile(input_path, self.get_job_path(job_id, "input.jsonl"))
+        with open(self.get_job_path(job_id, "job.json"), "w") as job_file:
+            json.dump({"created_time": time.time()}, job_file)
+        return job_id
+
+    def get_status(self, job_id: str) -> str:
+        if os.path.exists(self.get_job_path(job_id, "output.jsonl")):
+            return "completed"
+        with open(self.get_job_path(job_id, "job.json"), "r") as job_file:
+            created_time = json.load(job_file)["created_time"]
+        if time.time() - created_time < self.completion_delay:
+            return "in_progress"
+        self.run_job(job_id)
+        return "completed"
+
+    def run_job(self, job_id: str) -> None:
+        output_lines = []
+        with open(self.get_job_path(job_id, "input.jsonl"), "r") as input_file:
+            for line in input_file:
+                request = json.loads(line)
+                body = request["body"]
+                try:
+                    output = self.respond(body)
+                except Exception as error:
+                    output_lines.append(
+                        {"custom_id": request["custom_id"], "response": None, "error": {"message": repr(error)}}
+                    )
+                    continue
+                prompt_tokens = sum((len(message["content"]) + 3) // 4 for message in body["messages"])
+                completion_tokens = (len(output) + 3) // 4
+                response_body = {
+                    "object": "chat.completion",
+                    "model": body["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+                output_lines.append(
+                    {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": response_body}, "error": None}
+                )
+        write_jsonl(self.get_job_path(job_id, "output.jsonl"), output_lines)
+
+    def download_results(self, job_id: str, output_path: str) -> None:
+        shutil.copyfile(self.get_job_path(job_id, "output.jsonl"), output_path)
+
+
+def write_jsonl(file_path: str, lines: List[Dict]) -> None:
+    """
+    Write the lines to a temporary file first, so that an interrupted run never leaves a partial file.
+    """
+    (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    with os.fdopen(fd, "w") as temp_file:
+        for line in lines:
+            temp_file.write(json.dumps(line, separators=(",", ":")) + "\n")
+    os.replace(temp_path, file_path)
+
+
+class BatchJobRunner:
+    """
+    Runner of the requests of a scan as batch jobs, which writes the requests to batch files,
+    submits them, polls the jobs until they finish, and joins the outputs back to the custom ids.
+    The job ids are saved in the work directory with the digests of the batch files,
+    so that an interrupted run resumes polling the same jobs instead of submitting them again.
+    """
+
+    def __init__(
+        self,
+        provider: BatchProvider,
+        work_dir: str,
+        online_model_name: str,
+        temperature: float,
+        system_role: str,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_requests_per_job: int = DEFAULT_MAX_REQUESTS_PER_JOB,
+    ) -> None:
+        """
+        :param provider: the provider running the jobs
+        :param work_dir: the directory of the batch files, the output files, and the job ids
+        :param poll_interval: the seconds between two polls of the jobs
+        :param max_requests_per_job: the maximal number of requests in a batch file
+        """
+        self.provider = provider
+        self.work_dir = work_dir
+        self.online_model_name = online_model_name
+        self.temperature = temperature
+        self.system_role = system_role
+        self.poll_interval = poll_interval
+        self.max_requests_per_job = max_requests_per_job
+        os.makedirs(self.work_dir, exist_ok=True)
+
+    def get_request_line(self, custom_id: str, message: str) -> Dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": self.online_model_name,
+                "messages": [
+                    {"role": "system", "content": self.system_role},
+                    {"role": "user", "content": message},
+                ],
+                "temperature": self.temperature,
+            },
+        }
+
+    def load_job_state(self) -> Dict[str, str]:
+        state_path = os.path.join(self.work_dir, JOB_STATE_FILE_NAME)
+        if not os.path.exists(state_path):
+            return {}
+        with open(state_path, "r") as state_file:
+            return json.load(state_file)
+
+    def save_job_state(self, job_state: Dict[str, str]) -> None:
+        (fd, temp_path) = tempfile.mkstemp(dir=self.work_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(job_state, temp_file, indent=4, sort_keys=True)
+        os.replace(temp_path, os.path.join(self.work_dir, JOB_STATE_FILE_NAME))
+
+    def write_batch_files(self, requests: Dict[str, str]) -> List[Tuple[str, str]]:
+        """
+        Write the requests to batch files in the order of their custom ids, so that the same requests
+        are written to the same files.
+        :return: the paths and the digests of the batch files
+        """
+        custom_ids = sorted(requests)
+        batch_files = []
+        for start in range(0, len(custom_ids), self.max_requests_per_job):
+            lines = [
+                self.get_request_line(custom_id, requests[custom_id])
+                for custom_id in custom_ids[start : start + self.max_requests_per_job]
+            ]
+            content = "".join(json.dumps(line, separators=(",", ":")) + "\n" for line in lines)
+            digest = hashlib.sha256(content.encode("utf8", errors="surrogatepass")).hexdigest()
+            input_path = os.path.join(self.work_dir, f"batch-{digest[:16]}.jsonl")
+            if not os.path.exists(input_path):
+                write_jsonl(input_path, lines)
+            batch_files.append((input_path, digest))
+        return batch_files
+
+    def run(self, requests: Dict[str, str]) -> Dict[str, Tuple[str, int, int]]:
+        """
+        Run the requests as batch jobs, and wait for all of them.
+        :param requests: the prompts of the requests by their custom ids
+        :return: the (output, input_token_count, output_token_count) tuples by the custom ids.
+        The output of a failed request is an empty string. With a response cache, which keeps the successful
+        outputs, a run of the same requests submits only the failed requests in a new job
+        """
+        job_state = self.load_job_state()
+        pending_jobs = {}
+        for (input_path, digest) in self.write_batch_files(requests):
+            if digest not in job_state:
+                job_state[digest] = self.provider.submit(input_path)
+                self.save_job_state(job_state)
+                print(f"Submitted {os.path.basename(input_path)} as the batch job {job_state[digest]}")
+            pending_jobs[digest] = job_state[digest]
+
+        results = {}
+        while len(pending_jobs) > 0:
+            for (digest, job_id) in list(pending_jobs.items()):
+                status = self.provider.get_status(job_id)
+                if status not in TERMINAL_STATUSES:
+                    continue
+                del pending_jobs[digest]
+                if status != "completed":
+                    # The job is submitted again in the next run
+                    print(f"The batch job {job_id} is {status}")
+                    del job_state[digest]
+                    self.save_job_state(job_state)
+                    continue
+                output_path = os.path.join(self.work_dir, f"output-{digest[:16]}.jsonl")
+                if not os.path.exists(output_path):
+                    self.provider.download_results(job_id, output_path)
+                results.update(self.read_results(output_path))
+            if len(pending_jobs) > 0:
+                time.sleep(self.poll_interval)
+
+        for custom_id in requests:
+            if custom_id not in results:
+                results[custom_id] = ("", 0, 0)
+        return {custom_id: results[custom_id] for custom_id in requests}
+
+    @staticmethod
+    def read_results(output_path: str) -> Dict[str, Tuple[str, int, int]]:
+        results = {}
+        with open(output_path, "r") as output_file:
+            for line in output_file:
+                if line.strip() == "":
+                    continue
+                result = json.loads(line)
+                response = result.get("response")
+                if response is None or response.get("status_code") != 200:
+                    print(f"Batch request {result['custom_id']} failed: {result.get('error') or response}")
+                    results[result["custom_id"]] = ("", 0, 0)
+                    continue
+                body = response["body"]
+                usage = body.get("usage") or {}
+                results[result["custom_id"]] = (
+                    body["choices"][0]["message"]["content"] or "",
+                    usage.get("prompt_tokens", 0),
+                    usage.get("completion_tokens", 0),
+                )
+        return results
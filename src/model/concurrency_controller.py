@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+# The limits of the window, i.e., the number of requests in flight
+DEFAULT_INITIAL_WINDOW = 4
+DEFAULT_MIN_WINDOW = 1
+DEFAULT_MAX_WINDOW = 64
+# The window is multiplied by the factor on an overload
+DEFAULT_DECREASE_FACTOR = 0.5
+# A request is healthy if its latency is within the tolerance times the smoothed latency
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# The throughput is measured over the requests completed in the last seconds
+DEFAULT_THROUGHPUT_PERIOD = 60
+
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD controller of the number of concurrent requests to an LLM provider, which is shared by worker threads.
+    The window grows by one request per window of healthy completions, and is cut multiplicatively
+    when a request is rate limited or times out. The requests which were in flight when the window was cut
+    do not cut it again, so that a burst of 429 errors counts as a single overload.
+    A Retry-After hint of the provider pauses all the requests until it elapses.
+    """
+
+    def __init__(
+        self,
+        initial_window: int = DEFAULT_INITIAL_WINDOW,
+        min_window: int = DEFAULT_MIN_WINDOW,
+        max_window: int = DEFAULT_MAX_WINDOW,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+        latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE,
+        throughput_period: float = DEFAULT_THROUGHPUT_PERIOD,
+    ) -> None:
+        """
+        :param initial_window: the number of concurrent requests at the start
+        :param min_window: the minimal number of concurrent requests
+        :param max_window: the maximal number of concurrent requests
+        :param decrease_factor: the factor multiplying the window on an overload
+        :param latency_tolerance: the ratio of the latency to the smoothed latency above which the window stops growing
+        :param throughput_period: the period in seconds over which the throughput is measured
+        """
+        self.window = float(min(max(initial_window, min_window), max_window))
+        self.min_window = min_window
+        self.max_window = max_window
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.throughput_period = throughput_period
+
+        self.condition = threading.Condition()
+        self.start_time = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease_time = 0.0
+        self.smoothed_latency = None
+        self.completion_times = deque()
+        self.success_count = 0
+        self.overload_count = 0
+        self.error_count = 0
+
+    def acquire(self) -> float:
+        """
+        Wait until the window has room for a request and no Retry-After pause is pending.
+        :return: the start time of the request, which is passed to release
+        """
+        with self.condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.window):
+                    break
+                self.condition.wait(pause if pause > 0 else None)
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, start_time: float, is_success: bool, is_overload: bool = False, retry_after: float = None) -> None:
+        """
+        Complete a request and adapt the window.
+        :param start_time: the start time returned by acquire
+        :param is_success: whether the request succeeded
+        :param is_overload: whether the request failed because of the load, i.e., it was rate limited or timed out.
+        The other failures, e.g., an invalid request, leave the window unchanged
+        :param retry_after: the seconds to wait before the next request, as hinted by the provider
+        """
+        now = time.monotonic()
+        with self.condition:
+            self.in_flight -= 1
+            if is_success:
+                self.success_count += 1
+                self.record_success(now, now - start_time)
+            elif is_overload:
+                self.overload_count += 1
+                # The requests started before the last decrease saw the old window, and do not decrease it again
+                if start_time >= self.last_decrease_time:
+                    self.window = max(float(self.min_window), self.window * self.decrease_factor)
+                    self.last_decrease_time = now
+            else:
+                self.error_count += 1
+            if retry_after is not None and retry_after > 0:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            self.condition.notify_all()
+
+    def record_success(self, now: float, latency: float) -> None:
+        self.completion_times.append(now)
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        is_healthy = latency <= self.latency_tolerance * self.smoothed_latency
+        self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+        if is_healthy:
+            # The window grows by about one request after a window of completions
+            self.window = min(float(self.max_window), self.window + 1.0 / self.window)
+
+    def get_window(self) -> int:
+        with self.condition:
+            return int(self.window)
+
+    def get_throughput(self) -> float:
+        """
+        Get the number of successful requests per second over the throughput period.
+        """
+        with self.condition:
+            now = time.monotonic()
+            while len(self.completion_times) > 0 and now - self.completion_times[0] > self.throughput_period:
+                self.completion_times.popleft()
+            period = min(self.throughput_period, now - self.start_time)
+            return len(self.completion_times) / period if period > 0 else 0.0
+
+    def get_stats(self) -> Dict:
+        """
+        Get the current window, the requests in flight, the throughput, the smoothed latency, and the outcomes.
+        """
+        throughput = self.get_throughput()
+        with self.condition:
+            return {
+                "window": int(self.window),
+                "in_flight": self.in_flight,
+                "throughput": throughput,
+                "smoothed_latency": self.smoothed_latency,
+                "success_count": self.success_count,
+                "overload_count": self.overload_count,
+                "error_count": self.error_count,
+            }
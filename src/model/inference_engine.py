@@ -0,0 +1,407 @@
+import asyncio
+import random
+import sys
+import time
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+from model.token_accounting import get_key_label
+
+# The default limits of each key, which are below the usual quota of a key
+DEFAULT_MAX_CONCURRENCY_PER_KEY = 4
+DEFAULT_TOKENS_PER_MINUTE = 90000
+# The timeout of a request in seconds
+DEFAULT_REQUEST_TIMEOUT = 100
+DEFAULT_MAX_ATTEMPTS = 3
+# The retries back off exponentially from the base delay up to the maximal delay in seconds, with full jitter
+DEFAULT_RETRY_DELAY = 1
+DEFAULT_MAX_RETRY_DELAY = 60
+# The error of the requests which are not sent because the budget of the run is used up
+BUDGET_EXCEEDED_ERROR = "LLM budget exceeded"
+
+# The names of the errors of the provider SDKs, which are matched by name so that the SDKs are not imported
+TIMEOUT_ERROR_NAMES = {"APITimeoutError", "Timeout", "DeadlineExceeded"}
+RETRYABLE_ERROR_NAMES = TIMEOUT_ERROR_NAMES | {"APIConnectionError", "ConnectionError"}
+
+
+def has_error_name(error: BaseException, error_names: set) -> bool:
+    return any(error_type.__name__ in error_names for error_type in type(error).__mro__)
+
+
+def get_status_code(error: BaseException) -> int:
+    """
+    Get the HTTP status code of an error, i.e., the status code of OpenAI errors or the code of google.api_core errors.
+    :return: the status code, or None if the error has none
+    """
+    for attribute in ["status_code", "code"]:
+        status_code = getattr(error, attribute, None)
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Check whether a request failing with the error may succeed later,
+    i.e., it timed out, lost its connection, was rate limited (429), or hit a server error (5xx).
+    The other errors, e.g., an invalid request or key, fail again and are not retried.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if has_error_name(error, RETRYABLE_ERROR_NAMES):
+        return True
+    status_code = get_status_code(error)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Check whether a request failed because the provider is overloaded, i.e., it was rate limited or timed out.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or has_error_name(error, TIMEOUT_ERROR_NAMES):
+        return True
+    return get_status_code(error) == 429
+
+
+def get_retry_after(error: BaseException) -> float:
+    """
+    Get the seconds to wait before a retry from the retry-after-ms or Retry-After header of the response of an error.
+    :return: the seconds, or None if the provider gave no hint
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    for (header_name, scale) in [("retry-after-ms", 0.001), ("retry-after", 1.0)]:
+        try:
+            return max(0.0, float(headers.get(header_name)) * scale)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def get_retry_delay(
+    attempt: int, base_delay: float = DEFAULT_RETRY_DELAY, max_delay: float = DEFAULT_MAX_RETRY_DELAY
+) -> float:
+    """
+    Get the delay before a retry, which grows exponentially with the attempts and is jittered,
+    so that the requests rejected together are not retried together.
+    :param attempt: the number of the failed attempts, starting from 1
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    Estimate the number of tokens of a text without a tokenizer, assuming about 4 characters per token.
+    The estimate is only used to reserve the quota, and is reconciled with the usage reported by the provider.
+    """
+    return (len(text) + 3) // 4
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the tokens per minute of a key.
+    The bucket is refilled continuously, and may go into debt when a request uses more tokens than reserved.
+    """
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = float(tokens_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.refill_rate = tokens_per_minute / 60.0
+        self.updated_time = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_time) * self.refill_rate)
+        self.updated_time = now
+
+    async def acquire(self, token_count: int) -> None:
+        """
+        Wait until the tokens are available, and take them. A request larger than the bucket waits for a full bucket.
+        """
+        token_count = min(float(token_count), self.capacity)
+        while True:
+            self.refill()
+            if self.tokens >= token_count:
+                self.tokens -= token_count
+                return
+            await asyncio.sleep((token_count - self.tokens) / self.refill_rate)
+
+    def settle(self, reserved_count: int, used_count: int) -> None:
+        """
+        Return the unused reservation, or charge the tokens used beyond it.
+        """
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens + min(float(reserved_count), self.capacity) - used_count)
+
+
+class KeySlot:
+    """
+    A key with its concurrency limit and its token bucket.
+    """
+
+    def __init__(self, key_index: int, key: str, max_concurrency: int, tokens_per_minute: int) -> None:
+        self.key_index = key_index
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.active_count = 0
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.client = None  # The client of the provider, which is created on the first request with the key
+
+
+class KeyPool:
+    """
+    Pool of keys, which are handed out in round-robin order.
+    A key with no free slot is skipped, so that a slow key does not hold up the requests of the others.
+    """
+
+    def __init__(self, keys: List[str], max_concurrency_per_key: int, tokens_per_minute: int) -> None:
+        if len(keys) == 0:
+            raise ValueError("The key pool needs at least one key")
+        self.slots = [
+            KeySlot(key_index, key, max_concurrency_per_key, tokens_per_minute) for (key_index, key) in enumerate(keys)
+        ]
+        self.next_index = 0
+
+    def get_total_concurrency(self) -> int:
+        return sum(slot.max_concurrency for slot in self.slots)
+
+    async def acquire(self, token_count: int) -> KeySlot:
+        """
+        Take a slot of the next key with a free slot, and reserve the tokens of the request in the bucket of the key.
+        """
+        slot = self.slots[self.next_index]
+        for offset in range(len(self.slots)):
+            candidate = self.slots[(self.next_index + offset) % len(self.slots)]
+            if candidate.active_count < candidate.max_concurrency:
+                slot = candidate
+                break
+        self.next_index = (slot.key_index + 1) % len(self.slots)
+
+        await slot.semaphore.acquire()
+        slot.active_count += 1
+        try:
+            await slot.token_bucket.acquire(token_count)
+        except BaseException:
+            self.release(slot)
+            raise
+        return slot
+
+    def release(self, slot: KeySlot) -> None:
+        slot.active_count -= 1
+        slot.semaphore.release()
+
+
+class InferenceResult:
+    """
+    The result of a request, which is returned in the order of completion.
+    """
+
+    __slots__ = ("request_id", "output", "input_token_count", "output_token_count", "key_index", "error")
+
+    def __init__(
+        self,
+        request_id: int,
+        output: str,
+        input_token_count: int,
+        output_token_count: int,
+        key_index: int,
+        error: str = None,
+    ) -> None:
+        self.request_id = request_id
+        self.output = output
+        self.input_token_count = input_token_count
+        self.output_token_count = output_token_count
+        self.key_index = key_index
+        self.error = error
+
+
+class InferenceEngine:
+    """
+    Asynchronous inference engine spreading batches of prompts over all the keys.
+    A fixed number of workers, which is the total concurrency of the keys, pull the prompts from a queue,
+    so that the throughput is bounded by the quota of the keys instead of the latency of a single request.
+    Each key is limited by its number of concurrent requests and its tokens per minute.
+    """
+
+    def __init__(
+        self,
+        online_model_name: str,
+        keys: List[str],
+        temperature: float,
+        system_role: str,
+        max_concurrency_per_key: int = DEFAULT_MAX_CONCURRENCY_PER_KEY,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        count_tokens: Callable[[str], int] = estimate_token_count,
+        base_url: str = None,
+        token_ledger=None,
+        scanner_name: str = "default",
+    ) -> None:
+        """
+        :param online_model_name: the name of the model, e.g., gpt-3.5-turbo-0125 or gemini
+        :param keys: the keys of the provider
+        :param max_concurrency_per_key: the maximal number of concurrent requests of each key
+        :param tokens_per_minute: the quota of tokens per minute of each key
+        :param request_timeout: the timeout of a request in seconds
+        :param max_attempts: the maximal number of attempts of a request
+        :param count_tokens: the function estimating the tokens of a text before the request is sent
+        :param base_url: the base URL of an OpenAI-compatible server, or None for the default of the OpenAI SDK
+        :param token_ledger: the TokenLedger recording the usage of the requests, whose budget stops
+        scheduling new requests once it is used up
+        :param scanner_name: the name of the scanner, under which the usage is recorded in the ledger
+        """
+        self.online_model_name = online_model_name
+        self.keys = keys
+        self.temperature = temperature
+        self.system_role = system_role
+        self.max_concurrency_per_key = max_concurrency_per_key
+        self.tokens_per_minute = tokens_per_minute
+        self.request_timeout = request_timeout
+        self.max_attempts = max_attempts
+        self.count_tokens = count_tokens
+        self.base_url = base_url
+        self.token_ledger = token_ledger
+        self.scanner_name = scanner_name
+
+    async def infer_stream(self, messages: List[str]) -> AsyncIterator[InferenceResult]:
+        """
+        Infer a batch of prompts concurrently.
+        :param messages: the prompts, whose indexes are the request ids of the results
+        :return: the results in the order of completion
+        """
+        key_pool = KeyPool(self.keys, self.max_concurrency_per_key, self.tokens_per_minute)
+        request_queue = asyncio.Queue()
+        for request in enumerate(messages):
+            request_queue.put_nowait(request)
+        result_queue = asyncio.Queue()
+
+        async def work() -> None:
+            while not request_queue.empty():
+                (request_id, message) = request_queue.get_nowait()
+                if self.token_ledger is not None and self.token_ledger.is_exhausted():
+                    result_queue.put_nowait(InferenceResult(request_id, "", 0, 0, -1, BUDGET_EXCEEDED_ERROR))
+                    continue
+                result = await self.infer_request(key_pool, request_id, message)
+                if self.token_ledger is not None and result.error is None:
+                    self.token_ledger.record(
+                        self.scanner_name,
+                        self.online_model_name,
+                        get_key_label(self.keys[result.key_index]),
+                        result.input_token_count,
+                        result.output_token_count,
+                    )
+                result_queue.put_nowait(result)
+
+        worker_count = min(len(messages), key_pool.get_total_concurrency())
+        workers = [asyncio.ensure_future(work()) for _ in range(worker_count)]
+        try:
+            for _ in range(len(messages)):
+                yield await result_queue.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # The clients are bound to the event loop of the batch, so their connections are closed with it
+            for slot in key_pool.slots:
+                if slot.client is not None:
+                    await slot.client.close()
+                    slot.client = None
+
+    def infer_batch(self, messages: List[str]) -> List[InferenceResult]:
+        """
+        Infer a batch of prompts concurrently from synchronous code.
+        :return: the results in the order of the prompts
+        """
+
+        async def collect() -> List[InferenceResult]:
+            return [result async for result in self.infer_stream(messages)]
+
+        results = asyncio.run(collect())
+        return sorted(results, key=lambda result: result.request_id)
+
+    async def infer_request(self, key_pool: KeyPool, request_id: int, message: str) -> InferenceResult:
+        """
+        Send a request with a key from the pool, and retry it with backoff on retryable errors.
+        """
+        input_token_count = self.count_tokens(self.system_role) + self.count_tokens(message)
+        error = None
+        retry_after = None
+        key_index = -1
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                # The Retry-After hint of the provider is honored, so that a rate-limited request is not retried early
+                await asyncio.sleep(max(get_retry_delay(attempt), retry_after or 0.0))
+            slot = await key_pool.acquire(input_token_count)
+            key_index = slot.key_index
+            used_token_count = input_token_count
+            try:
+                (output, usage) = await asyncio.wait_for(self.send(slot, message), self.request_timeout)
+                used_token_count = usage.get("total_tokens", input_token_count + self.count_tokens(output))
+                return InferenceResult(
+                    request_id,
+                    output,
+                    usage.get("prompt_tokens", input_token_count),
+                    usage.get("completion_tokens", self.count_tokens(output)),
+                    key_index,
+                )
+            except asyncio.TimeoutError:
+                error = "ChatCompletion call timed out"
+                retry_after = None
+            except Exception:
+                error = f"API error: {sys.exc_info()[1]!r}"
+                retry_after = get_retry_after(sys.exc_info()[1])
+                if not is_retryable_error(sys.exc_info()[1]):
+                    break
+            finally:
+                slot.token_bucket.settle(input_token_count, used_token_count)
+                key_pool.release(slot)
+        print(error)
+        return InferenceResult(request_id, "", input_token_count, 0, key_index, error)
+
+    async def send(self, slot: KeySlot, message: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Send a request to the provider of the model.
+        :return: the output and the token usage reported by the provider
+        """
+        if "gemini" in self.online_model_name:
+            return await self.send_to_gemini(message)
+        return await self.send_to_openai(slot, message)
+
+    async def send_to_openai(self, slot: KeySlot, message: str) -> Tuple[str, Dict[str, int]]:
+        from openai import AsyncOpenAI
+
+        if slot.client is None:
+            # The engine retries the requests itself
+            slot.client = AsyncOpenAI(
+                api_key=slot.key, base_url=self.base_url, timeout=self.request_timeout, max_retries=0
+            )
+        response = await slot.client.chat.completions.create(
+            model=self.online_model_name,
+            messages=[
+                {"role": "system", "content": self.system_role},
+                {"role": "user", "content": message},
+            ],
+            temperature=self.temperature,
+        )
+        usage = {}
+        if response.usage is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        return (response.choices[0].message.content or "", usage)
+
+    async def send_to_gemini(self, message: str) -> Tuple[str, Dict[str, int]]:
+        from model.utils import gemini_safety_settings, load_gemini
+
+        genai = load_gemini()
+        gemini_model = genai.GenerativeModel("gemini-pro")
+        response = await gemini_model.generate_content_async(
+            self.system_role + "\n" + message,
+            safety_settings=gemini_safety_settings,
+            generation_config=genai.types.GenerationConfig(temperature=self.temperature),
+            request_options={"timeout": self.request_timeout},
+        )
+        return (response.text, {})
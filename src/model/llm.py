@@ -1,130 +1,561 @@
 # Imports
-from openai import *
+# The provider SDKs and the tokenizer are imported on their first use, which keeps the startup fast
 from model.utils import *
 from pathlib import Path
-from typing import Tuple
-import google.generativeai as genai
-import replicate
-import signal
+from typing import Callable, Dict, Iterator, List, Tuple
+from model.batch_job import DEFAULT_POLL_INTERVAL, BatchJobRunner, BatchProvider
+from model.concurrency_controller import AdaptiveConcurrencyController
+from model.token_accounting import BudgetExceededError, TokenCounter, TokenLedger, get_key_label
+from model.inference_engine import (
+    BUDGET_EXCEEDED_ERROR,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_REQUEST_TIMEOUT,
+    InferenceEngine,
+    get_retry_after,
+    get_retry_delay,
+    is_overload_error,
+    is_retryable_error,
+)
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 import sys
-import tiktoken
+import tempfile
+import threading
 import time
 
+# The modes of the response cache. A read-only cache is never written, e.g., in CI, and a bypassed cache is not used
+CACHE_MODES = ["read-write", "read-only", "bypass"]
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of the responses of LLMs.
+    An entry is keyed by the provider, the model, the temperature, the system role, and the prompt,
+    and keeps the token counts of the request next to the response.
+    Entries older than the TTL are dropped when they are read,
+    and entries are evicted in the least-recently-used order once the cache exceeds its size cap.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_size: int = 256 * 1024 * 1024,
+        ttl: float = 30 * 24 * 3600,
+        mode: str = "read-write",
+    ) -> None:
+        """
+        :param cache_dir: the directory of the cache entries
+        :param max_size: the maximal total size of the cache entries in bytes
+        :param ttl: the time to live of an entry in seconds, which never expires if it is None
+        :param mode: "read-write", "read-only", or "bypass"
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.mode = mode
+        self.hit_count = 0
+        self.miss_count = 0
+        if self.mode == "read-write":
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_key(provider: str, model_name: str, temperature: float, system_role: str, prompt: str) -> str:
+        hasher = hashlib.sha256(f"{provider}\0{model_name}\0{temperature!r}\0".encode("utf8"))
+        hasher.update(system_role.encode("utf8", errors="surrogatepass") + b"\0")
+        hasher.update(prompt.encode("utf8", errors="surrogatepass"))
+        return hasher.hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def load(self, provider: str, model_name: str, temperature: float, system_role: str, prompt: str) -> Tuple:
+        """
+        Load the response of a request.
+        :return: the (output, input_token_count, output_token_count) tuple, where the token counts are None
+        if they were not measured, or None if the request misses the cache
+        """
+        if self.mode == "bypass":
+            return None
+        entry_path = self.get_entry_path(ResponseCache.get_key(provider, model_name, temperature, system_role, prompt))
+        try:
+            with open(entry_path, "r") as entry_file:
+                entry = json.load(entry_file)
+            if self.ttl is not None and time.time() - entry["created_time"] > self.ttl:
+                if self.mode == "read-write":
+                    self.remove_entry(entry_path)
+                self.miss_count += 1
+                return None
+            if self.mode == "read-write":
+                # Refresh the modification time, which is the recency of the entry in the LRU eviction
+                os.utime(entry_path)
+        except FileNotFoundError:
+            self.miss_count += 1
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # A corrupted entry is dropped and regenerated
+            if self.mode == "read-write":
+                self.remove_entry(entry_path)
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        return (entry["output"], entry["input_token_count"], entry["output_token_count"])
+
+    def store(
+        self,
+        provider: str,
+        model_name: str,
+        temperature: float,
+        system_role: str,
+        prompt: str,
+        output: str,
+        input_token_count: int = None,
+        output_token_count: int = None,
+    ) -> None:
+        """
+        Store the response of a request, unless the cache is read-only or bypassed.
+        """
+        if self.mode != "read-write":
+            return
+        entry_path = self.get_entry_path(ResponseCache.get_key(provider, model_name, temperature, system_role, prompt))
+        entry = {
+            "provider": provider,
+            "model": model_name,
+            "created_time": time.time(),
+            "output": output,
+            "input_token_count": input_token_count,
+            "output_token_count": output_token_count,
+        }
+
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        # Write to a temporary file first so that concurrent scans never read a partial entry
+        (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                json.dump(entry, temp_file)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            self.remove_entry(temp_path)
+
+    def evict(self) -> None:
+        """
+        Evict the least recently used entries until the total size is within the size cap.
+        """
+        if self.mode != "read-write":
+            return
+        entries = []
+        total_size = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for (_, size, entry_path) in entries:
+            if total_size <= self.max_size:
+                break
+            self.remove_entry(entry_path)
+            total_size -= size
+
+    @staticmethod
+    def remove_entry(entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+def load_encoding():
+    """
+    Load the tokenizer measuring the token cost. We only use gpt-3.5 to measure token cost
+    """
+    import tiktoken
+
+    return tiktoken.encoding_for_model("gpt-3.5-turbo-0125")
+
+
 class LLM:
     """
     An online inference model using different LLMs, including gemini, gpt-3.5, and gpt-4
     """
 
     def __init__(
-        self, online_model_name: str, openai_key: str, temperature: float
+        self,
+        online_model_name: str,
+        openai_key: str,
+        temperature: float,
+        response_cache: ResponseCache = None,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        concurrency_controller: AdaptiveConcurrencyController = None,
+        base_url: str = None,
+        token_ledger: TokenLedger = None,
+        scanner_name: str = "default",
+        prompt_templates: List[str] = None,
     ) -> None:
+        """
+        :param response_cache: the on-disk cache of the responses, which is disabled if it is None
+        :param request_timeout: the timeout of a request in seconds
+        :param max_attempts: the maximal number of attempts of a request
+        :param concurrency_controller: the controller limiting the concurrent requests, which are unlimited if it is None
+        :param base_url: the base URL of an OpenAI-compatible server, e.g., a local mock server,
+        or None for the default of the OpenAI SDK, which honors OPENAI_BASE_URL
+        :param token_ledger: the ledger of the tokens and the cost of the run, which may limit them by a budget
+        :param scanner_name: the name of the scanner, under which the tokens are recorded in the ledger
+        :param prompt_templates: the templates of the prompts of the scanner, e.g., in prompt/apiscan_prompt.py,
+        whose fixed prefixes are counted only once
+        """
         self.online_model_name = online_model_name
-        self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo-0125") # We only use gpt-3.5 to measure token cost
+        # The tokenizer is loaded on the first measurement of the token cost, which may download the encoding
+        self.token_counter = TokenCounter(load_encoding)
+        for prompt_template in prompt_templates or []:
+            self.token_counter.add_template(prompt_template)
         self.openai_key = openai_key
         self.temperature = temperature
         self.systemRole = "You are a experienced programmer and good at understanding programs written in mainstream programming languages."
+        self.response_cache = response_cache
+        self.request_timeout = request_timeout
+        self.max_attempts = max_attempts
+        self.concurrency_controller = concurrency_controller
+        self.base_url = base_url
+        self.token_ledger = token_ledger
+        self.scanner_name = scanner_name
+        self.request_state = threading.local()  # The key of the current request of each thread
+        self.openai_clients = {}  # The OpenAI clients of the keys, which are thread-safe and reused across requests
+        self.openai_client_lock = threading.Lock()  # The lock of the lazy creation of the OpenAI clients
         return
 
+    @property
+    def encoding(self):
+        """
+        The tokenizer measuring the token cost. We only use gpt-3.5 to measure token cost
+        """
+        return self.token_counter.get_encoding()
+
+    def get_provider(self) -> str:
+        if "gemini" in self.online_model_name:
+            return "gemini"
+        # The responses of another server are cached apart from those of OpenAI
+        return "openai" if self.base_url is None else "openai@" + self.base_url
+
     def infer(
-        self, message: str, is_measure_cost: bool = False
+        self,
+        message: str,
+        is_measure_cost: bool = False,
+        stop_condition: Callable[[str], bool] = None,
+        max_output_tokens: int = None,
     ) -> Tuple[str, int, int]:
+        """
+        Infer a prompt. With a stop condition, the response is streamed, and its generation is cancelled
+        as soon as the condition is met by the text received so far, e.g., stop_at_verdict in parser/response_parser.py
+        :param stop_condition: the function checking the text received so far, or None to wait for the whole response
+        :param max_output_tokens: the maximal number of output tokens, which is unlimited if it is None
+        :return: the output, and the input and output token costs if they are measured
+        """
+        cache_variant = LLM.get_cache_variant(stop_condition, max_output_tokens)
+        cached_response = self.load_cached_response(message, is_measure_cost, cache_variant)
+        if cached_response is not None:
+            return cached_response
+        if self.token_ledger is not None:
+            self.token_ledger.check_budget()
+
         print(self.online_model_name, "is running")
         output = ""
         if "gemini" in self.online_model_name:
-            output = self.infer_with_gemini(message)
+            output = self.infer_with_gemini(message, stop_condition, max_output_tokens)
         elif "gpt" in self.online_model_name:
-            output = self.infer_with_openai_model(message)
-        input_token_cost = (
-            0
-            if not is_measure_cost
-            else len(self.encoding.encode(self.systemRole))
-            + len(self.encoding.encode(message))
+            output = self.infer_with_openai_model(message, stop_condition, max_output_tokens)
+        if not is_measure_cost and self.token_ledger is None:
+            # The costs are measured on demand when the cached response is loaded
+            self.store_response(message, output, None, None, cache_variant)
+            return output, 0, 0
+        (input_token_cost, output_token_cost) = self.measure_cost(message, output)
+        if self.token_ledger is not None and output != "":
+            self.token_ledger.record(
+                self.scanner_name,
+                self.online_model_name,
+                getattr(self.request_state, "key_label", "key"),
+                input_token_cost,
+                output_token_cost,
+            )
+        self.store_response(message, output, input_token_cost, output_token_cost, cache_variant)
+        if not is_measure_cost:
+            return output, 0, 0
+        return output, input_token_cost, output_token_cost
+
+    @staticmethod
+    def get_cache_variant(stop_condition: Callable[[str], bool], max_output_tokens: int) -> str:
+        """
+        Get the variant of the cached responses, which tells the truncated responses apart from the whole ones.
+        A stop condition is identified by its module and qualified name
+        :return: the variant, or None if the stop condition is anonymous, e.g., a lambda, a local function,
+        or a partial, whose responses bypass the cache
+        """
+        if stop_condition is None and max_output_tokens is None:
+            return ""
+        stop_name = ""
+        if stop_condition is not None:
+            qualified_name = getattr(stop_condition, "__qualname__", None)
+            if qualified_name is None or "<" in qualified_name:
+                return None
+            stop_name = f"{stop_condition.__module__}.{qualified_name}"
+        return f"stop={stop_name};max_output_tokens={max_output_tokens}"
+
+    def get_cache_provider(self, cache_variant: str) -> str:
+        return self.get_provider() if cache_variant == "" else self.get_provider() + "#" + cache_variant
+
+    def measure_cost(self, message: str, output: str) -> Tuple[int, int]:
+        """
+        Measure the input and the output token costs of a request,
+        where the system role and the registered template prefixes are encoded only once
+        """
+        input_token_cost = self.token_counter.count_prompt(self.systemRole, message)
+        output_token_cost = self.token_counter.count(output)
+        return input_token_cost, output_token_cost
+
+    def measure_costs(self, messages: List[str], outputs: List[str]) -> List[Tuple[int, int]]:
+        """
+        Measure the input and the output token costs of the requests in a batch
+        """
+        input_token_costs = self.token_counter.count_prompts(self.systemRole, messages)
+        output_token_costs = self.token_counter.count_batch(outputs)
+        return list(zip(input_token_costs, output_token_costs))
+
+    def load_cached_response(self, message: str, is_measure_cost: bool, cache_variant: str = "") -> Tuple[str, int, int]:
+        """
+        Load the response of a request from the response cache
+        :return: the (output, input_token_cost, output_token_cost) tuple, or None if the request misses the cache
+        """
+        return self.load_cached_responses([message], is_measure_cost, cache_variant)[0]
+
+    def load_cached_responses(
+        self, messages: List[str], is_measure_cost: bool, cache_variant: str = ""
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Load the responses of the requests from the response cache,
+        where the costs not measured when the responses were stored are measured in a batch
+        :param cache_variant: the variant of the responses, which bypasses the cache if it is None
+        :return: the (output, input_token_cost, output_token_cost) tuples, which are None for the missed requests
+        """
+        if self.response_cache is None or cache_variant is None:
+            return [None] * len(messages)
+        outputs = []
+        unmeasured_indexes = []
+        for message in messages:
+            cached_response = self.response_cache.load(
+                self.get_cache_provider(cache_variant), self.online_model_name, self.temperature, self.systemRole, message
+            )
+            if cached_response is None:
+                outputs.append(None)
+                continue
+            (output, input_token_cost, output_token_cost) = cached_response
+            if not is_measure_cost:
+                outputs.append((output, 0, 0))
+                continue
+            if input_token_cost is None or output_token_cost is None:
+                # The costs were not measured when the response was stored
+                unmeasured_indexes.append(len(outputs))
+            outputs.append((output, input_token_cost, output_token_cost))
+
+        costs = self.measure_costs(
+            [messages[index] for index in unmeasured_indexes], [outputs[index][0] for index in unmeasured_indexes]
+        )
+        for (index, (input_token_cost, output_token_cost)) in zip(unmeasured_indexes, costs):
+            outputs[index] = (outputs[index][0], input_token_cost, output_token_cost)
+        return outputs
+
+    def store_response(
+        self, message: str, output: str, input_token_cost: int, output_token_cost: int, cache_variant: str = ""
+    ) -> None:
+        """
+        Store the response of a request in the response cache. Failed requests with empty outputs are not stored,
+        nor are the responses of a None variant
+        """
+        if self.response_cache is None or output == "" or cache_variant is None:
+            return
+        self.response_cache.store(
+            self.get_cache_provider(cache_variant),
+            self.online_model_name,
+            self.temperature,
+            self.systemRole,
+            message,
+            output,
+            input_token_cost,
+            output_token_cost,
         )
-        output_token_cost = (
-            0 if not is_measure_cost else len(self.encoding.encode(output))
+
+    def infer_batch(
+        self, messages: List[str], is_measure_cost: bool = False, max_concurrency_per_key: int = 4, tokens_per_minute: int = 90000
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Infer a batch of prompts concurrently, spreading them over all the keys
+        :param max_concurrency_per_key: the maximal number of concurrent requests of each key
+        :param tokens_per_minute: the quota of tokens per minute of each key
+        :return: the (output, input_token_cost, output_token_cost) tuples in the order of the prompts
+        """
+        outputs = self.load_cached_responses(messages, is_measure_cost)
+        missed_indexes = [index for (index, output) in enumerate(outputs) if output is None]
+        if len(missed_indexes) == 0:
+            return outputs
+
+        keys = [os.environ.get("GEMINI_KEY", "")] if "gemini" in self.online_model_name else get_standard_keys()
+        engine = InferenceEngine(
+            self.online_model_name,
+            keys,
+            self.temperature,
+            self.systemRole,
+            max_concurrency_per_key,
+            tokens_per_minute,
+            self.request_timeout,
+            self.max_attempts,
+            base_url=self.base_url,
+            token_ledger=self.token_ledger,
+            scanner_name=self.scanner_name,
         )
-        return output, input_token_cost, output_token_cost
+        results = engine.infer_batch([messages[index] for index in missed_indexes])
+        self.report_skipped_requests(sum(1 for result in results if result.error == BUDGET_EXCEEDED_ERROR))
+        for (index, result) in zip(missed_indexes, results):
+            # The token counts reported by the provider are cached whether or not the costs are measured
+            self.store_response(messages[index], result.output, result.input_token_count, result.output_token_count)
+            if not is_measure_cost:
+                outputs[index] = (result.output, 0, 0)
+            else:
+                outputs[index] = (result.output, result.input_token_count, result.output_token_count)
+        return outputs
 
-    def infer_with_gemini(self, message: str) -> str:
+    def infer_adaptive(
+        self,
+        messages: List[str],
+        is_measure_cost: bool = False,
+        stop_condition: Callable[[str], bool] = None,
+        max_output_tokens: int = None,
+    ) -> List[Tuple[str, int, int]]:
         """
-        Infer using the Gemini model from Google Generative AI
+        Infer a batch of prompts in worker threads, whose concurrent requests follow the window of the
+        concurrency controller, so that the concurrency tracks the rate limits of the provider
+        :param stop_condition: the stop condition of the streamed responses, as in infer
+        :param max_output_tokens: the maximal number of output tokens of each response
+        :return: the (output, input_token_cost, output_token_cost) tuples in the order of the prompts
         """
-        def timeout_handler(signum, frame):
-            raise TimeoutError("ChatCompletion timeout")
+        if self.concurrency_controller is None:
+            self.concurrency_controller = AdaptiveConcurrencyController()
+        max_workers = max(1, min(len(messages), self.concurrency_controller.max_window))
+
+        def infer(message: str) -> Tuple[str, int, int]:
+            try:
+                return self.infer(message, is_measure_cost, stop_condition, max_output_tokens)
+            except BudgetExceededError:
+                return None
 
-        def simulate_ctrl_c(signal, frame):
-            raise KeyboardInterrupt("Simulating Ctrl+C")
+        with ThreadPoolExecutor(max_workers) as executor:
+            outputs = list(executor.map(infer, messages))
+        self.report_skipped_requests(sum(1 for output in outputs if output is None))
+        outputs = [output if output is not None else ("", 0, 0) for output in outputs]
+        stats = self.concurrency_controller.get_stats()
+        print(
+            f"Concurrency window: {stats['window']}, throughput: {stats['throughput']:.2f} requests/s, "
+            f"{stats['overload_count']} overloads"
+        )
+        return outputs
 
+    def infer_batch_job(
+        self,
+        requests: Dict[str, str],
+        batch_provider: BatchProvider,
+        work_dir: str,
+        is_measure_cost: bool = False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> Dict[str, Tuple[str, int, int]]:
+        """
+        Infer the prompts offline as batch jobs, e.g., in nightly scans, which are not rate limited per request
+        and are billed at the batch price. It blocks until all the jobs finish, and resumes the jobs
+        saved in the work directory if an earlier run was interrupted
+        :param requests: the prompts by their custom ids, which are stable across runs, e.g., from get_custom_id
+        :param batch_provider: the provider running the jobs, e.g., OpenAIBatchProvider or LocalBatchProvider
+        :param work_dir: the directory of the batch files and the job ids
+        :return: the (output, input_token_cost, output_token_cost) tuples by the custom ids
+        """
+        custom_ids = list(requests)
+        cached_responses = self.load_cached_responses([requests[custom_id] for custom_id in custom_ids], is_measure_cost)
+        outputs = {}
+        missed_requests = {}
+        for (custom_id, cached_response) in zip(custom_ids, cached_responses):
+            if cached_response is not None:
+                outputs[custom_id] = cached_response
+            else:
+                missed_requests[custom_id] = requests[custom_id]
+
+        if len(missed_requests) > 0 and self.token_ledger is not None and self.token_ledger.is_exhausted():
+            # The jobs are not submitted once the budget is used up
+            self.report_skipped_requests(len(missed_requests))
+            outputs.update({custom_id: ("", 0, 0) for custom_id in missed_requests})
+        elif len(missed_requests) > 0:
+            runner = BatchJobRunner(
+                batch_provider, work_dir, self.online_model_name, self.temperature, self.systemRole, poll_interval
+            )
+            for (custom_id, (output, input_token_cost, output_token_cost)) in runner.run(missed_requests).items():
+                if self.token_ledger is not None and output != "":
+                    self.token_ledger.record(
+                        self.scanner_name, self.online_model_name, "batch", input_token_cost, output_token_cost, True
+                    )
+                self.store_response(missed_requests[custom_id], output, input_token_cost, output_token_cost)
+                outputs[custom_id] = (output, input_token_cost, output_token_cost) if is_measure_cost else (output, 0, 0)
+        return {custom_id: outputs[custom_id] for custom_id in requests}
+
+    def report_skipped_requests(self, skipped_count: int) -> None:
+        if skipped_count > 0:
+            print(f"The LLM budget is used up, and {skipped_count} requests are skipped with empty outputs")
+
+    def infer_with_gemini(
+        self, message: str, stop_condition: Callable[[str], bool] = None, max_output_tokens: int = None
+    ) -> str:
+        """
+        Infer using the Gemini model from Google Generative AI
+        """
+        genai = load_gemini()
         gemini_model = genai.GenerativeModel("gemini-pro")
-        signal.signal(signal.SIGALRM, timeout_handler)
+        # The system role is prepended once, so that a retry sends the same prompt
+        prompt = self.systemRole + "\n" + message
 
-        received = False
-        tryCnt = 0
-        while not received:
-            tryCnt += 1
-            time.sleep(2)
+        def send() -> str:
+            self.request_state.key_label = "gemini"
+            response = gemini_model.generate_content(
+                prompt,
+                safety_settings=gemini_safety_settings,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=self.temperature, max_output_tokens=max_output_tokens
+                ),
+                stream=stop_condition is not None,
+                request_options={"timeout": self.request_timeout},
+            )
+            if stop_condition is None:
+                return response.text
             try:
-                signal.alarm(50)  # Set a timeout of 50 seconds
-                message = self.systemRole + "\n" + message
-
-                safety_settings = [
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS",
-                        "threshold": "BLOCK_NONE",
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HARASSMENT",
-                        "threshold": "BLOCK_NONE",
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HATE_SPEECH",
-                        "threshold": "BLOCK_NONE",
-                    },
-                    {
-                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "threshold": "BLOCK_NONE",
-                    },
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                        "threshold": "BLOCK_NONE",
-                    },
-                ]
-
-                response = gemini_model.generate_content(
-                    message,
-                    safety_settings=safety_settings,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=self.temperature
-                    ),
-                )
-                time.sleep(2)
-                signal.alarm(0)  # Cancel the timeout
-                output = response.text
-                print("Inference succeeded...")
-                return output
-            except TimeoutError:
-                print("ChatCompletion call timed out")
-                received = False
-                simulate_ctrl_c(None, None)  # Simulate Ctrl+C effect
-            except KeyboardInterrupt:
-                print("ChatCompletion cancelled by user")
-                received = False
-                continue
-            except Exception:
-                print("API error:", sys.exc_info())
-                return ""
-            if tryCnt > 5:
-                return ""
+                return LLM.receive_stream((chunk.text for chunk in response), stop_condition)
+            finally:
+                # Leaving the chunks unread does not stop the generation, so the underlying gRPC call
+                # or HTTP response is cancelled. The SDK exposes no public way to cancel it
+                stream = getattr(response, "_iterator", None)
+                if stream is not None and hasattr(stream, "cancel"):
+                    stream.cancel()
 
-    def infer_with_openai_model(self, message):
+        return self.send_with_retry(send)
+
+    def infer_with_openai_model(
+        self, message: str, stop_condition: Callable[[str], bool] = None, max_output_tokens: int = None
+    ) -> str:
         """
         Infer using the OpenAI model
         """
-        def timeout_handler(signum, frame):
-            raise TimeoutError("ChatCompletion timeout")
-
-        def simulate_ctrl_c(signal, frame):
-            raise KeyboardInterrupt("Simulating Ctrl+C")
+        from openai import OpenAI
 
         model_input = [
             {
@@ -134,38 +565,73 @@ class LLM:
             {"role": "user", "content": message},
         ]
 
-        received = False
-        tryCnt = 0
-        output = ""
-
-        signal.signal(signal.SIGALRM, timeout_handler)
-        while not received:
-            tryCnt += 1
-            time.sleep(2)
-            try:
-                signal.alarm(100)  # Set a timeout of 100 seconds
-                client = OpenAI(api_key=standard_keys[0])
-                response = client.chat.completions.create(
-                    model=self.online_model_name,
-                    messages=model_input,
-                    temperature=self.temperature,
+        def send() -> str:
+            key = get_next_standard_key()
+            self.request_state.key_label = get_key_label(key)
+            with self.openai_client_lock:
+                if key not in self.openai_clients:
+                    # The requests are retried by send_with_retry instead of the client
+                    self.openai_clients[key] = OpenAI(
+                        api_key=key, base_url=self.base_url, timeout=self.request_timeout, max_retries=0
+                    )
+                client = self.openai_clients[key]
+            options = {} if max_output_tokens is None else {"max_tokens": max_output_tokens}
+            response = client.chat.completions.create(
+                model=self.online_model_name,
+                messages=model_input,
+                temperature=self.temperature,
+                stream=stop_condition is not None,
+                **options,
+            )
+            if stop_condition is None:
+                return response.choices[0].message.content or ""
+            # Closing the stream closes its connection, which cancels the generation on the server
+            with response:
+                return LLM.receive_stream(
+                    (chunk.choices[0].delta.content or "" for chunk in response if len(chunk.choices) > 0),
+                    stop_condition,
                 )
 
-                signal.alarm(0)  # Cancel the timeout
-                output = response.choices[0].message.content
-                break
-            except TimeoutError:
-                print("ChatCompletion call timed out")
-                received = False
-                simulate_ctrl_c(None, None)  # Simulate Ctrl+C effect
-            except KeyboardInterrupt:
-                print("ChatCompletion cancelled by user")
-                output = ""
+        return self.send_with_retry(send)
+
+    @staticmethod
+    def receive_stream(chunks: Iterator[str], stop_condition: Callable[[str], bool]) -> str:
+        """
+        Receive the text chunks of a streamed response until the response ends or the stop condition is met.
+        :return: the text received
+        """
+        received_chunks = []
+        for chunk in chunks:
+            if chunk == "":
+                continue
+            received_chunks.append(chunk)
+            if stop_condition("".join(received_chunks)):
                 break
+        return "".join(received_chunks)
+
+    def send_with_retry(self, send: Callable[[], str]) -> str:
+        """
+        Send a request, and retry it with exponential backoff only on retryable errors, i.e., timeouts, 429 and 5xx.
+        The timeouts are enforced by the clients instead of signals, so that it can be called from worker threads.
+        The concurrent requests are limited by the concurrency controller, which honors the Retry-After hints.
+        :param send: the function sending the request and returning the output
+        :return: the output, or an empty string if the request failed
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            start_time = self.concurrency_controller.acquire() if self.concurrency_controller is not None else 0.0
+            try:
+                output = send()
             except Exception:
-                print("API error:", sys.exc_info())
-                received = False
-            if tryCnt > 5:
-                output = ""
-        return output
-    
\ No newline at end of file
+                error = sys.exc_info()[1]
+                retry_after = get_retry_after(error)
+                if self.concurrency_controller is not None:
+                    self.concurrency_controller.release(start_time, False, is_overload_error(error), retry_after)
+                print("API error:", repr(error))
+                if not is_retryable_error(error) or attempt == self.max_attempts:
+                    break
+                time.sleep(max(get_retry_delay(attempt), retry_after or 0.0))
+                continue
+            if self.concurrency_controller is not None:
+                self.concurrency_controller.release(start_time, True)
+            return output
+        return ""
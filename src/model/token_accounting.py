@@ -0,0 +1,254 @@
+import json
+import string
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+# The prices in USD per million input and output tokens, matched by the longest prefix of the model name
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gemini": (0.5, 1.5),
+}
+# The batch jobs are billed at half of the price
+BATCH_PRICE_RATIO = 0.5
+# The number of the fixed texts, e.g., the system roles and the prompt templates, whose counts are cached
+DEFAULT_MAX_FIXED_TEXT_COUNT = 256
+
+
+def get_model_prices(model_name: str) -> Tuple[float, float]:
+    """
+    :return: the prices per million input and output tokens of the model, which are 0 for an unknown model
+    """
+    matched_prefix = ""
+    for prefix in MODEL_PRICES:
+        if model_name.startswith(prefix) and len(prefix) > len(matched_prefix):
+            matched_prefix = prefix
+    return MODEL_PRICES.get(matched_prefix, (0.0, 0.0))
+
+
+def get_template_prefix(template: str) -> str:
+    """
+    Get the fixed prefix of a prompt template, i.e., its text before the first replacement field,
+    e.g., "Task: ...\nHere is the function:\n" of a template ending with "{function_code}".
+    """
+    prefix = ""
+    for (literal_text, field_name, _, _) in string.Formatter().parse(template):
+        prefix += literal_text
+        if field_name is not None:
+            break
+    return prefix
+
+
+def get_key_label(key: str) -> str:
+    """
+    Get the label of a key in the ledger, which shows only its last characters
+    """
+    return "..." + key[-4:] if len(key) > 8 else "key"
+
+
+class TokenCounter:
+    """
+    Counter of the tokens of the prompts, which caches the counts of the fixed texts, i.e., the system role
+    and the prefixes of the prompt templates, and encodes only the variable part of a prompt.
+    A prompt is split at the end of its template prefix, so that its count may differ from the count of the whole
+    prompt by the token merged across the boundary.
+    """
+
+    def __init__(self, load_encoding: Callable, max_fixed_text_count: int = DEFAULT_MAX_FIXED_TEXT_COUNT) -> None:
+        """
+        :param load_encoding: the function loading the tiktoken encoding, which is called on the first count
+        :param max_fixed_text_count: the maximal number of the fixed texts whose counts are cached
+        """
+        self.load_encoding = load_encoding
+        self.max_fixed_text_count = max_fixed_text_count
+        self.encoding = None
+        self.fixed_counts = OrderedDict()
+        self.prefixes = []
+        self.lock = threading.Lock()
+
+    def get_encoding(self):
+        with self.lock:
+            if self.encoding is None:
+                self.encoding = self.load_encoding()
+            return self.encoding
+
+    def add_prefix(self, prefix: str) -> None:
+        """
+        Register the fixed prefix of a prompt template, whose count is reused by the prompts starting with it.
+        """
+        with self.lock:
+            if prefix != "" and prefix not in self.prefixes:
+                # The longer prefixes are matched first
+                self.prefixes.append(prefix)
+                self.prefixes.sort(key=len, reverse=True)
+
+    def add_template(self, template: str) -> None:
+        """
+        Register the fixed prefix of a prompt template in the format of str.format.
+        """
+        self.add_prefix(get_template_prefix(template))
+
+    def count(self, text: str) -> int:
+        # The special tokens in the source code are counted as ordinary text instead of being rejected
+        return len(self.get_encoding().encode_ordinary(text))
+
+    def count_fixed(self, text: str) -> int:
+        """
+        Count the tokens of a fixed text, which is encoded only once.
+        """
+        with self.lock:
+            if text in self.fixed_counts:
+                self.fixed_counts.move_to_end(text)
+                return self.fixed_counts[text]
+        token_count = self.count(text)
+        with self.lock:
+            self.fixed_counts[text] = token_count
+            if len(self.fixed_counts) > self.max_fixed_text_count:
+                self.fixed_counts.popitem(last=False)
+        return token_count
+
+    def split_prompt(self, message: str) -> Tuple[str, str]:
+        """
+        Split a prompt into its registered template prefix and its variable part.
+        """
+        with self.lock:
+            prefixes = list(self.prefixes)
+        for prefix in prefixes:
+            if message.startswith(prefix):
+                return (prefix, message[len(prefix):])
+        return ("", message)
+
+    def count_prompt(self, system_role: str, message: str) -> int:
+        """
+        Count the input tokens of a request, i.e., the system role and the prompt.
+        """
+        (prefix, variable_part) = self.split_prompt(message)
+        prefix_count = self.count_fixed(prefix) if prefix != "" else 0
+        return self.count_fixed(system_role) + prefix_count + self.count(variable_part)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens of the texts, which are encoded in a batch by the threads of tiktoken.
+        """
+        if len(texts) == 0:
+            return []
+        return [len(tokens) for tokens in self.get_encoding().encode_ordinary_batch(texts)]
+
+    def count_prompts(self, system_role: str, messages: List[str]) -> List[int]:
+        """
+        Count the input tokens of the requests in a batch.
+        """
+        if len(messages) == 0:
+            return []
+        splits = [self.split_prompt(message) for message in messages]
+        variable_counts = self.count_batch([variable_part for (_, variable_part) in splits])
+        system_role_count = self.count_fixed(system_role)
+        return [
+            system_role_count + (self.count_fixed(prefix) if prefix != "" else 0) + variable_count
+            for ((prefix, _), variable_count) in zip(splits, variable_counts)
+        ]
+
+
+class BudgetExceededError(RuntimeError):
+    """
+    Raised when a new request is scheduled after the budget of the run is used up.
+    """
+
+
+class TokenLedger:
+    """
+    Run-level ledger of the requests, the input and output tokens, and the estimated cost,
+    per scanner, per model, and per key, which is shared by the worker threads.
+    If a budget is set, no new request is scheduled once the spent cost or tokens reach it.
+    """
+
+    def __init__(self, max_cost: float = None, max_tokens: int = None) -> None:
+        """
+        :param max_cost: the budget of the estimated cost in USD, which is unlimited if it is None
+        :param max_tokens: the budget of the input and output tokens, which is unlimited if it is None
+        """
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.entries: Dict[Tuple[str, str, str], Dict] = {}
+        self.total_cost = 0.0
+        self.total_tokens = 0
+        self.lock = threading.Lock()
+
+    def record(
+        self,
+        scanner_name: str,
+        model_name: str,
+        key_label: str,
+        input_token_count: int,
+        output_token_count: int,
+        is_batch: bool = False,
+    ) -> None:
+        """
+        Record the tokens of a request.
+        :param key_label: the label of the key, e.g., from get_key_label
+        :param is_batch: whether the request was run in a batch job, which is billed at the batch price
+        """
+        (input_price, output_price) = get_model_prices(model_name)
+        cost = (input_token_count * input_price + output_token_count * output_price) / 1000000
+        if is_batch:
+            cost *= BATCH_PRICE_RATIO
+        with self.lock:
+            entry = self.entries.setdefault(
+                (scanner_name, model_name, key_label),
+                {"request_count": 0, "input_token_count": 0, "output_token_count": 0, "cost": 0.0},
+            )
+            entry["request_count"] += 1
+            entry["input_token_count"] += input_token_count
+            entry["output_token_count"] += output_token_count
+            entry["cost"] += cost
+            self.total_cost += cost
+            self.total_tokens += input_token_count + output_token_count
+
+    def is_exhausted(self) -> bool:
+        with self.lock:
+            if self.max_cost is not None and self.total_cost >= self.max_cost:
+                return True
+            return self.max_tokens is not None and self.total_tokens >= self.max_tokens
+
+    def check_budget(self) -> None:
+        """
+        :raise BudgetExceededError: if the budget is used up
+        """
+        if self.is_exhausted():
+            raise BudgetExceededError(
+                f"The LLM budget is used up: ${self.total_cost:.4f} and {self.total_tokens} tokens spent"
+            )
+
+    def get_rows(self) -> List[Dict]:
+        """
+        :return: the rows of the ledger, sorted by the scanner, the model, and the key
+        """
+        with self.lock:
+            return [
+                dict(scanner=scanner_name, model=model_name, key=key_label, **entry)
+                for ((scanner_name, model_name, key_label), entry) in sorted(self.entries.items())
+            ]
+
+    def report(self) -> None:
+        rows = self.get_rows()
+        if len(rows) == 0:
+            return
+        print("LLM token ledger:")
+        for row in rows:
+            print(
+                f"    {row['scanner']} / {row['model']} / {row['key']}: {row['request_count']} requests, "
+                f"{row['input_token_count']} input tokens, {row['output_token_count']} output tokens, ${row['cost']:.4f}"
+            )
+        print(f"    Total: {self.total_tokens} tokens, ${self.total_cost:.4f}")
+
+    def save(self, ledger_path: str) -> None:
+        with open(ledger_path, "w") as ledger_file:
+            json.dump(
+                {"total_cost": self.total_cost, "total_tokens": self.total_tokens, "rows": self.get_rows()},
+                ledger_file,
+                indent=4,
+            )
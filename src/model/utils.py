@@ -1,18 +1,71 @@
 import os
-import openai
-import google.generativeai as genai
+import threading
+from typing import List
 
-# Standard OpenAI API
-standard_keys = os.environ.get("OPENAI_API_KEY").split(":")
+# The provider SDKs are imported and configured on their first use,
+# so that a scan without inference starts quickly, and needs neither the keys nor the network
 
-# Replicate API
-os.environ["REPLICATE_API_TOKEN"] = os.environ.get("REPLICATE_API_TOKEN")
+# Standard OpenAI API, with multiple keys separated by ":"
+standard_keys = [key for key in os.environ.get("OPENAI_API_KEY", "").split(":") if key != ""]
+
+# Replicate API, whose token is read from REPLICATE_API_TOKEN by the replicate package
+
+# The index of the next OpenAI key, which rotates over the keys
+next_key_index = 0
+# The lock of the key rotation and the Gemini configuration, which may be used from worker threads
+provider_lock = threading.Lock()
 
 # Gemini API
-genai.configure(api_key=os.environ.get("GEMINI_KEY"))
+gemini_configured = False
+gemini_safety_settings = [
+    {"category": category, "threshold": "BLOCK_NONE"}
+    for category in [
+        "HARM_CATEGORY_DANGEROUS",
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    ]
+]
 
 # Iterative count bound
 iterative_count_bound = 3
 
 # Scope count bound (for development)
 scope_count_bound = 10
+
+
+def get_standard_keys() -> List[str]:
+    """
+    Get the OpenAI keys, which raises an error only when a key is needed and OPENAI_API_KEY is unset
+    """
+    if len(standard_keys) == 0:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+    return standard_keys
+
+
+def get_next_standard_key() -> str:
+    """
+    Get the OpenAI keys in round-robin order, so that the requests are spread over all the keys
+    """
+    global next_key_index
+    keys = get_standard_keys()
+    with provider_lock:
+        key = keys[next_key_index % len(keys)]
+        next_key_index = (next_key_index + 1) % len(keys)
+    return key
+
+
+def load_gemini():
+    """
+    Import and configure the Gemini SDK on its first use
+    :return: the google.generativeai module
+    """
+    global gemini_configured
+    import google.generativeai as genai
+
+    with provider_lock:
+        if not gemini_configured:
+            genai.configure(api_key=os.environ.get("GEMINI_KEY"))
+            gemini_configured = True
+    return genai
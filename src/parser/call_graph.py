@@ -0,0 +1,325 @@
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+INDEX_DTYPE = np.int32
+
+
+def gather_neighbors(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+    """
+    Gather the neighbors of all the nodes in the frontier at once.
+    :param indptr: the offsets of the adjacency lists in the compressed sparse format
+    :param indices: the concatenated adjacency lists
+    :param frontier: the indices of the nodes
+    :return: the indices of the neighbors, which may contain duplicates
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total_count = int(counts.sum())
+    if total_count == 0:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    # The position of the j-th neighbor of a node is its start plus j
+    first_positions = np.cumsum(counts) - counts
+    positions = np.arange(total_count, dtype=np.int64) + np.repeat(starts - first_positions, counts)
+    return indices[positions]
+
+
+def compress(sources: np.ndarray, targets: np.ndarray, node_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the compressed sparse rows of the edges, where each row lists the targets of a source.
+    :return: the offsets of the rows, and the targets sorted by their sources
+    """
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=INDEX_DTYPE)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return (indptr, targets[order].astype(INDEX_DTYPE))
+
+
+class CallGraph:
+    """
+    Array-backed call graph over function ids.
+    The callees of the functions are stored in the CSR format, and the callers in the CSC format,
+    both as int32 NumPy arrays over the dense indices of the functions.
+    Functions and edges are added and removed in bulk, and the arrays are rebuilt lazily before the next query,
+    so that incremental updates do not pay for a rebuild per edge.
+    """
+
+    def __init__(self) -> None:
+        self.function_id_set = set([])
+        self.pending_callers: List[int] = []
+        self.pending_callees: List[int] = []
+        self.is_dirty = True
+
+        # The arrays of the last build
+        self.function_ids = np.empty(0, dtype=INDEX_DTYPE)  # The sorted function ids, indexed by the dense indices
+        self.edge_callers = np.empty(0, dtype=INDEX_DTYPE)  # The function ids of the callers of the unique edges
+        self.edge_callees = np.empty(0, dtype=INDEX_DTYPE)  # The function ids of the callees of the unique edges
+        self.callee_indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        self.callee_indices = np.empty(0, dtype=INDEX_DTYPE)
+        self.caller_indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        self.caller_indices = np.empty(0, dtype=INDEX_DTYPE)
+
+    #################################################
+    ########## Construction #########################
+    #################################################
+    def add_functions(self, function_ids: Iterable[int]) -> None:
+        self.function_id_set.update(function_ids)
+        self.is_dirty = True
+
+    def remove_functions(self, function_ids: Iterable[int]) -> None:
+        """
+        Remove the functions and their edges. Function ids are never reused, so the edges are dropped in the next build.
+        """
+        self.function_id_set.difference_update(function_ids)
+        self.is_dirty = True
+
+    def add_edges(self, caller_id: int, callee_ids: Iterable[int]) -> None:
+        """
+        Add the edges from a caller to its callees. Duplicate edges are merged in the next build.
+        """
+        for callee_id in callee_ids:
+            self.pending_callers.append(caller_id)
+            self.pending_callees.append(callee_id)
+        self.is_dirty = True
+
+    def set_edges(self, callers: np.ndarray, callees: np.ndarray) -> None:
+        """
+        Replace all the edges in bulk, e.g., with the calls resolved from the call site table.
+        :param callers: the function ids of the callers
+        :param callees: the function ids of the callees, which are aligned with the callers
+        """
+        self.edge_callers = np.asarray(callers, dtype=INDEX_DTYPE)
+        self.edge_callees = np.asarray(callees, dtype=INDEX_DTYPE)
+        self.pending_callers = []
+        self.pending_callees = []
+        self.is_dirty = True
+
+    def build(self) -> None:
+        """
+        Rebuild the arrays from the edges of the last build and the pending edges, if the graph is changed.
+        """
+        if not self.is_dirty:
+            return
+        self.function_ids = np.array(sorted(self.function_id_set), dtype=INDEX_DTYPE)
+        callers = np.concatenate([self.edge_callers, np.array(self.pending_callers, dtype=INDEX_DTYPE)])
+        callees = np.concatenate([self.edge_callees, np.array(self.pending_callees, dtype=INDEX_DTYPE)])
+        self.pending_callers = []
+        self.pending_callees = []
+
+        # Drop the edges of the removed functions, and merge the duplicate edges
+        is_valid = self.contains(callers) & self.contains(callees)
+        edges = np.unique(np.stack([callers[is_valid], callees[is_valid]], axis=1), axis=0)
+        self.edge_callers = edges[:, 0].astype(INDEX_DTYPE)
+        self.edge_callees = edges[:, 1].astype(INDEX_DTYPE)
+
+        caller_indices = self.to_indices(self.edge_callers)
+        callee_indices = self.to_indices(self.edge_callees)
+        node_count = len(self.function_ids)
+        (self.callee_indptr, self.callee_indices) = compress(caller_indices, callee_indices, node_count)
+        (self.caller_indptr, self.caller_indices) = compress(callee_indices, caller_indices, node_count)
+        self.is_dirty = False
+
+    def contains(self, function_ids: np.ndarray) -> np.ndarray:
+        """
+        Check whether each of the function ids is in the graph of the last build.
+        """
+        if len(self.function_ids) == 0:
+            return np.zeros(len(function_ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.function_ids, function_ids), len(self.function_ids) - 1)
+        return self.function_ids[positions] == function_ids
+
+    def to_indices(self, function_ids) -> np.ndarray:
+        """
+        Map the function ids in the graph to their dense indices.
+        """
+        return np.searchsorted(self.function_ids, np.asarray(function_ids, dtype=INDEX_DTYPE)).astype(INDEX_DTYPE)
+
+    #################################################
+    ########## Queries ##############################
+    #################################################
+    def get_edge_count(self) -> int:
+        self.build()
+        return len(self.edge_callers)
+
+    def get_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the unique edges.
+        :return: the function ids of the callers and the function ids of the callees
+        """
+        self.build()
+        return (self.edge_callers, self.edge_callees)
+
+    def callees(self, function_id: int) -> np.ndarray:
+        """
+        Get the sorted function ids of the direct callees of a function.
+        """
+        self.build()
+        return self.get_neighbors(self.callee_indptr, self.callee_indices, function_id)
+
+    def callers(self, function_id: int) -> np.ndarray:
+        """
+        Get the sorted function ids of the direct callers of a function.
+        """
+        self.build()
+        return self.get_neighbors(self.caller_indptr, self.caller_indices, function_id)
+
+    def get_neighbors(self, indptr: np.ndarray, indices: np.ndarray, function_id: int) -> np.ndarray:
+        if not self.contains(np.array([function_id], dtype=INDEX_DTYPE))[0]:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        index = int(self.to_indices([function_id])[0])
+        return self.function_ids[indices[indptr[index]:indptr[index + 1]]]
+
+    def k_hop_callees(self, function_ids: Iterable[int], k: int) -> np.ndarray:
+        """
+        Get the functions called from any of the functions through at most k calls.
+        :param function_ids: the ids of the functions
+        :param k: the maximal number of calls, which is unbounded if it is None
+        :return: the sorted function ids, including a given function only if it is reached through a cycle
+        """
+        self.build()
+        return self.expand(self.callee_indptr, self.callee_indices, function_ids, k)
+
+    def k_hop_callers(self, function_ids: Iterable[int], k: int) -> np.ndarray:
+        """
+        Get the functions calling any of the functions through at most k calls.
+        :param function_ids: the ids of the functions
+        :param k: the maximal number of calls, which is unbounded if it is None
+        :return: the sorted function ids, including a given function only if it is reached through a cycle
+        """
+        self.build()
+        return self.expand(self.caller_indptr, self.caller_indices, function_ids, k)
+
+    def reachable_callees(self, function_ids: Iterable[int]) -> np.ndarray:
+        """
+        Get the functions transitively called from any of the functions.
+        """
+        return self.k_hop_callees(function_ids, None)
+
+    def reachable_callers(self, function_ids: Iterable[int]) -> np.ndarray:
+        """
+        Get the functions transitively calling any of the functions.
+        """
+        return self.k_hop_callers(function_ids, None)
+
+    def expand(self, indptr: np.ndarray, indices: np.ndarray, function_ids: Iterable[int], k: int) -> np.ndarray:
+        """
+        Expand the functions hop by hop, where each hop gathers the neighbors of the whole frontier at once.
+        """
+        function_ids = np.fromiter(function_ids, dtype=INDEX_DTYPE)
+        frontier = self.to_indices(function_ids[self.contains(function_ids)])
+        is_reached = np.zeros(len(self.function_ids), dtype=bool)
+        hop = 0
+        while len(frontier) > 0 and (k is None or hop < k):
+            neighbors = gather_neighbors(indptr, indices, frontier)
+            frontier = np.unique(neighbors[~is_reached[neighbors]])
+            is_reached[frontier] = True
+            hop += 1
+        return self.function_ids[is_reached]
+
+    def get_component_labels(self) -> np.ndarray:
+        """
+        Label the strongly connected components with Tarjan's algorithm without recursion.
+        The components are labeled in the reverse topological order, i.e., the callees before the callers.
+        :return: the component label of each function, aligned with function_ids
+        """
+        self.build()
+        node_count = len(self.function_ids)
+        indptr = self.callee_indptr.tolist()
+        indices = self.callee_indices.tolist()
+        labels = [-1] * node_count
+        discovery = [-1] * node_count
+        low_links = [0] * node_count
+        on_stack = [False] * node_count
+        stack = []
+        counter = 0
+        label_count = 0
+
+        for root in range(node_count):
+            if discovery[root] != -1:
+                continue
+            # Each frame is a (node, position of the next callee) pair
+            frames = [(root, indptr[root])]
+            discovery[root] = low_links[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while len(frames) > 0:
+                (node, position) = frames[-1]
+                if position < indptr[node + 1]:
+                    frames[-1] = (node, position + 1)
+                    callee = indices[position]
+                    if discovery[callee] == -1:
+                        discovery[callee] = low_links[callee] = counter
+                        counter += 1
+                        stack.append(callee)
+                        on_stack[callee] = True
+                        frames.append((callee, indptr[callee]))
+                    elif on_stack[callee]:
+                        low_links[node] = min(low_links[node], discovery[callee])
+                    continue
+
+                frames.pop()
+                if len(frames) > 0:
+                    parent = frames[-1][0]
+                    low_links[parent] = min(low_links[parent], low_links[node])
+                if low_links[node] == discovery[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        labels[member] = label_count
+                        if member == node:
+                            break
+                    label_count += 1
+        return np.array(labels, dtype=INDEX_DTYPE)
+
+    def strongly_connected_components(self) -> List[np.ndarray]:
+        """
+        Get the strongly connected components, i.e., the sets of mutually recursive functions.
+        :return: the function ids of the components in the reverse topological order
+        """
+        labels = self.get_component_labels()
+        order = np.argsort(labels, kind="stable")
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        return np.split(self.function_ids[order], boundaries) if len(order) > 0 else []
+
+    def topological_levels(self) -> List[np.ndarray]:
+        """
+        Group the functions by their levels in the condensation of the call graph.
+        The functions calling no other components are at level 0, and the other functions are one level above
+        their highest callees, so that the functions at a level only depend on the functions at lower levels.
+        :return: the function ids at each level
+        """
+        labels = self.get_component_labels()
+        label_count = int(labels.max()) + 1 if len(labels) > 0 else 0
+        caller_labels = labels[self.to_indices(self.edge_callers)]
+        callee_labels = labels[self.to_indices(self.edge_callees)]
+        is_external = caller_labels != callee_labels
+        condensed_edges = np.unique(np.stack([caller_labels[is_external], callee_labels[is_external]], axis=1), axis=0)
+        (reverse_indptr, reverse_indices) = compress(condensed_edges[:, 1], condensed_edges[:, 0], label_count)
+
+        # Peel the components without remaining callees level by level
+        remaining_callees = np.bincount(condensed_edges[:, 0], minlength=label_count)
+        component_levels = np.full(label_count, -1, dtype=INDEX_DTYPE)
+        frontier = np.flatnonzero(remaining_callees == 0)
+        level = 0
+        while len(frontier) > 0:
+            component_levels[frontier] = level
+            callers = gather_neighbors(reverse_indptr, reverse_indices, frontier)
+            np.subtract.at(remaining_callees, callers, 1)
+            frontier = np.unique(callers[remaining_callees[callers] == 0])
+            level += 1
+
+        function_levels = component_levels[labels]
+        return [self.function_ids[function_levels == level] for level in range(level)]
+
+    def to_networkx(self) -> "nx.DiGraph":
+        """
+        Export the call graph to networkx, which is built only on demand. networkx is imported on the first export.
+        """
+        import networkx as nx
+
+        self.build()
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.function_ids.tolist())
+        graph.add_edges_from(zip(self.edge_callers.tolist(), self.edge_callees.tolist()))
+        return graph
@@ -0,0 +1,200 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from parser.call_graph import INDEX_DTYPE, compress, gather_neighbors
+
+# The columns of the call site table
+CALL_SITE_COLUMNS = ("caller_id", "callee_name_id", "file_id", "start_byte", "end_byte", "is_resolved")
+CALL_SITE_DTYPES = {
+    "caller_id": INDEX_DTYPE,
+    "callee_name_id": INDEX_DTYPE,
+    "file_id": INDEX_DTYPE,
+    "start_byte": np.int64,
+    "end_byte": np.int64,
+    "is_resolved": bool,
+}
+
+
+class CallSiteTable:
+    """
+    Columnar table of the call sites in the project, with a row per call site.
+    The callee names and the file paths are interned into pools, and the rows store their ids.
+    The rows are appended while the facts are merged, and all of them are resolved against
+    the function names in one vectorized join, so that the calls are never resolved one by one.
+    The rows are kept sorted by the caller ids and the offsets, so the call sites of a function are a contiguous slice.
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []  # The pool of the callee names
+        self.name_ids: Dict[str, int] = {}
+        self.file_paths: List[str] = []  # The pool of the file paths
+        self.file_ids: Dict[str, int] = {}
+
+        self.columns = {column: np.empty(0, dtype=CALL_SITE_DTYPES[column]) for column in CALL_SITE_COLUMNS}
+        self.pending_rows = {column: [] for column in CALL_SITE_COLUMNS}
+        self.removed_caller_ids = set([])
+        self.is_dirty = False
+
+    #################################################
+    ########## Construction #########################
+    #################################################
+    def get_name_id(self, name: str) -> int:
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def get_file_id(self, file_path: str) -> int:
+        if file_path not in self.file_ids:
+            self.file_ids[file_path] = len(self.file_paths)
+            self.file_paths.append(file_path)
+        return self.file_ids[file_path]
+
+    def add_call_sites(self, caller_id: int, file_path: str, call_sites: List[Tuple[str, int, int]]) -> None:
+        """
+        Append the call sites of a function, which are unresolved until the next resolution.
+        :param caller_id: the id of the function
+        :param file_path: the path of the file of the function
+        :param call_sites: the (callee_name, start_byte, end_byte) tuples of the call sites
+        """
+        if len(call_sites) == 0:
+            return
+        if caller_id in self.removed_caller_ids:
+            # Drop the removed call sites of the function before its new call sites are added
+            self.compact()
+        file_id = self.get_file_id(file_path)
+        for (callee_name, start_byte, end_byte) in call_sites:
+            self.pending_rows["caller_id"].append(caller_id)
+            self.pending_rows["callee_name_id"].append(self.get_name_id(callee_name))
+            self.pending_rows["file_id"].append(file_id)
+            self.pending_rows["start_byte"].append(start_byte)
+            self.pending_rows["end_byte"].append(end_byte)
+            self.pending_rows["is_resolved"].append(False)
+        self.is_dirty = True
+
+    def remove_callers(self, caller_ids: Iterable[int]) -> None:
+        """
+        Remove the call sites of the functions, including the pending ones. The rows are dropped in the next compaction.
+        """
+        self.removed_caller_ids.update(caller_ids)
+        self.is_dirty = True
+
+    def shift_callers(self, byte_deltas: Dict[int, int]) -> None:
+        """
+        Shift the offsets of the call sites of the functions.
+        :param byte_deltas: the change of the offsets of each function
+        """
+        if len(byte_deltas) == 0:
+            return
+        self.compact()
+        shifted_ids = np.array(sorted(byte_deltas), dtype=INDEX_DTYPE)
+        deltas = np.array([byte_deltas[caller_id] for caller_id in shifted_ids.tolist()], dtype=np.int64)
+        positions = np.minimum(np.searchsorted(shifted_ids, self.columns["caller_id"]), len(shifted_ids) - 1)
+        row_deltas = np.where(shifted_ids[positions] == self.columns["caller_id"], deltas[positions], 0)
+        self.columns["start_byte"] += row_deltas
+        self.columns["end_byte"] += row_deltas
+
+    def compact(self) -> None:
+        """
+        Merge the pending rows into the columns, drop the rows of the removed callers, and sort the rows.
+        """
+        if not self.is_dirty:
+            return
+        columns = {
+            column: np.concatenate(
+                [self.columns[column], np.array(self.pending_rows[column], dtype=CALL_SITE_DTYPES[column])]
+            )
+            for column in CALL_SITE_COLUMNS
+        }
+        self.pending_rows = {column: [] for column in CALL_SITE_COLUMNS}
+
+        is_kept = ~np.isin(columns["caller_id"], np.fromiter(self.removed_caller_ids, dtype=INDEX_DTYPE))
+        order = np.lexsort((columns["start_byte"][is_kept], columns["caller_id"][is_kept]))
+        self.columns = {column: values[is_kept][order] for (column, values) in columns.items()}
+        self.removed_caller_ids = set([])
+        self.is_dirty = False
+
+    def resolve(self, function_name_to_id: Dict[str, Set[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resolve all the call sites against the function names in one join.
+        A call site is resolved to all the functions of its callee name, which over-approximates the callees.
+        :param function_name_to_id: the ids of the functions of each name
+        :return: the caller ids and the callee ids of the resolved calls, with a pair per call site and callee
+        """
+        self.compact()
+        name_count = len(self.names)
+        candidate_name_ids = []
+        candidate_function_ids = []
+        for (name, function_ids) in function_name_to_id.items():
+            if name in self.name_ids:
+                candidate_name_ids.extend([self.name_ids[name]] * len(function_ids))
+                candidate_function_ids.extend(function_ids)
+        (name_indptr, name_function_ids) = compress(
+            np.array(candidate_name_ids, dtype=INDEX_DTYPE), np.array(candidate_function_ids, dtype=INDEX_DTYPE), name_count
+        )
+
+        callee_name_ids = self.columns["callee_name_id"]
+        callee_counts = (name_indptr[1:] - name_indptr[:-1])[callee_name_ids]
+        self.columns["is_resolved"] = callee_counts > 0
+        callee_ids = gather_neighbors(name_indptr, name_function_ids, callee_name_ids)
+        caller_ids = np.repeat(self.columns["caller_id"], callee_counts)
+        return (caller_ids, callee_ids)
+
+    #################################################
+    ########## Queries ##############################
+    #################################################
+    def __len__(self) -> int:
+        self.compact()
+        return len(self.columns["caller_id"])
+
+    def get_rows(self, caller_id: int) -> slice:
+        """
+        Get the rows of the call sites of a function.
+        """
+        self.compact()
+        caller_ids = self.columns["caller_id"]
+        return slice(
+            int(np.searchsorted(caller_ids, caller_id, side="left")),
+            int(np.searchsorted(caller_ids, caller_id, side="right")),
+        )
+
+    def get_call_sites(self, caller_id: int) -> List[Tuple[str, int, int]]:
+        """
+        Get the call sites of a function.
+        :return: the (callee_name, start_byte, end_byte) tuples in the order of their offsets
+        """
+        rows = self.get_rows(caller_id)
+        return [
+            (self.names[name_id], start_byte, end_byte)
+            for (name_id, start_byte, end_byte) in zip(
+                self.columns["callee_name_id"][rows].tolist(),
+                self.columns["start_byte"][rows].tolist(),
+                self.columns["end_byte"][rows].tolist(),
+            )
+        ]
+
+    def get_resolved_call_site_ranges(self, caller_id: int) -> List[Tuple[int, int]]:
+        """
+        Get the (start_byte, end_byte) ranges of the call sites of a function with resolved callees.
+        """
+        rows = self.get_rows(caller_id)
+        is_resolved = self.columns["is_resolved"][rows]
+        return list(
+            zip(self.columns["start_byte"][rows][is_resolved].tolist(), self.columns["end_byte"][rows][is_resolved].tolist())
+        )
+
+    def get_callers_of_name(self, callee_name: str) -> np.ndarray:
+        """
+        Get the sorted ids of the functions with call sites of a callee name.
+        """
+        self.compact()
+        if callee_name not in self.name_ids:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.unique(self.columns["caller_id"][self.columns["callee_name_id"] == self.name_ids[callee_name]])
+
+    def get_callee_names(self, caller_id: int) -> Set[str]:
+        """
+        Get the callee names at the call sites of a function.
+        """
+        return set(self.names[name_id] for name_id in self.columns["callee_name_id"][self.get_rows(caller_id)].tolist())
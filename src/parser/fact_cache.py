@@ -0,0 +1,108 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import List
+
+
+class FactCache:
+    """
+    On-disk cache of the facts extracted from source files.
+    An entry is keyed by the content hash of a file, the language, and the version of the fact extractor,
+    so it never goes stale: a changed file or extractor simply misses the cache.
+    Entries are evicted in the least-recently-used order once the cache exceeds its size cap.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = 512 * 1024 * 1024) -> None:
+        """
+        :param cache_dir: the directory of the cache entries
+        :param max_size: the maximal total size of the cache entries in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hit_count = 0
+        self.miss_count = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_key(source_code: bytes, language: str, version: int) -> str:
+        """
+        Get the key of a source file.
+        :param source_code: the content of the source file, which is a bytes-like object
+        :param language: the language of the source file
+        :param version: the version of the fact extractor
+        """
+        hasher = hashlib.sha256(f"{language}\0{version}\0".encode("utf8"))
+        hasher.update(source_code)
+        return hasher.hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def load(self, source_code: bytes, language: str, version: int) -> List:
+        """
+        Load the facts of a source file.
+        :return: the facts of the functions in the file, or None if the file misses the cache
+        """
+        entry_path = self.get_entry_path(FactCache.get_key(source_code, language, version))
+        try:
+            with open(entry_path, "rb") as entry_file:
+                all_facts = pickle.load(entry_file)
+            # Refresh the modification time, which is the recency of the entry in the LRU eviction
+            os.utime(entry_path)
+        except FileNotFoundError:
+            self.miss_count += 1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A corrupted or incompatible entry is dropped and regenerated
+            self.remove_entry(entry_path)
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        return all_facts
+
+    def store(self, source_code: bytes, language: str, version: int, all_facts: List) -> None:
+        """
+        Store the facts of a source file.
+        """
+        entry_path = self.get_entry_path(FactCache.get_key(source_code, language, version))
+
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        # Write to a temporary file first so that concurrent scans never read a partial entry
+        (fd, temp_path) = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                pickle.dump(all_facts, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            self.remove_entry(temp_path)
+
+    def evict(self) -> None:
+        """
+        Evict the least recently used entries until the total size is within the size cap.
+        """
+        entries = []
+        total_size = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".pkl"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for (_, size, entry_path) in entries:
+            if total_size <= self.max_size:
+                break
+            self.remove_entry(entry_path)
+            total_size -= size
+
+    @staticmethod
+    def remove_entry(entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from parser.call_graph import INDEX_DTYPE
+
+
+class FileIntervals:
+    """
+    Sorted interval arrays of the line ranges of the functions in a file.
+    The intervals are sorted by their start lines, and the enclosing intervals come before the nested ones.
+    Each interval records the nearest preceding interval not ending before it starts, which is its parent,
+    so that the nested functions are found by a binary search followed by a walk up the parents.
+    """
+
+    __slots__ = ("start_lines", "end_lines", "function_ids", "parents")
+
+    def __init__(self, intervals: List[Tuple[int, int, int]]) -> None:
+        """
+        :param intervals: the (start_line, end_line, function_id) tuples of the functions
+        """
+        intervals = sorted(intervals, key=lambda interval: (interval[0], -interval[1], interval[2]))
+        self.start_lines = np.array([interval[0] for interval in intervals], dtype=np.int64)
+        self.end_lines = np.array([interval[1] for interval in intervals], dtype=np.int64)
+        self.function_ids = np.array([interval[2] for interval in intervals], dtype=INDEX_DTYPE)
+
+        parents = []
+        stack = []
+        for (index, (start_line, end_line, _)) in enumerate(intervals):
+            while len(stack) > 0 and intervals[stack[-1]][1] < start_line:
+                stack.pop()
+            parents.append(stack[-1] if len(stack) > 0 else -1)
+            stack.append(index)
+        self.parents = np.array(parents, dtype=np.int64)
+
+    def find(self, line_number: int) -> List[int]:
+        """
+        Find the functions whose line ranges contain the line.
+        :return: the ids of the functions from the innermost one to the outermost one
+        """
+        index = int(np.searchsorted(self.start_lines, line_number, side="right")) - 1
+        function_ids = []
+        while index >= 0:
+            if self.end_lines[index] >= line_number:
+                function_ids.append(int(self.function_ids[index]))
+            index = int(self.parents[index])
+        return function_ids
+
+
+class FunctionIndex:
+    """
+    Per-file interval index mapping (file, line) to the functions containing the line.
+    The index of a file is built on its first lookup and dropped when the functions of the file change.
+    """
+
+    def __init__(self) -> None:
+        self.file_intervals: Dict[str, FileIntervals] = {}
+
+    def is_built(self, file_path: str) -> bool:
+        return file_path in self.file_intervals
+
+    def build(self, file_path: str, intervals: Iterable[Tuple[int, int, int]]) -> None:
+        """
+        Build the index of a file.
+        :param intervals: the (start_line, end_line, function_id) tuples of the functions in the file
+        """
+        self.file_intervals[file_path] = FileIntervals(list(intervals))
+
+    def invalidate(self, file_path: str) -> None:
+        self.file_intervals.pop(file_path, None)
+
+    def find(self, file_path: str, line_number: int) -> List[int]:
+        """
+        Find the functions in a file containing the line, which is empty if the index of the file is not built.
+        :return: the ids of the functions from the innermost one to the outermost one
+        """
+        if file_path not in self.file_intervals:
+            return []
+        return self.file_intervals[file_path].find(line_number)
@@ -0,0 +1,166 @@
+import difflib
+from typing import List, Tuple
+
+import tree_sitter
+
+# The changed lines are matched with difflib only if both sides are shorter than this limit.
+# Otherwise, all the lines between the common prefix and the common suffix are replaced in a single edit.
+MAX_DIFF_LINES = 20000
+
+
+class TextEdit:
+    """
+    An edit replacing whole lines of the old text with whole lines of the new text.
+    The old range is relative to the old text, and the new range is relative to the new text.
+    """
+
+    def __init__(
+        self,
+        old_start_byte: int,
+        old_end_byte: int,
+        new_start_byte: int,
+        new_end_byte: int,
+        old_start_row: int,
+        line_delta: int,
+    ) -> None:
+        self.old_start_byte = old_start_byte
+        self.old_end_byte = old_end_byte
+        self.new_start_byte = new_start_byte
+        self.new_end_byte = new_end_byte
+        self.old_start_row = old_start_row  # The row of the first replaced line, starting from 0
+        self.line_delta = line_delta  # The change in the number of lines
+
+    @property
+    def byte_delta(self) -> int:
+        return (self.new_end_byte - self.new_start_byte) - (self.old_end_byte - self.old_start_byte)
+
+
+def split_lines(text: bytes) -> List[bytes]:
+    """
+    Split the text into lines ending with newlines, except the last line.
+    Only "\\n" separates lines, which is the same as the rows of tree-sitter.
+    """
+    lines = [line + b"\n" for line in text.split(b"\n")]
+    lines[-1] = lines[-1][:-1]
+    if lines[-1] == b"":
+        lines.pop()
+    return lines
+
+
+def get_line_offsets(lines: List[bytes]) -> List[int]:
+    """
+    Get the offsets of the lines, followed by the length of the text.
+    """
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def compute_text_edits(old_text: bytes, new_text: bytes) -> List[TextEdit]:
+    """
+    Compute the line-level edits transforming the old text into the new text.
+    :param old_text: the old content of the file
+    :param new_text: the new content of the file
+    :return: the non-overlapping edits in ascending order
+    """
+    old_lines = split_lines(old_text)
+    new_lines = split_lines(new_text)
+
+    # Strip the common prefix and suffix first, which are most of the lines in a typical change
+    prefix_length = 0
+    while (
+        prefix_length < len(old_lines)
+        and prefix_length < len(new_lines)
+        and old_lines[prefix_length] == new_lines[prefix_length]
+    ):
+        prefix_length += 1
+    suffix_length = 0
+    while (
+        suffix_length < len(old_lines) - prefix_length
+        and suffix_length < len(new_lines) - prefix_length
+        and old_lines[-1 - suffix_length] == new_lines[-1 - suffix_length]
+    ):
+        suffix_length += 1
+
+    old_middle = old_lines[prefix_length:len(old_lines) - suffix_length]
+    new_middle = new_lines[prefix_length:len(new_lines) - suffix_length]
+    if len(old_middle) == 0 and len(new_middle) == 0:
+        return []
+
+    if len(old_middle) == 0 or len(new_middle) == 0 or max(len(old_middle), len(new_middle)) > MAX_DIFF_LINES:
+        opcodes = [("replace", 0, len(old_middle), 0, len(new_middle))]
+    else:
+        matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+        opcodes = [opcode for opcode in matcher.get_opcodes() if opcode[0] != "equal"]
+
+    old_offsets = get_line_offsets(old_lines)
+    new_offsets = get_line_offsets(new_lines)
+    edits = []
+    for (_, old_start, old_end, new_start, new_end) in opcodes:
+        (old_start_byte, old_end_byte) = (old_offsets[prefix_length + old_start], old_offsets[prefix_length + old_end])
+        (new_start_byte, new_end_byte) = (new_offsets[prefix_length + new_start], new_offsets[prefix_length + new_end])
+        line_delta = new_text.count(b"\n", new_start_byte, new_end_byte) - old_text.count(b"\n", old_start_byte, old_end_byte)
+        edits.append(
+            TextEdit(old_start_byte, old_end_byte, new_start_byte, new_end_byte, prefix_length + old_start, line_delta)
+        )
+    return edits
+
+
+def get_end_point(start_row: int, text: bytes) -> Tuple[int, int]:
+    """
+    Get the (row, column) point at the end of the text inserted at the beginning of a row.
+    """
+    return (start_row + text.count(b"\n"), len(text) - (text.rfind(b"\n") + 1))
+
+
+def apply_text_edits(tree: tree_sitter.Tree, edits: List[TextEdit], old_text: bytes, new_text: bytes) -> None:
+    """
+    Apply the edits to the old parse tree, so that tree-sitter can reuse its unchanged subtrees.
+    The edits are applied from the last one, so that the positions of the preceding edits are still valid.
+    :param tree: the parse tree of the old text
+    :param edits: the edits transforming the old text into the new text
+    """
+    for edit in reversed(edits):
+        replaced_text = old_text[edit.old_start_byte:edit.old_end_byte]
+        inserted_text = new_text[edit.new_start_byte:edit.new_end_byte]
+        tree.edit(
+            start_byte=edit.old_start_byte,
+            old_end_byte=edit.old_end_byte,
+            new_end_byte=edit.old_start_byte + len(inserted_text),
+            start_point=(edit.old_start_row, 0),
+            old_end_point=get_end_point(edit.old_start_row, replaced_text),
+            new_end_point=get_end_point(edit.old_start_row, inserted_text),
+        )
+
+
+def map_range(edits: List[TextEdit], start_byte: int, end_byte: int) -> Tuple[int, int]:
+    """
+    Map a range of the old text to the new text.
+    A bound inside an edit is moved outwards to the bound of the new text of the edit.
+    :param edits: the non-overlapping edits in ascending order
+    """
+    bounds = []
+    for (offset, is_start) in [(start_byte, True), (end_byte, False)]:
+        delta = 0
+        new_offset = None
+        for edit in edits:
+            if edit.old_end_byte <= offset:
+                delta += edit.byte_delta
+            elif edit.old_start_byte < offset:
+                new_offset = edit.new_start_byte if is_start else edit.new_end_byte
+                break
+            else:
+                break
+        bounds.append(offset + delta if new_offset is None else new_offset)
+    return (bounds[0], bounds[1])
+
+
+def ranges_intersect(start_byte: int, end_byte: int, other_start_byte: int, other_end_byte: int) -> bool:
+    """
+    Check whether a changed range intersects the range of a node.
+    An empty changed range, i.e., a deletion, intersects the node only if it is strictly inside the node.
+    """
+    if start_byte == end_byte:
+        return other_start_byte < start_byte < other_end_byte
+    return start_byte < other_end_byte and end_byte > other_start_byte
@@ -0,0 +1,38 @@
+from bisect import bisect_left
+from typing import List
+
+
+class LineIndex:
+    """
+    Line index of a source file, which maps byte offsets to line numbers.
+    The offsets of newlines are computed once per file, and each lookup is a binary search,
+    instead of counting the newlines in the prefix of the file.
+    """
+
+    def __init__(self, source_code: bytes) -> None:
+        """
+        Build the line index of a source file.
+        :param source_code: The content of the source file, which is bytes or a mmap.
+        """
+        self.newline_offsets = LineIndex.find_newline_offsets(source_code)
+
+    @staticmethod
+    def find_newline_offsets(source_code: bytes) -> List[int]:
+        """
+        Find the offsets of all the newlines in the source code.
+        :param source_code: The content of the source file.
+        """
+        newline_offsets = []
+        offset = source_code.find(b"\n")
+        while offset != -1:
+            newline_offsets.append(offset)
+            offset = source_code.find(b"\n", offset + 1)
+        return newline_offsets
+
+    def line_number(self, offset: int) -> int:
+        """
+        Get the line number (starting from 1) of an offset.
+        It is equal to source_code[:offset].count(b"\\n") + 1.
+        :param offset: The byte offset in the source file.
+        """
+        return bisect_left(self.newline_offsets, offset) + 1
@@ -1,42 +1,79 @@
-import os
 import sys
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from os import path
-from enum import Enum
 from pathlib import Path
-from typing import List, Tuple, Dict, Set
+from typing import Iterable, Iterator, List, Tuple, Dict, Set, Union
 
 import tree_sitter
 from tree_sitter import Language
 from tqdm import tqdm
-import networkx as nx
 
 sys.path.append(path.dirname(path.dirname(path.dirname(path.abspath(__file__)))))
 
-from typing import List, Tuple, Dict
+from parser.line_index import LineIndex
+from parser.call_graph import CallGraph
+from parser.call_site_table import CallSiteTable
+from parser.function_index import FunctionIndex
+from parser.fact_cache import FactCache
+from parser.source_loader import decode_source, encode_source
+from parser.incremental import TextEdit, apply_text_edits, compute_text_edits, map_range, ranges_intersect
+from parser.ts_query import (
+    CALL_NODE_TYPES,
+    SCOPE_NODE_TYPES,
+    FunctionScope,
+    build_line_node_index,
+    get_fact_query,
+    iter_nodes,
+    iter_nodes_by_type,
+)
 
 
 class Function:
+    """
+    Basic facts of a function. The records are slotted, and keep neither the parse tree nor a copy of the code,
+    so that the functions of a large project stay compact. The parse tree is re-parsed on demand by TSAnalyzer.
+    """
+    __slots__ = (
+        "function_id",
+        "function_name",
+        "file_path",
+        "start_line_number",
+        "end_line_number",
+        "start_byte",
+        "end_byte",
+        "file_contents",
+        "paras",
+        "if_statements",
+        "loop_statements",
+    )
+
     def __init__(
         self,
         function_id: int,
         function_name: str,
-        function_code: str,
+        file_path: str,
         start_line_number: int,
         end_line_number: int,
-        function_node: tree_sitter.Node,
+        start_byte: int,
+        end_byte: int,
+        file_contents: Dict[str, bytes],
     ) -> None:
         """
         Record basic facts of the function
+        :param file_path: the path of the file, which identifies the file
+        :param file_contents: the contents of the files, which is shared by all the functions
         """
         self.function_id = function_id
-        self.function_name = function_name
-        self.function_code = function_code
+        self.function_name = sys.intern(function_name)
+        self.file_path = sys.intern(file_path)
         self.start_line_number = start_line_number
         self.end_line_number = end_line_number
 
-        # Attention: the parse tree is in the context of the whole file
-        self.parse_tree_root_node = function_node  # root node of the parse tree of the current function
-        self.call_site_nodes = []   # call site info
+        # Attention: the byte offsets are in the context of the whole file
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.file_contents = file_contents
 
         ## Results of AST node type analysis
         self.paras = set([])        # A set of (Expr, int) tuples, where int indicates the index of the parameter
@@ -45,24 +82,94 @@ class Function:
         self.if_statements = {}     # if statement info
         self.loop_statements = {}   # loop statement info
 
+    @property
+    def function_code(self) -> str:
+        """
+        The code of the function, which is decoded from the file content on each access instead of being kept as a copy
+        """
+        return decode_source(memoryview(self.file_contents[self.file_path])[self.start_byte:self.end_byte])
+
+
+# The maximal number of files in flight per worker process when the files are streamed into the workers
+MAX_PENDING_FILES_PER_JOB = 4
+
+# The version of the extracted facts, which is a part of the key in the fact cache.
+# Bump it whenever the extraction changes the facts of the same source file.
+FACT_EXTRACTOR_VERSION = 2
+
+# The number of parse trees kept in memory. The other trees are released, and re-parsed when they are needed
+DEFAULT_MAX_TREE_COUNT = 16
+
+# The number of line-to-node indexes of functions kept in memory. The indexed nodes keep their parse trees alive
+DEFAULT_MAX_LINE_NODE_INDEX_COUNT = 64
+
+
+class FunctionFacts:
+    """
+    Facts of a single function, which are extracted in one pass over the file.
+    Byte offsets are relative to the file. The names and the strings in the facts are decoded
+    from the slices of the file content when the facts are created.
+    The facts keep no tree_sitter nodes, so that they are picklable and never pin a parse tree.
+    """
+    def __init__(
+        self,
+        function_name: str,
+        start_line_number: int,
+        end_line_number: int,
+        start_byte: int,
+        end_byte: int,
+    ) -> None:
+        self.function_name = function_name
+        self.start_line_number = start_line_number
+        self.end_line_number = end_line_number
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+
+        self.call_sites = []        # A list of (callee_name, start_byte, end_byte) tuples
+        self.paras = set([])
+        self.if_statements = {}
+        self.loop_statements = {}
+
 
 class TSParser:
     """
     TSParser class for extracting information from source files using tree-sitter.
     """
 
-    def __init__(self, code_in_projects: Dict[str, str], language_setting: str) -> None:
+    def __init__(
+        self,
+        code_in_projects: Union[Dict[str, Union[str, bytes]], Iterable[Tuple[str, bytes]]],
+        language_setting: str,
+        fact_cache: FactCache = None,
+        max_tree_count: int = DEFAULT_MAX_TREE_COUNT,
+    ) -> None:
         """
         Initialize TSParser with a collection of source files.
-        :param code_in_projects: A dictionary containing the content of source files.
+        :param code_in_projects: A dictionary containing the content of source files,
+        or a stream of (file_path, content) pairs, e.g., from SourceLoader, which is consumed while the files are parsed.
+        :param fact_cache: The on-disk cache of the facts of unchanged files. The cache is disabled if it is None.
+        :param max_tree_count: The number of the most recently used parse trees kept in memory.
         """
-        self.code_in_projects = code_in_projects
+        if isinstance(code_in_projects, dict):
+            self.code_in_projects = code_in_projects
+            self.source_stream = None
+        else:
+            self.code_in_projects = {}
+            self.source_stream = code_in_projects
         self.language_setting = language_setting
+        self.fact_cache = fact_cache
 
         self.functionRawDataDic = {}
         self.functionNameToId = {}
         self.functionToFile = {}
-        self.fileContentDic = {}
+        self.fileContentDic = {}  # The content of each file, which is bytes or a mmap and is never decoded as a whole
+        self.fileLineIndexDic = {}  # The line index of each file, which is built once per file
+        # The recently used parse trees in the LRU order, which are reused when the files are re-parsed incrementally
+        self.fileTreeDic = OrderedDict()
+        self.max_tree_count = max_tree_count
+        self.fileToFunctionIds = {}
+        self.functionFactsDic = {}  # Facts of functions, which are consumed by TSAnalyzer
+        self.maxFunctionId = 0  # Function ids are never reused after functions are removed
 
         cwd = Path(__file__).resolve().parent.absolute()
         TSPATH = cwd / "../../lib/build/"
@@ -83,91 +190,399 @@ class TSParser:
 
         self.parser.set_language(self.language)
 
+        # The compiled query collecting the nodes of all kinds of facts
+        self.fact_query = get_fact_query(language_setting, self.language)
 
-    def parse_function_info(self, file_path: str, source_code: str, tree: tree_sitter.Tree) -> None:
-        """
-        Parse the function information in a source file.
-        :param file_path: The path of the source file.
-        :param source_code: The content of the source file.
-        :param tree: The parse tree of the source file.
-        """
-        all_function_header_nodes = []
 
+    def get_function_definition(
+        self, source_code: memoryview, line_index: LineIndex, header_node: tree_sitter.Node
+    ) -> Tuple[str, int, int, tree_sitter.Node]:
         """
-        Currently, we only handle four languages: C, C++, Java, and Python.
+        Get the function definition of a function header.
+        :param source_code: The view of the content of the source file.
+        :param line_index: The line index of the source file.
+        :param header_node: The header node of the function.
+        :return: A (function_name, start_line_number, end_line_number, function_node) tuple, or None if it is not a function definition.
         """
+        function_name = ""
+        for sub_node in header_node.children:
+            if sub_node.type == "identifier":
+                function_name = decode_source(source_code[sub_node.start_byte:sub_node.end_byte])
+                break
+            elif sub_node.type == "qualified_identifier":
+                qualified_function_name = decode_source(source_code[sub_node.start_byte:sub_node.end_byte])
+                function_name = qualified_function_name.split("::")[-1]
+
+        if function_name == "":
+            return None
+        
+        function_node = header_node.parent if self.language_setting in ["C", "C++"] else header_node
+
         if self.language_setting in ["C", "C++"]:
-            all_function_header_nodes = []
-            all_function_definition_nodes = TSAnalyzer.find_nodes_by_type(tree.root_node, "function_definition")
-            for function_definition_node in all_function_definition_nodes:
-                all_function_header_nodes.extend(TSAnalyzer.find_nodes_by_type(function_definition_node, "function_declarator"))
-        elif self.language_setting in ["Java"]:
-            all_function_header_nodes = TSAnalyzer.find_nodes_by_type(tree.root_node, "method_declaration")
-        elif self.language_setting in ["Python"]:
-            all_function_header_nodes = TSAnalyzer.find_nodes_by_type(tree.root_node, "function_definition")
-        else:
-            assert "Wrong language setting"                 
-    
-        for node in all_function_header_nodes:
-            function_name = ""
-            for sub_node in node.children:
-                if sub_node.type == "identifier":
-                    function_name = source_code[sub_node.start_byte:sub_node.end_byte]
+            is_function_definition = True
+            while True:
+                if function_node.type == "function_definition":
+                    break
+                function_node = function_node.parent
+                if function_node is None:
+                    is_function_definition = False
+                    break
+                if "statement" in function_node.type:
+                    is_function_definition = False
                     break
-                elif sub_node.type == "qualified_identifier":
-                    qualified_function_name = source_code[sub_node.start_byte:sub_node.end_byte]
-                    function_name = qualified_function_name.split("::")[-1]
+            if not is_function_definition:
+                return None
 
-            if function_name == "":
-                continue
-            
-            function_node = node.parent if self.language_setting in ["C", "C++"] else node
-
-            if self.language_setting in ["C", "C++"]:
-                is_function_definition = True
-                while True:
-                    if function_node.type == "function_definition":
-                        break
-                    function_node = function_node.parent
-                    if function_node is None:
-                        is_function_definition = False
-                        break
-                    if "statement" in function_node.type:
-                        is_function_definition = False
-                        break
-                if not is_function_definition:
+        start_line_number = line_index.line_number(function_node.start_byte)
+        end_line_number = line_index.line_number(function_node.end_byte)
+        return (function_name, start_line_number, end_line_number, function_node)
+
+
+    def extract_facts_in_single_tree(
+        self, source_code: memoryview, line_index: LineIndex, root_node: tree_sitter.Node
+    ) -> List[FunctionFacts]:
+        """
+        Extract the facts of all the functions in a parse tree with a single pass over the tree.
+        :param source_code: The view of the content of the source file, which is sliced without copying.
+        :param line_index: The line index of the source file.
+        :param root_node: The root node of the parse tree.
+        :return: The facts of the functions in the order of their headers.
+        """
+        """
+        Currently, we only handle four languages: C, C++, Java, and Python.
+        In C/C++, the function headers are the function declarators in function definitions.
+        In Java and Python, the function headers are the method declarations and function definitions, respectively.
+        """
+        all_scopes = self.fact_query.visit(root_node)
+        scope_of_nodes = {scope.node.id: scope for scope in all_scopes}
+
+        all_facts = []
+        for scope in all_scopes:
+            for header_node in scope.get("function_headers"):
+                function_definition = self.get_function_definition(source_code, line_index, header_node)
+                if function_definition is None:
                     continue
+                (function_name, start_line_number, end_line_number, function_node) = function_definition
+                all_facts.append(
+                    self.create_function_facts(
+                        source_code,
+                        line_index,
+                        function_name,
+                        start_line_number,
+                        end_line_number,
+                        scope_of_nodes[function_node.id],
+                    )
+                )
+        return all_facts
+
+
+    def create_function_facts(
+        self,
+        source_code: memoryview,
+        line_index: LineIndex,
+        function_name: str,
+        start_line_number: int,
+        end_line_number: int,
+        function_scope: FunctionScope,
+    ) -> FunctionFacts:
+        """
+        Create the facts of a function from the nodes collected in its scope.
+        The callees are not resolved until all the files are parsed.
+        :param source_code: The view of the content of the source file.
+        :param line_index: The line index of the source file.
+        :param function_scope: The scope of the function.
+        """
+        function_node = function_scope.node
+        facts = FunctionFacts(
+            function_name, start_line_number, end_line_number, function_node.start_byte, function_node.end_byte
+        )
+
+        for call_site_node in function_scope.get("call_sites"):
+            callee_name = TSAnalyzer.get_callee_name_at_call_site(call_site_node, source_code, self.language_setting)
+            facts.call_sites.append((callee_name, call_site_node.start_byte, call_site_node.end_byte))
+
+        facts.paras = TSAnalyzer.extract_paras(
+            self.language_setting, source_code, line_index, function_scope.get("parameters")
+        )
+        facts.if_statements = TSAnalyzer.extract_if_statements(
+            self.language_setting, source_code, line_index, function_scope.get("if_statements")
+        )
+        facts.loop_statements = TSAnalyzer.extract_loop_statements(
+            self.language_setting, source_code, line_index, function_scope.get("loop_statements")
+        )
+        return facts
+
+
+    def add_function(
+        self,
+        file_path: str,
+        function_name: str,
+        start_line_number: int,
+        end_line_number: int,
+        start_byte: int,
+        end_byte: int,
+    ) -> int:
+        """
+        Initialize the raw data of a function and register it in the name table.
+        The names and the paths are interned, so that the functions share a single copy of each of them.
+        :return: The id of the function.
+        """
+        file_path = sys.intern(file_path)
+        function_name = sys.intern(function_name)
+        self.maxFunctionId += 1
+        function_id = self.maxFunctionId
+        self.functionRawDataDic[function_id] = (
+            function_name,
+            start_line_number,
+            end_line_number,
+            start_byte,
+            end_byte,
+        )
+        self.functionToFile[function_id] = file_path
+        if file_path not in self.fileToFunctionIds:
+            self.fileToFunctionIds[file_path] = []
+        self.fileToFunctionIds[file_path].append(function_id)
+
+        if function_name not in self.functionNameToId:
+            self.functionNameToId[function_name] = set([])
+        self.functionNameToId[function_name].add(function_id)
+        return function_id
+
 
-            # Initialize the raw data of a function
-            start_line_number = source_code[: function_node.start_byte].count("\n") + 1
-            end_line_number = source_code[: function_node.end_byte].count("\n") + 1
-            function_id = len(self.functionRawDataDic) + 1
-            
-            self.functionRawDataDic[function_id] = (
-                function_name,
-                start_line_number,
-                end_line_number,
-                function_node
+    def remove_function(self, function_id: int) -> None:
+        """
+        Remove a function from the raw data and the name table.
+        :param function_id: The id of the function.
+        """
+        function_name = self.functionRawDataDic.pop(function_id)[0]
+        self.functionFactsDic.pop(function_id, None)
+        file_path = self.functionToFile.pop(function_id)
+        self.fileToFunctionIds[file_path].remove(function_id)
+
+        self.functionNameToId[function_name].discard(function_id)
+        if len(self.functionNameToId[function_name]) == 0:
+            del self.functionNameToId[function_name]
+        return
+
+
+    def parse_function_info(
+        self, file_path: str, source_code: bytes, line_index: LineIndex, tree: tree_sitter.Tree
+    ) -> None:
+        """
+        Parse the function information in a source file.
+        :param file_path: The path of the source file.
+        :param source_code: The content of the source file, which is bytes or a mmap.
+        :param line_index: The line index of the source file.
+        :param tree: The parse tree of the source file.
+        """
+        self.cache_tree(file_path, tree)
+        all_facts = self.extract_facts_in_single_tree(memoryview(source_code), line_index, tree.root_node)
+        if self.fact_cache is not None:
+            self.fact_cache.store(source_code, self.language_setting, FACT_EXTRACTOR_VERSION, all_facts)
+        self.register_function_facts(file_path, all_facts)
+        return
+
+
+    def register_function_facts(self, file_path: str, all_facts: List[FunctionFacts]) -> None:
+        """
+        Register the functions in a source file with their facts.
+        :param file_path: The path of the source file.
+        :param all_facts: The facts of the functions in the file.
+        """
+        for facts in all_facts:
+            function_id = self.add_function(
+                file_path,
+                facts.function_name,
+                facts.start_line_number,
+                facts.end_line_number,
+                facts.start_byte,
+                facts.end_byte,
             )
-            self.functionToFile[function_id] = file_path
-            
-            if function_name not in self.functionNameToId:
-                self.functionNameToId[function_name] = set([])
-            self.functionNameToId[function_name].add(function_id)
+            self.functionFactsDic[function_id] = facts
         return
-    
 
-    def parse_project(self) -> None:
+
+    def load_cached_facts(self, source_code: bytes) -> List[FunctionFacts]:
+        """
+        Load the facts of a source file from the fact cache.
+        :param source_code: The content of the source file.
+        :return: The facts of the functions in the file, or None if the file is not cached.
+        """
+        if self.fact_cache is None:
+            return None
+        return self.fact_cache.load(source_code, self.language_setting, FACT_EXTRACTOR_VERSION)
+
+
+    def parse_project(self, jobs: int = 1) -> None:
         """
         Parse the project.
+        :param jobs: The number of worker processes. Files are parsed serially if jobs <= 1.
         """
-        pbar = tqdm(total=len(self.code_in_projects), desc="Parsing files")
-        for file_path in self.code_in_projects:
+        if jobs > 1:
+            self.parse_project_in_parallel(jobs)
+            return
+
+        pbar = tqdm(total=self.get_file_count(), desc="Parsing files")
+        for (file_path, source_code) in self.iter_source_files():
             pbar.update(1)
-            source_code = self.code_in_projects[file_path]
-            tree = self.parser.parse(bytes(source_code, "utf8"))
-            self.parse_function_info(file_path, source_code, tree)
+            line_index = LineIndex(source_code)
+            cached_facts = self.load_cached_facts(source_code)
+            if cached_facts is None:
+                tree = self.parser.parse(source_code)
+                self.parse_function_info(file_path, source_code, line_index, tree)
+            else:
+                # The parse trees of cached files are not built until they are needed
+                self.register_function_facts(file_path, cached_facts)
             self.fileContentDic[file_path] = source_code
+            self.fileLineIndexDic[file_path] = line_index
+        pbar.close()
+        return
+
+
+    def parse_project_in_parallel(self, jobs: int) -> None:
+        """
+        Parse the project and extract the facts of functions in worker processes.
+        The parse trees are not sent back from the worker processes.
+        The files in the fact cache are not sent to the worker processes.
+        :param jobs: The number of worker processes.
+        """
+        facts_in_files = {}
+        if self.source_stream is None:
+            # Schedule the largest files first so that a few giant files do not become stragglers
+            source_files = sorted(self.iter_source_files(), key=lambda item: len(item[1]), reverse=True)
+        else:
+            # A stream is not buffered to be sorted, and is ordered by its producer, e.g., SourceScanner.scan
+            source_files = self.iter_source_files()
+
+        pbar = tqdm(total=self.get_file_count(), desc="Parsing files")
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=init_parse_worker, initargs=(self.language_setting,)
+        ) as executor:
+            futures = {}
+            for (file_path, source_code) in source_files:
+                self.fileContentDic[file_path] = source_code
+                cached_facts = self.load_cached_facts(source_code)
+                if cached_facts is not None:
+                    pbar.update(1)
+                    facts_in_files[file_path] = cached_facts
+                    continue
+                # Bound the files in flight so that a streamed project is not buffered in the task queue
+                while len(futures) >= MAX_PENDING_FILES_PER_JOB * jobs:
+                    (done_futures, _) = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done_futures:
+                        pbar.update(1)
+                        self.collect_facts_from_worker(futures.pop(future), future, facts_in_files)
+                # A mmap is copied into bytes to be sent to the worker, while bytes are sent as they are
+                futures[executor.submit(extract_facts_in_single_file, bytes(source_code))] = file_path
+            for future in as_completed(futures):
+                pbar.update(1)
+                self.collect_facts_from_worker(futures[future], future, facts_in_files)
+        pbar.close()
+
+        # Merge the facts in the original file order so that function ids are the same as the serial mode
+        for file_path in self.code_in_projects:
+            self.register_function_facts(file_path, facts_in_files[file_path])
+            self.fileLineIndexDic[file_path] = LineIndex(self.fileContentDic[file_path])
+        return
+
+
+    def collect_facts_from_worker(self, file_path: str, future, facts_in_files: Dict[str, List[FunctionFacts]]) -> None:
+        """
+        Collect the facts of a file extracted in a worker process, and store them in the fact cache.
+        """
+        facts_in_files[file_path] = future.result()
+        if self.fact_cache is not None:
+            self.fact_cache.store(
+                self.fileContentDic[file_path], self.language_setting, FACT_EXTRACTOR_VERSION, facts_in_files[file_path]
+            )
+        return
+
+
+    def iter_source_files(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Iterate the source files in order.
+        The contents are kept as bytes, and only the str contents in the dictionary are encoded.
+        The files in the source stream are recorded in code_in_projects as they are read.
+        :return: An iterator of (file_path, source_code) pairs, where source_code is bytes or a mmap.
+        """
+        if self.source_stream is None:
+            for (file_path, source) in self.code_in_projects.items():
+                yield (file_path, encode_source(source))
+            return
+        for (file_path, source_code) in self.source_stream:
+            self.code_in_projects[file_path] = source_code
+            yield (file_path, source_code)
+        self.source_stream = None
+
+
+    def get_file_count(self) -> int:
+        """
+        Get the number of source files, or None if the files are streamed.
+        """
+        return len(self.code_in_projects) if self.source_stream is None else None
+
+
+    def reparse_file(
+        self, file_path: str, source_code: Union[str, bytes]
+    ) -> Tuple[List[TextEdit], List[Tuple[int, int]]]:
+        """
+        Re-parse a changed source file incrementally.
+        The edits computed from the text diff are applied to the previous parse tree of the file,
+        which is reused by tree-sitter. A new file or a file without a parse tree is parsed from scratch.
+        :param file_path: The path of the source file.
+        :param source_code: The new content of the source file, which is a str or bytes.
+        :return: The edits from the old content to the new content,
+        and the byte ranges in the new content which are edited or whose syntactic structure is changed.
+        """
+        old_code = bytes(self.fileContentDic.get(file_path, b""))
+        new_code = bytes(encode_source(source_code))
+        edits = compute_text_edits(old_code, new_code)
+        if len(edits) == 0 and file_path in self.fileContentDic:
+            return ([], [])
+
+        changed_ranges = [(edit.new_start_byte, edit.new_end_byte) for edit in edits]
+        old_tree = self.fileTreeDic.get(file_path)
+        if old_tree is not None:
+            apply_text_edits(old_tree, edits, old_code, new_code)
+            tree = self.parser.parse(new_code, old_tree)
+            changed_ranges.extend(
+                (changed_range.start_byte, changed_range.end_byte) for changed_range in old_tree.changed_ranges(tree)
+            )
+        else:
+            # Without the previous tree, e.g., after it is evicted from the cache, the syntactic changes are unknown,
+            # so the whole file is treated as changed
+            tree = self.parser.parse(new_code)
+            changed_ranges.append((0, len(new_code)))
+
+        self.code_in_projects[file_path] = new_code
+        self.fileContentDic[file_path] = new_code
+        self.fileLineIndexDic[file_path] = LineIndex(new_code)
+        self.cache_tree(file_path, tree)
+        return (edits, changed_ranges)
+
+
+    def get_tree(self, file_path: str) -> tree_sitter.Tree:
+        """
+        Get the parse tree of a source file, which is re-parsed if it has been released.
+        :param file_path: The path of the source file.
+        """
+        tree = self.fileTreeDic.get(file_path)
+        if tree is None:
+            tree = self.parser.parse(self.fileContentDic[file_path])
+        self.cache_tree(file_path, tree)
+        return tree
+
+
+    def cache_tree(self, file_path: str, tree: tree_sitter.Tree) -> None:
+        """
+        Keep the parse tree of a source file as the most recently used one, and release the least recently used trees.
+        :param file_path: The path of the source file.
+        :param tree: The parse tree of the source file.
+        """
+        self.fileTreeDic[file_path] = tree
+        self.fileTreeDic.move_to_end(file_path)
+        while len(self.fileTreeDic) > self.max_tree_count:
+            self.fileTreeDic.popitem(last=False)
         return
 
 
@@ -178,114 +593,152 @@ class TSAnalyzer:
 
     def __init__(
         self,
-        code_in_projects: Dict[str, str],
+        code_in_projects: Union[Dict[str, Union[str, bytes]], Iterable[Tuple[str, bytes]]],
         language: str,
+        jobs: int = 1,
+        fact_cache: FactCache = None,
+        max_tree_count: int = DEFAULT_MAX_TREE_COUNT,
+        max_line_node_index_count: int = DEFAULT_MAX_LINE_NODE_INDEX_COUNT,
     ) -> None:
         """
         Initialize TSParser with the project path.
-        :param code_in_projects: A dictionary mapping file paths of source files to their contents
+        :param code_in_projects: A dictionary mapping file paths of source files to their contents,
+        or a stream of (file_path, content) pairs, which is parsed as it is read
+        :param jobs: The number of worker processes used to parse files and extract facts
+        :param fact_cache: the on-disk cache of the facts of unchanged files, which is disabled if it is None
+        :param max_tree_count: the number of parse trees kept in memory, while the others are re-parsed on demand
+        :param max_line_node_index_count: the number of line-to-node indexes of functions kept in memory
         """
-        self.ts_parser = TSParser(code_in_projects, language)
-        self.ts_parser.parse_project()
+        self.ts_parser = TSParser(code_in_projects, language, fact_cache, max_tree_count)
+        self.ts_parser.parse_project(jobs)
 
         # Each funcntion in the environments maintains the local meta data, including
         # (1) AST node type analysis
         # (2) intraprocedural control flow analysis
         self.environment = {}  
 
-        # Results of call graph analysis
-        self.caller_callee_map = {}
-        self.callee_caller_map = {}
-        self.call_graph = nx.DiGraph()
+        # Results of call graph analysis, which are exported to networkx by call_graph.to_networkx() on demand
+        self.call_graph = CallGraph()
+        self.call_graph.add_functions(self.ts_parser.functionRawDataDic)
+
+        # The call sites of all the functions, which are resolved in bulk into the call graph
+        self.call_site_table = CallSiteTable()
+
+        # The per-file interval index of the line ranges of the functions, which is built lazily
+        self.function_index = FunctionIndex()
+
+        # The LRU cache of the line-to-node indexes of functions, which are built on the first line query
+        self.lineNodeIndexDic = OrderedDict()
+        self.max_line_node_index_count = max_line_node_index_count
 
         pbar = tqdm(total=len(self.ts_parser.functionRawDataDic), desc="Analyzing functions")
         for function_id in self.ts_parser.functionRawDataDic:
             pbar.update(1)
-            (name, start_line_number, end_line_number, function_node) = (
-                self.ts_parser.functionRawDataDic[function_id]
-            )
-            file_content = self.ts_parser.fileContentDic[self.ts_parser.functionToFile[function_id]]
-            function_code = file_content[function_node.start_byte:function_node.end_byte]
-            current_function = Function(
-                function_id, name, function_code, start_line_number, end_line_number, function_node
-            )
-            current_function = self.extract_meta_data_in_single_function(current_function, file_content)
-            self.environment[function_id] = current_function
+            facts = self.ts_parser.functionFactsDic.pop(function_id)
+            current_function = self.create_function(function_id, facts)
+            self.environment[function_id] = self.merge_facts_of_single_function(current_function, facts)
         
         pbar.close()
 
         # initialize call graph
-        for caller_id in self.caller_callee_map:
-            for callee_id in self.caller_callee_map[caller_id]:
-                self.call_graph.add_edge(caller_id, callee_id)
+        self.resolve_call_sites()
         return
     
 
-    def extract_meta_data_in_single_function(
-        self, current_function: Function, file_content: str
-    ) -> Function:
+    def create_function(self, function_id: int, facts: FunctionFacts) -> Function:
         """
-        Extract meta data in a single function
-        :param current_function: the function to be analyzed
-        :param file_content: the content of the file
+        Create a function from its facts, which are not merged yet
+        :param function_id: the id of the function
+        :param facts: the facts of the function
         """
-        # Identify call site info and maintain the environment
-        function_call_node_type = ""
-        if self.ts_parser.language_setting in ["C", "C++"]:
-            function_call_node_type = "call_expression"
-        elif self.ts_parser.language_setting in ["Java"]:
-            function_call_node_type = "method_invocation"
-        elif self.ts_parser.language_setting in ["Python"]:
-            function_call_node_type = "call"
+        return Function(
+            function_id,
+            facts.function_name,
+            self.ts_parser.functionToFile[function_id],
+            facts.start_line_number,
+            facts.end_line_number,
+            facts.start_byte,
+            facts.end_byte,
+            self.ts_parser.fileContentDic,
+        )
 
-        all_call_sites = self.find_nodes_by_type(current_function.parse_tree_root_node, function_call_node_type)
-        white_call_sites = []
 
+    def extract_meta_data_in_single_function(self, current_function: Function) -> Function:
+        """
+        Extract meta data in a single function from the content of its file.
+        The call sites are resolved later by resolve_call_sites, which is called once for a batch of functions.
+        :param current_function: the function to be analyzed
+        """
         file_id = self.ts_parser.functionToFile[current_function.function_id]
         file_content = self.ts_parser.fileContentDic[file_id]
-        
-        # Over-approximate the caller-callee relationship via function names, achieved by find_callee
-        for call_site_node in all_call_sites:
-            callee_ids = self.find_callee(file_content, call_site_node)
-            if len(callee_ids) > 0:
-                # Update the call graph
-                for callee_id in callee_ids:
-                    caller_id = current_function.function_id
-                    if caller_id not in self.caller_callee_map:
-                        self.caller_callee_map[caller_id] = set([])
-                    self.caller_callee_map[caller_id].add(callee_id)
-                    if callee_id not in self.callee_caller_map:
-                        self.callee_caller_map[callee_id] = set([])
-                    self.callee_caller_map[callee_id].add(caller_id)
-                white_call_sites.append(call_site_node)
-
-        current_function.call_site_nodes = white_call_sites
+        line_index = self.ts_parser.fileLineIndexDic[file_id]
+
+        function_node = self.get_parse_tree_root_node(current_function)
+        function_scope = self.ts_parser.fact_query.visit(function_node)[0]
+        facts = self.ts_parser.create_function_facts(
+            memoryview(file_content),
+            line_index,
+            current_function.function_name,
+            current_function.start_line_number,
+            current_function.end_line_number,
+            function_scope,
+        )
+        self.call_site_table.remove_callers([current_function.function_id])
+        self.merge_facts_of_single_function(current_function, facts)
+        return current_function
+
+
+    def merge_facts_of_single_function(self, current_function: Function, facts: FunctionFacts) -> Function:
+        """
+        Merge the facts of a function into the function and the call site table.
+        The call sites are resolved later by resolve_call_sites.
+        :param current_function: the function to be analyzed
+        :param facts: the facts of the function
+        """
+        self.call_site_table.add_call_sites(current_function.function_id, current_function.file_path, facts.call_sites)
 
         # AST node type analysis
-        current_function.paras = self.find_paras(current_function, file_content)
+        current_function.paras = facts.paras
 
         # Intraprocedural control flow analysis
-        current_function.if_statements = self.find_if_statements(
-            file_content,
-            current_function.parse_tree_root_node,
-        )
+        current_function.if_statements = facts.if_statements
+        current_function.loop_statements = facts.loop_statements
+        return current_function
 
-        current_function.loop_statements = self.find_loop_statements(
-            file_content,
-            current_function.parse_tree_root_node,
+
+    def get_parse_tree_root_node(self, function: Function) -> tree_sitter.Node:
+        """
+        Get the root node of the parse tree of the function.
+        The node is not kept in the function, and the file is re-parsed if its tree has been released.
+        :param function: the function
+        """
+        tree = self.ts_parser.get_tree(function.file_path)
+        return TSAnalyzer.find_node_in_range(
+            tree.root_node, function.start_byte, function.end_byte, SCOPE_NODE_TYPES[self.ts_parser.language_setting]
         )
 
-        return current_function
+
+    def get_call_site_nodes(self, function: Function) -> List[tree_sitter.Node]:
+        """
+        Get the nodes of the call sites with resolved callees in the function.
+        :param function: the function
+        """
+        tree = self.ts_parser.get_tree(function.file_path)
+        call_node_types = CALL_NODE_TYPES[self.ts_parser.language_setting]
+        return [
+            TSAnalyzer.find_node_in_range(tree.root_node, start_byte, end_byte, call_node_types)
+            for (start_byte, end_byte) in self.call_site_table.get_resolved_call_site_ranges(function.function_id)
+        ]
 
     #################################################
     ########## Call Graph Analysis ##################
     #################################################
     @staticmethod
-    def get_callee_name_at_call_site(node: tree_sitter.Node, source_code: str, language: str) -> str:
+    def get_callee_name_at_call_site(node: tree_sitter.Node, source_code: memoryview, language: str) -> str:
         """
         Get the callee name at the call site.
         :param node: the node of the call site
-        :param source_code: the content of the file
+        :param source_code: the view of the content of the file
         :param language: the language of the source code
         """
         if language in ["C", "C++", "Java"]:
@@ -297,7 +750,9 @@ class TSAnalyzer:
                     for sub_sub_node in sub_node.children:
                         sub_sub_nodes.append(sub_sub_node)
                 break
-            sub_sub_node_types = [source_code[sub_sub_node.start_byte:sub_sub_node.end_byte] for sub_sub_node in sub_sub_nodes]  
+            sub_sub_node_types = [
+                decode_source(source_code[sub_sub_node.start_byte:sub_sub_node.end_byte]) for sub_sub_node in sub_sub_nodes
+            ]  
             index_of_last_dot = len(sub_sub_node_types) - 1 - sub_sub_node_types[::-1].index(".") if "." in sub_sub_node_types else -1
             index_of_last_arrow = len(sub_sub_node_types) - 1 - sub_sub_node_types[::-1].index("->") if "->" in sub_sub_node_types else -1
             function_name = sub_sub_node_types[max(index_of_last_dot, index_of_last_arrow) + 1]
@@ -307,16 +762,29 @@ class TSAnalyzer:
                 if sub_node.type == "attribute":
                     for sub_sub_node in reversed(sub_node.children):
                         if sub_sub_node.type == "identifier":
-                            return source_code[sub_sub_node.start_byte:sub_sub_node.end_byte]
+                            return decode_source(source_code[sub_sub_node.start_byte:sub_sub_node.end_byte])
         return ""
     
-    def find_callee(self, file_content: str, call_site_node: tree_sitter.Node) -> List[int]:
+    def resolve_call_sites(self) -> None:
+        """
+        Resolve all the call sites in the call site table against the function names in one join,
+        and rebuild the call graph from the resolved calls.
+        The caller-callee relationship is over-approximated via function names.
+        """
+        (caller_ids, callee_ids) = self.call_site_table.resolve(self.ts_parser.functionNameToId)
+        self.call_graph.set_edges(caller_ids, callee_ids)
+        self.call_graph.build()
+        return
+
+    def find_callee(self, file_content: Union[str, bytes], call_site_node: tree_sitter.Node) -> List[int]:
         """
         Find the callee function of the call site.
         :param file_content: the content of the file
         :param call_site_node: the node of the call site
         """
-        callee_name = self.get_callee_name_at_call_site(call_site_node, file_content, self.ts_parser.language_setting)
+        callee_name = self.get_callee_name_at_call_site(
+            call_site_node, memoryview(encode_source(file_content)), self.ts_parser.language_setting
+        )
         callee_ids = []
         if callee_name in self.ts_parser.functionNameToId:
             callee_ids.extend(list(self.ts_parser.functionNameToId[callee_name]))
@@ -329,62 +797,70 @@ class TSAnalyzer:
     # The following three versions para-extraction functions may be verbose and redundant
     # However, we keep them as they may need to be extended for more complex cases separately in the future
 
-    def find_paras(self, current_function: Function, file_content: str) -> Set[Tuple[str, int, int]]:
+    @staticmethod
+    def extract_paras(
+        language: str,
+        file_content: memoryview,
+        line_index: LineIndex,
+        parameters: List[Tuple[tree_sitter.Node, List[tree_sitter.Node]]],
+    ) -> Set[Tuple[str, int, int]]:
         """
-        Find the parameters in the function.
-        :param file_content: the content of the file
-        :param node: the node of the function
-        """
-        if self.ts_parser.language_setting in ["C", "C++"]:
-            return self.extract_paras_in_C_CPP(current_function, file_content)
-        elif self.ts_parser.language_setting in ["Java"]:
-            return self.extract_paras_in_Java(current_function, file_content)
-        elif self.ts_parser.language_setting in ["Python"]:
-            return self.extract_paras_in_Python(current_function, file_content)
+        Extract the parameters in the function according to the language.
+        :param language: the language of the source code
+        :param file_content: the view of the content of the file
+        :param line_index: the line index of the file
+        :param parameters: the (parameter_node, identifier_nodes) pairs collected in the function
+        """
+        if language in ["C", "C++"]:
+            return TSAnalyzer.extract_paras_in_C_CPP(file_content, line_index, parameters)
+        elif language in ["Java"]:
+            return TSAnalyzer.extract_paras_in_Java(file_content, line_index, parameters)
+        elif language in ["Python"]:
+            return TSAnalyzer.extract_paras_in_Python(file_content, line_index, parameters)
         return set([])
 
 
-    def extract_paras_in_C_CPP(self, current_function: Function, file_content: str) -> Set[Tuple[str, int, int]]:
+    @staticmethod
+    def extract_paras_in_C_CPP(file_content: memoryview, line_index: LineIndex, parameters: List) -> Set[Tuple[str, int, int]]:
         paras = set([])
-        parameters = self.find_nodes_by_type(current_function.parse_tree_root_node, "parameter_declaration")
         index = 0
-        for parameter_node in parameters:
-            for sub_node in TSAnalyzer.find_nodes_by_type(parameter_node, "identifier"):                
-                parameter_name = file_content[sub_node.start_byte:sub_node.end_byte]
-                line_number = file_content[:sub_node.start_byte].count("\n") + 1
+        for (parameter_node, identifier_nodes) in parameters:
+            for sub_node in identifier_nodes:
+                parameter_name = decode_source(file_content[sub_node.start_byte:sub_node.end_byte])
+                line_number = line_index.line_number(sub_node.start_byte)
                 paras.add((parameter_name, line_number, index))
                 index += 1
         return paras
 
 
-    def extract_paras_in_Java(self, current_function: Function, file_content: str) -> Set[Tuple[str, int, int]]:
+    @staticmethod
+    def extract_paras_in_Java(file_content: memoryview, line_index: LineIndex, parameters: List) -> Set[Tuple[str, int, int]]:
         paras = set([])
-        parameters = self.find_nodes_by_type(current_function.parse_tree_root_node, "formal_parameter")
         index = 0
-        for parameter_node in parameters:
-            for sub_node in TSAnalyzer.find_nodes_by_type(parameter_node, "identifier"):                
-                parameter_name = file_content[sub_node.start_byte:sub_node.end_byte]
-                line_number = file_content[:sub_node.start_byte].count("\n") + 1
+        for (parameter_node, identifier_nodes) in parameters:
+            for sub_node in identifier_nodes:
+                parameter_name = decode_source(file_content[sub_node.start_byte:sub_node.end_byte])
+                line_number = line_index.line_number(sub_node.start_byte)
                 paras.add((parameter_name, line_number, index))
                 index += 1
         return paras
     
 
-    def extract_paras_in_Python(self, current_function: Function, file_content: str) -> Set[Tuple[str, int, int]]:
+    @staticmethod
+    def extract_paras_in_Python(file_content: memoryview, line_index: LineIndex, parameters: List) -> Set[Tuple[str, int, int]]:
         paras = set([])
-        parameters = self.find_nodes_by_type(current_function.parse_tree_root_node, "parameters")
         index = 0
-        for parameter_node in parameters:
+        for (parameter_node, _) in parameters:
             for parameter in parameter_node.children:
                 if parameter.type == "identifier":
-                    parameter_name = file_content[parameter.start_byte:parameter.end_byte]
-                    line_number = file_content[:parameter.start_byte].count("\n") + 1
+                    parameter_name = decode_source(file_content[parameter.start_byte:parameter.end_byte])
+                    line_number = line_index.line_number(parameter.start_byte)
                     paras.add((parameter_name, line_number, index))
                     index += 1
                 elif parameter.type == "typed_parameter":
                     para_identifier_node = parameter.children[0]
-                    parameter_name = file_content[para_identifier_node.start_byte:para_identifier_node.end_byte]
-                    line_number = file_content[:para_identifier_node.start_byte].count("\n") + 1
+                    parameter_name = decode_source(file_content[para_identifier_node.start_byte:para_identifier_node.end_byte])
+                    line_number = line_index.line_number(para_identifier_node.start_byte)
                     paras.add((parameter_name, line_number, index))
                     index += 1
         return paras
@@ -397,11 +873,10 @@ class TSAnalyzer:
     # However, we keep them as they may need to be extended for more complex cases separately in the future
 
     @staticmethod
-    def extract_meta_data_of_Java_if_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_Java_if_statements(source_code, line_index, if_statement_nodes) -> Dict[Tuple, Tuple]:
         """
         Extract meta data of if statements in Java
         """
-        if_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "if_statement")
         if_statements = {}
 
         for if_statement_node in if_statement_nodes:
@@ -416,22 +891,16 @@ class TSAnalyzer:
             block_num = 0
             for sub_target in if_statement_node.children:
                 if sub_target.type == "parenthesized_expression":
-                    condition_start_line = (
-                        source_code[: sub_target.start_byte].count("\n") + 1
-                    )
-                    condition_end_line = (
-                        source_code[: sub_target.end_byte].count("\n") + 1
-                    )
-                    condition_str = source_code[
-                        sub_target.start_byte : sub_target.end_byte
-                    ]
+                    condition_start_line = line_index.line_number(sub_target.start_byte)
+                    condition_end_line = line_index.line_number(sub_target.end_byte)
+                    condition_str = decode_source(source_code[sub_target.start_byte:sub_target.end_byte])
                 if sub_target.type == "block":
                     lower_lines = []
                     upper_lines = []
                     for sub_sub_target in sub_target.children:
                         if sub_sub_target.type not in {"{", "}"}:
-                            lower_lines.append(source_code[: sub_sub_target.start_byte].count("\n") + 1)
-                            upper_lines.append(source_code[: sub_sub_target.end_byte].count("\n") + 1)
+                            lower_lines.append(line_index.line_number(sub_sub_target.start_byte))
+                            upper_lines.append(line_index.line_number(sub_sub_target.end_byte))
                     if len(upper_lines) == 0 or len(lower_lines) == 0:
                         continue
                     
@@ -444,11 +913,11 @@ class TSAnalyzer:
                         else_branch_end_line = max(upper_lines)
                         block_num += 1
                 if sub_target.type == "expression_statement":
-                    true_branch_start_line = source_code[: sub_target.start_byte].count("\n") + 1
-                    true_branch_end_line = source_code[: sub_target.end_byte].count("\n") + 1
+                    true_branch_start_line = line_index.line_number(sub_target.start_byte)
+                    true_branch_end_line = line_index.line_number(sub_target.end_byte)
                     
-            if_statement_start_line = source_code[: if_statement_node.start_byte].count("\n") + 1
-            if_statement_end_line = source_code[: if_statement_node.end_byte].count("\n") + 1
+            if_statement_start_line = line_index.line_number(if_statement_node.start_byte)
+            if_statement_end_line = line_index.line_number(if_statement_node.end_byte)
             line_scope = (if_statement_start_line, if_statement_end_line)
             info = (
                         condition_start_line,
@@ -462,11 +931,10 @@ class TSAnalyzer:
     
 
     @staticmethod
-    def extract_meta_data_of_C_CPP_if_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_C_CPP_if_statements(source_code, line_index, if_statement_nodes) -> Dict[Tuple, Tuple]:
         """
         Extract meta data of if statements in C/C++
         """
-        if_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "if_statement")
         if_statements = {}
 
         for if_statement_node in if_statement_nodes:
@@ -480,32 +948,18 @@ class TSAnalyzer:
 
             for sub_target in if_statement_node.children:
                 if sub_target.type in ["parenthesized_expression", "condition_clause"]:
-                    condition_start_line = (
-                        source_code[: sub_target.start_byte].count("\n") + 1
-                    )
-                    condition_end_line = (
-                        source_code[: sub_target.end_byte].count("\n") + 1
-                    )
-                    condition_str = source_code[
-                        sub_target.start_byte : sub_target.end_byte
-                    ]
+                    condition_start_line = line_index.line_number(sub_target.start_byte)
+                    condition_end_line = line_index.line_number(sub_target.end_byte)
+                    condition_str = decode_source(source_code[sub_target.start_byte:sub_target.end_byte])
                 if "statement" in sub_target.type:
-                    true_branch_start_line = (
-                        source_code[: sub_target.start_byte].count("\n") + 1
-                    )
-                    true_branch_end_line = (
-                        source_code[: sub_target.end_byte].count("\n") + 1
-                    )
+                    true_branch_start_line = line_index.line_number(sub_target.start_byte)
+                    true_branch_end_line = line_index.line_number(sub_target.end_byte)
                 if sub_target.type == "else_clause":
-                    else_branch_start_line = (
-                        source_code[: sub_target.start_byte].count("\n") + 1
-                    )
-                    else_branch_end_line = (
-                        source_code[: sub_target.end_byte].count("\n") + 1
-                    )
+                    else_branch_start_line = line_index.line_number(sub_target.start_byte)
+                    else_branch_end_line = line_index.line_number(sub_target.end_byte)
 
-            if_statement_start_line = source_code[: if_statement_node.start_byte].count("\n") + 1
-            if_statement_end_line = source_code[: if_statement_node.end_byte].count("\n") + 1
+            if_statement_start_line = line_index.line_number(if_statement_node.start_byte)
+            if_statement_end_line = line_index.line_number(if_statement_node.end_byte)
             line_scope = (if_statement_start_line, if_statement_end_line)
             info = (
                 condition_start_line,
@@ -519,33 +973,32 @@ class TSAnalyzer:
     
 
     @staticmethod
-    def extract_meta_data_of_Python_if_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_Python_if_statements(source_code, line_index, if_statement_nodes) -> Dict[Tuple, Tuple]:
         """
         Extract meta data of if statements in Python
         TODO: Current implementation only extract the condition of if-statements
         The branch conditions of elif_clause are not handled.
         """
-        if_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "if_statement")
         if_statements = {}
 
         for if_statement_node in if_statement_nodes:
             sub_node_types = if_statement_node.children
 
-            condition_str = source_code[sub_node_types[1].start_byte:sub_node_types[1].end_byte]
-            condition_start_line = source_code[: sub_node_types[1].start_byte].count("\n") + 1
-            condition_end_line = source_code[: sub_node_types[1].end_byte].count("\n") + 1
-            true_branch_start_line = source_code[: sub_node_types[3].start_byte].count("\n") + 1
-            true_branch_end_line = source_code[: sub_node_types[3].end_byte].count("\n") + 1
+            condition_str = decode_source(source_code[sub_node_types[1].start_byte:sub_node_types[1].end_byte])
+            condition_start_line = line_index.line_number(sub_node_types[1].start_byte)
+            condition_end_line = line_index.line_number(sub_node_types[1].end_byte)
+            true_branch_start_line = line_index.line_number(sub_node_types[3].start_byte)
+            true_branch_end_line = line_index.line_number(sub_node_types[3].end_byte)
 
             if "else_clause" in [sub_node.type for sub_node in sub_node_types] or "elif_clause" in [sub_node.type for sub_node in sub_node_types]:
-                else_branch_start_line = source_code[: sub_node_types[4].start_byte].count("\n") + 1
-                else_branch_end_line = source_code[: if_statement_node.end_byte].count("\n") + 1
+                else_branch_start_line = line_index.line_number(sub_node_types[4].start_byte)
+                else_branch_end_line = line_index.line_number(if_statement_node.end_byte)
             else:
                 else_branch_start_line = 0
                 else_branch_end_line = 0
 
-            if_statement_start_line = source_code[: if_statement_node.start_byte].count("\n") + 1
-            if_statement_end_line = source_code[: if_statement_node.end_byte].count("\n") + 1
+            if_statement_start_line = line_index.line_number(if_statement_node.start_byte)
+            if_statement_end_line = line_index.line_number(if_statement_node.end_byte)
             line_scope = (if_statement_start_line, if_statement_end_line)
             info = (
                 condition_start_line,
@@ -558,30 +1011,33 @@ class TSAnalyzer:
         return if_statements
                 
 
-    def find_if_statements(self, source_code, root_node) -> Dict[Tuple, Tuple]:
+    @staticmethod
+    def extract_if_statements(language: str, source_code, line_index, if_statement_nodes) -> Dict[Tuple, Tuple]:
         """
-        Find all the if statements in the function
-        :param source_code: the content of the function
-        :param root_node: the root node of the parse tree
+        Extract the meta data of if statements according to the language
+        :param language: the language of the source code
+        :param source_code: the content of the file
+        :param line_index: the line index of the file
+        :param if_statement_nodes: the if statement nodes collected in the function
         """
-        if self.ts_parser.language_setting in ["C", "C++"]:
-            return self.extract_meta_data_of_C_CPP_if_statements(source_code, root_node)
-        elif self.ts_parser.language_setting in ["Java"]:
-            return self.extract_meta_data_of_Java_if_statements(source_code, root_node)
-        elif self.ts_parser.language_setting in ["Python"]:
-            return self.extract_meta_data_of_Python_if_statements(source_code, root_node)
+        if language in ["C", "C++"]:
+            return TSAnalyzer.extract_meta_data_of_C_CPP_if_statements(source_code, line_index, if_statement_nodes)
+        elif language in ["Java"]:
+            return TSAnalyzer.extract_meta_data_of_Java_if_statements(source_code, line_index, if_statement_nodes)
+        elif language in ["Python"]:
+            return TSAnalyzer.extract_meta_data_of_Python_if_statements(source_code, line_index, if_statement_nodes)
 
 
     @staticmethod
-    def extract_meta_data_of_Java_loop_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_Java_loop_statements(source_code, line_index, loop_nodes) -> Dict[Tuple, Tuple]:
         loop_statements = {}
-        for_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "for_statement")
-        for_statement_nodes.extend(TSAnalyzer.find_nodes_by_type(root_node, "enhanced_for_statement"))
-        while_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "while_statement")
+        for_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "for_statement"]
+        for_statement_nodes.extend([loop_node for loop_node in loop_nodes if loop_node.type == "enhanced_for_statement"])
+        while_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "while_statement"]
 
         for loop_node in for_statement_nodes:
-            loop_start_line = source_code[: loop_node.start_byte].count("\n") + 1
-            loop_end_line = source_code[: loop_node.end_byte].count("\n") + 1
+            loop_start_line = line_index.line_number(loop_node.start_byte)
+            loop_end_line = line_index.line_number(loop_node.end_byte)
 
             header_line_start = 0
             header_line_end = 0
@@ -594,24 +1050,24 @@ class TSAnalyzer:
 
             for loop_child_node in loop_node.children:
                 if loop_child_node.type == "(":
-                    header_line_start = source_code[: loop_child_node.start_byte].count("\n") + 1
+                    header_line_start = line_index.line_number(loop_child_node.start_byte)
                     header_start_byte = loop_child_node.end_byte
                 if loop_child_node.type == ")":
-                    header_line_end = source_code[: loop_child_node.end_byte].count("\n") + 1
+                    header_line_end = line_index.line_number(loop_child_node.end_byte)
                     header_end_byte = loop_child_node.start_byte
-                    header_str = source_code[header_start_byte: header_end_byte]
+                    header_str = decode_source(source_code[header_start_byte:header_end_byte])
                 if loop_child_node.type == "block":
                     lower_lines = []
                     upper_lines = []
                     for loop_child_child_node in loop_child_node.children:
                         if loop_child_child_node.type not in {"{", "}"}:
-                            lower_lines.append(source_code[: loop_child_child_node.start_byte].count("\n") + 1)
-                            upper_lines.append(source_code[: loop_child_child_node.end_byte].count("\n") + 1)
+                            lower_lines.append(line_index.line_number(loop_child_child_node.start_byte))
+                            upper_lines.append(line_index.line_number(loop_child_child_node.end_byte))
                     loop_body_start_line = min(lower_lines)
                     loop_body_end_line = max(upper_lines)
                 if loop_child_node.type == "expression_statement":
-                    loop_body_start_line = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    loop_body_end_line = source_code[: loop_child_node.end_byte].count("\n") + 1
+                    loop_body_start_line = line_index.line_number(loop_child_node.start_byte)
+                    loop_body_end_line = line_index.line_number(loop_child_node.end_byte)
             loop_statements[(loop_start_line, loop_end_line)] = (
                 header_line_start,
                 header_line_end,
@@ -621,8 +1077,8 @@ class TSAnalyzer:
             )
 
         for loop_node in while_statement_nodes:
-            loop_start_line = source_code[: loop_node.start_byte].count("\n") + 1
-            loop_end_line = source_code[: loop_node.end_byte].count("\n") + 1
+            loop_start_line = line_index.line_number(loop_node.start_byte)
+            loop_end_line = line_index.line_number(loop_node.end_byte)
 
             header_line_start = 0
             header_line_end = 0
@@ -632,16 +1088,16 @@ class TSAnalyzer:
 
             for loop_child_node in loop_node.children:
                 if loop_child_node.type == "parenthesized_expression":
-                    header_line_start = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    header_line_end = source_code[: loop_child_node.end_byte].count("\n") + 1
-                    header_str = source_code[loop_child_node.start_byte: loop_child_node.end_byte]
+                    header_line_start = line_index.line_number(loop_child_node.start_byte)
+                    header_line_end = line_index.line_number(loop_child_node.end_byte)
+                    header_str = decode_source(source_code[loop_child_node.start_byte:loop_child_node.end_byte])
                 if loop_child_node.type == "block":
                     lower_lines = []
                     upper_lines = []
                     for loop_child_child_node in loop_child_node.children:
                         if loop_child_child_node.type not in {"{", "}"}:
-                            lower_lines.append(source_code[: loop_child_child_node.start_byte].count("\n") + 1)
-                            upper_lines.append(source_code[: loop_child_child_node.end_byte].count("\n") + 1)
+                            lower_lines.append(line_index.line_number(loop_child_child_node.start_byte))
+                            upper_lines.append(line_index.line_number(loop_child_child_node.end_byte))
                     loop_body_start_line = min(lower_lines)
                     loop_body_end_line = max(upper_lines)
             loop_statements[(loop_start_line, loop_end_line)] = (
@@ -655,14 +1111,14 @@ class TSAnalyzer:
 
 
     @staticmethod
-    def extract_meta_data_of_C_CPP_while_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_C_CPP_while_statements(source_code, line_index, loop_nodes) -> Dict[Tuple, Tuple]:
         loop_statements = {}
-        for_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "for_statement")
-        while_statement_nodes = TSAnalyzer.find_nodes_by_type(root_node, "while_statement")
+        for_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "for_statement"]
+        while_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "while_statement"]
 
         for loop_node in for_statement_nodes:
-            loop_start_line = source_code[: loop_node.start_byte].count("\n") + 1
-            loop_end_line = source_code[: loop_node.end_byte].count("\n") + 1
+            loop_start_line = line_index.line_number(loop_node.start_byte)
+            loop_end_line = line_index.line_number(loop_node.end_byte)
 
             header_line_start = 0
             header_line_end = 0
@@ -675,24 +1131,24 @@ class TSAnalyzer:
 
             for loop_child_node in loop_node.children:
                 if loop_child_node.type == "(":
-                    header_line_start = source_code[: loop_child_node.start_byte].count("\n") + 1
+                    header_line_start = line_index.line_number(loop_child_node.start_byte)
                     header_start_byte = loop_child_node.end_byte
                 if loop_child_node.type == ")":
-                    header_line_end = source_code[: loop_child_node.end_byte].count("\n") + 1
+                    header_line_end = line_index.line_number(loop_child_node.end_byte)
                     header_end_byte = loop_child_node.start_byte
-                    header_str = source_code[header_start_byte: header_end_byte]
+                    header_str = decode_source(source_code[header_start_byte:header_end_byte])
                 if loop_child_node.type == "block":
                     lower_lines = []
                     upper_lines = []
                     for loop_child_child_node in loop_child_node.children:
                         if loop_child_child_node.type not in {"{", "}"}:
-                            lower_lines.append(source_code[: loop_child_child_node.start_byte].count("\n") + 1)
-                            upper_lines.append(source_code[: loop_child_child_node.end_byte].count("\n") + 1)
+                            lower_lines.append(line_index.line_number(loop_child_child_node.start_byte))
+                            upper_lines.append(line_index.line_number(loop_child_child_node.end_byte))
                     loop_body_start_line = min(lower_lines)
                     loop_body_end_line = max(upper_lines)
                 if "statement" in loop_child_node.type:
-                    loop_body_start_line = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    loop_body_end_line = source_code[: loop_child_node.end_byte].count("\n") + 1
+                    loop_body_start_line = line_index.line_number(loop_child_node.start_byte)
+                    loop_body_end_line = line_index.line_number(loop_child_node.end_byte)
             loop_statements[(loop_start_line, loop_end_line)] = (
                 header_line_start,
                 header_line_end,
@@ -702,8 +1158,8 @@ class TSAnalyzer:
             )
 
         for loop_node in while_statement_nodes:
-            loop_start_line = source_code[: loop_node.start_byte].count("\n") + 1
-            loop_end_line = source_code[: loop_node.end_byte].count("\n") + 1
+            loop_start_line = line_index.line_number(loop_node.start_byte)
+            loop_end_line = line_index.line_number(loop_node.end_byte)
 
             header_line_start = 0
             header_line_end = 0
@@ -713,16 +1169,16 @@ class TSAnalyzer:
 
             for loop_child_node in loop_node.children:
                 if loop_child_node.type == "parenthesized_expression":
-                    header_line_start = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    header_line_end = source_code[: loop_child_node.end_byte].count("\n") + 1
-                    header_str = source_code[loop_child_node.start_byte: loop_child_node.end_byte]
+                    header_line_start = line_index.line_number(loop_child_node.start_byte)
+                    header_line_end = line_index.line_number(loop_child_node.end_byte)
+                    header_str = decode_source(source_code[loop_child_node.start_byte:loop_child_node.end_byte])
                 if "statement" in loop_child_node.type:
                     lower_lines = []
                     upper_lines = []
                     for loop_child_child_node in loop_child_node.children:
                         if loop_child_child_node.type not in {"{", "}"}:
-                            lower_lines.append(source_code[: loop_child_child_node.start_byte].count("\n") + 1)
-                            upper_lines.append(source_code[: loop_child_child_node.end_byte].count("\n") + 1)
+                            lower_lines.append(line_index.line_number(loop_child_child_node.start_byte))
+                            upper_lines.append(line_index.line_number(loop_child_child_node.end_byte))
                     loop_body_start_line = min(lower_lines)
                     loop_body_end_line = max(upper_lines)
             loop_statements[(loop_start_line, loop_end_line)] = (
@@ -736,14 +1192,14 @@ class TSAnalyzer:
     
 
     @staticmethod
-    def extract_meta_data_of_Python_loop_statements(source_code, root_node) -> Dict[Tuple, Tuple]:
+    def extract_meta_data_of_Python_loop_statements(source_code, line_index, loop_nodes) -> Dict[Tuple, Tuple]:
         loop_statements = {}
-        loop_nodes = TSAnalyzer.find_nodes_by_type(root_node, "for_statement")
-        loop_nodes.extend(TSAnalyzer.find_nodes_by_type(root_node, "while_statement"))
+        for_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "for_statement"]
+        while_statement_nodes = [loop_node for loop_node in loop_nodes if loop_node.type == "while_statement"]
 
-        for loop_node in loop_nodes:
-            loop_start_line = source_code[: loop_node.start_byte].count("\n") + 1
-            loop_end_line = source_code[: loop_node.end_byte].count("\n") + 1
+        for loop_node in for_statement_nodes + while_statement_nodes:
+            loop_start_line = line_index.line_number(loop_node.start_byte)
+            loop_end_line = line_index.line_number(loop_node.end_byte)
 
             header_line_start = 0
             header_line_end = 0
@@ -753,12 +1209,12 @@ class TSAnalyzer:
 
             for loop_child_node in loop_node.children:
                 if loop_child_node.type == ":":
-                    header_line_start = source_code[: loop_node.start_byte].count("\n") + 1
-                    header_line_end = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    header_str = source_code[loop_node.start_byte: loop_child_node.start_byte]
+                    header_line_start = line_index.line_number(loop_node.start_byte)
+                    header_line_end = line_index.line_number(loop_child_node.start_byte)
+                    header_str = decode_source(source_code[loop_node.start_byte:loop_child_node.start_byte])
                 if loop_child_node.type == "block":
-                    loop_body_start_line = source_code[: loop_child_node.start_byte].count("\n") + 1
-                    loop_body_end_line = source_code[: loop_child_node.end_byte].count("\n") + 1
+                    loop_body_start_line = line_index.line_number(loop_child_node.start_byte)
+                    loop_body_end_line = line_index.line_number(loop_child_node.end_byte)
                     
             loop_statements[(loop_start_line, loop_end_line)] = (
                 header_line_start,
@@ -770,86 +1226,308 @@ class TSAnalyzer:
         return loop_statements
     
 
-    def find_loop_statements(self, source_code, root_node) -> Dict[Tuple, Tuple]:
+    @staticmethod
+    def extract_loop_statements(language: str, source_code, line_index, loop_nodes) -> Dict[Tuple, Tuple]:
         """
-        Find all the loop statements in the function
-        :param source_code: the content of the function
-        :param root_node: the root node of the parse tree
+        Extract the meta data of loop statements according to the language
+        :param language: the language of the source code
+        :param source_code: the content of the file
+        :param line_index: the line index of the file
+        :param loop_nodes: the loop statement nodes collected in the function
+        """
+        if language in ["C", "C++"]:
+            return TSAnalyzer.extract_meta_data_of_C_CPP_while_statements(source_code, line_index, loop_nodes)
+        elif language in ["Java"]:
+            return TSAnalyzer.extract_meta_data_of_Java_loop_statements(source_code, line_index, loop_nodes)
+        elif language in ["Python"]:
+            return TSAnalyzer.extract_meta_data_of_Python_loop_statements(source_code, line_index, loop_nodes)
+
+
+    #################################################
+    ########## Incremental update ###################
+    #################################################
+    def update_file(self, file_path: str, source_code: Union[str, bytes]) -> None:
+        """
+        Update the facts of a changed source file incrementally.
+        Only the functions intersecting the changed regions are re-extracted from the re-parsed tree.
+        The other functions in the file are kept, and their lines and offsets are shifted by the preceding edits.
+        The environment, the call graph and the call site table are patched in place. The removed functions are not reused.
+        :param file_path: the path of the source file, which can be a new file
+        :param source_code: the new content of the source file, which is a str or bytes
+        """
+        (edits, changed_ranges) = self.ts_parser.reparse_file(file_path, source_code)
+        if len(edits) == 0:
+            return
+        tree = self.ts_parser.get_tree(file_path)
+        line_index = self.ts_parser.fileLineIndexDic[file_path]
+        file_content_view = memoryview(self.ts_parser.fileContentDic[file_path])
+
+        # The functions intersecting the edits are removed, and the others are shifted by the preceding edits
+        kept_functions = []
+        removed_ranges = []
+        for function_id in list(self.ts_parser.fileToFunctionIds.get(file_path, [])):
+            function = self.environment[function_id]
+            byte_delta = 0
+            line_delta = 0
+            is_dirty = False
+            for edit in edits:
+                if edit.old_end_byte <= function.start_byte:
+                    byte_delta += edit.byte_delta
+                    line_delta += edit.line_delta
+                elif edit.old_start_byte < function.end_byte:
+                    is_dirty = True
+                    break
+            if is_dirty:
+                removed_ranges.append(map_range(edits, function.start_byte, function.end_byte))
+                self.remove_function(function_id)
+            else:
+                kept_functions.append((function, byte_delta, line_delta))
+
+        # The functions enclosing the changed regions or the regions of the removed functions are re-extracted
+        # as a whole, including their nested functions, which are removed if they were kept
+        dirty_scope_nodes = self.ts_parser.fact_query.find_outermost_scope_nodes(
+            tree.root_node, changed_ranges + removed_ranges
+        )
+        dirty_ranges = changed_ranges + [(node.start_byte, node.end_byte) for node in dirty_scope_nodes]
+        shifted_byte_deltas = {}
+        for (function, byte_delta, line_delta) in kept_functions:
+            new_start_byte = function.start_byte + byte_delta
+            new_end_byte = function.end_byte + byte_delta
+            if any(
+                ranges_intersect(start_byte, end_byte, new_start_byte, new_end_byte)
+                for (start_byte, end_byte) in dirty_ranges
+            ):
+                self.remove_function(function.function_id)
+            else:
+                self.shift_function(function, byte_delta, line_delta)
+                if byte_delta != 0:
+                    shifted_byte_deltas[function.function_id] = byte_delta
+        self.call_site_table.shift_callers(shifted_byte_deltas)
+
+        added_function_ids = []
+        for scope_node in dirty_scope_nodes:
+            for facts in self.ts_parser.extract_facts_in_single_tree(file_content_view, line_index, scope_node):
+                function_id = self.ts_parser.add_function(
+                    file_path,
+                    facts.function_name,
+                    facts.start_line_number,
+                    facts.end_line_number,
+                    facts.start_byte,
+                    facts.end_byte,
+                )
+                self.ts_parser.functionFactsDic[function_id] = facts
+                added_function_ids.append(function_id)
+
+        self.call_graph.add_functions(added_function_ids)
+        for function_id in added_function_ids:
+            facts = self.ts_parser.functionFactsDic.pop(function_id)
+            self.environment[function_id] = self.merge_facts_of_single_function(
+                self.create_function(function_id, facts), facts
+            )
+        self.function_index.invalidate(file_path)
+        # The indexed nodes of the kept functions belong to the previous parse tree
+        for function_id in self.ts_parser.fileToFunctionIds.get(file_path, []):
+            self.lineNodeIndexDic.pop(function_id, None)
+        # Re-resolve all the call sites, so that the calls to the added functions from the other files are linked
+        self.resolve_call_sites()
+        return
+
+
+    def remove_function(self, function_id: int) -> None:
+        """
+        Remove a function from the environment, the call graph and the call site table
+        :param function_id: the id of the function
+        """
+        function = self.environment.pop(function_id)
+        self.ts_parser.remove_function(function_id)
+        self.call_graph.remove_functions([function_id])
+        self.call_site_table.remove_callers([function_id])
+        self.function_index.invalidate(function.file_path)
+        self.lineNodeIndexDic.pop(function_id, None)
+        return
+
+
+    def shift_function(self, function: Function, byte_delta: int, line_delta: int) -> None:
+        """
+        Shift an unchanged function by the edits before it
+        :param function: the function
+        :param byte_delta: the change of the offsets
+        :param line_delta: the change of the line numbers
+        """
+        function.start_byte += byte_delta
+        function.end_byte += byte_delta
+        self.ts_parser.functionRawDataDic[function.function_id] = (
+            function.function_name,
+            function.start_line_number + line_delta,
+            function.end_line_number + line_delta,
+            function.start_byte,
+            function.end_byte,
+        )
+        if line_delta == 0:
+            return
+
+        function.start_line_number += line_delta
+        function.end_line_number += line_delta
+        function.paras = set(
+            (parameter_name, line_number + line_delta, index) for (parameter_name, line_number, index) in function.paras
+        )
+        function.if_statements = {
+            TSAnalyzer.shift_line_numbers(lines, line_delta): TSAnalyzer.shift_line_numbers(info, line_delta)
+            for (lines, info) in function.if_statements.items()
+        }
+        function.loop_statements = {
+            TSAnalyzer.shift_line_numbers(lines, line_delta): TSAnalyzer.shift_line_numbers(info, line_delta)
+            for (lines, info) in function.loop_statements.items()
+        }
+        return
+
+
+    @staticmethod
+    def shift_line_numbers(meta_data: Tuple, line_delta: int) -> Tuple:
         """
-        if self.ts_parser.language_setting in ["C", "C++"]:
-            return self.extract_meta_data_of_C_CPP_while_statements(source_code, root_node)
-        elif self.ts_parser.language_setting in ["Java"]:
-            return self.extract_meta_data_of_Java_loop_statements(source_code, root_node)
-        elif self.ts_parser.language_setting in ["Python"]:
-            return self.extract_meta_data_of_Python_loop_statements(source_code, root_node)
+        Shift the line numbers in the meta data of an if statement or a loop statement.
+        The strings are kept, and the line number 0 stands for an absent branch or body.
+        """
+        shifted_meta_data = []
+        for item in meta_data:
+            if isinstance(item, tuple):
+                shifted_meta_data.append(TSAnalyzer.shift_line_numbers(item, line_delta))
+            elif isinstance(item, int) and item != 0:
+                shifted_meta_data.append(item + line_delta)
+            else:
+                shifted_meta_data.append(item)
+        return tuple(shifted_meta_data)
 
 
+    @staticmethod
+    def find_node_in_range(
+        root_node: tree_sitter.Node, start_byte: int, end_byte: int, node_types: Set[str]
+    ) -> tree_sitter.Node:
+        """
+        Find the node of any of the given types spanning the byte range in the parse tree.
+        The smallest node spanning the range is lifted to the enclosing node of the same range and an expected type.
+        """
+        node = root_node.descendant_for_byte_range(start_byte, end_byte)
+        while (
+            node.type not in node_types
+            and node.parent is not None
+            and node.parent.start_byte == node.start_byte
+            and node.parent.end_byte == node.end_byte
+        ):
+            node = node.parent
+        return node
+
     #################################################
     ########## AST visitor utility ##################
     #################################################
     @staticmethod
     def find_all_nodes(root_node: tree_sitter.Node) -> List[tree_sitter.Node]:
+        """
+        Find all the nodes in the parse tree in pre-order.
+        It is kept for compatibility. Use iter_nodes to visit the nodes lazily.
+        :param root_node: the root node of the parse tree
+        """
         if root_node is None:
             return []
-        nodes = [root_node]
-        for child_node in root_node.children:
-            nodes.extend(TSAnalyzer.find_all_nodes(child_node))
-        return nodes
+        return list(iter_nodes(root_node))
 
     @staticmethod
     def find_nodes_by_type(
         root_node: tree_sitter.Node, node_type: str
     ) -> List[tree_sitter.Node]:
         """
-        Find all the nodes with the specific type in the parse tree
+        Find all the nodes with the specific type in the parse tree.
+        It is kept for compatibility. Use iter_nodes_by_type to visit the nodes lazily.
+        The facts of functions are collected by TSParser.fact_query in the tree-sitter query engine instead.
         :param root_node: the root node of the parse tree
         :param node_type: the type of the nodes to be found
         """
-        nodes = []
-        if root_node.type == node_type:
-            nodes.append(root_node)
-        for child_node in root_node.children:
-            nodes.extend(TSAnalyzer.find_nodes_by_type(child_node, node_type))
-        return nodes
+        return list(iter_nodes_by_type(root_node, node_type))
 
-    def find_function_by_line_number(self, line_number: int) -> List[Function]:
+    def find_function_by_line_number(self, file_path: str, line_number: int) -> List[Function]:
         """
-        Find the function that contains the specific line number
+        Find the innermost function in the file that contains the specific line number
+        :param file_path: the path of the file
         :param line_number: the line number to be searched
         """
-        for function_id in self.environment:
-            function = self.environment[function_id]
-            if function.start_line_number <= line_number <= function.end_line_number:
-                return [function]
-        return []
+        function_ids = self.find_enclosing_function_ids(file_path, line_number)
+        if len(function_ids) == 0:
+            return []
+        return [self.environment[function_ids[0]]]
+
+    def find_enclosing_function_ids(self, file_path: str, line_number: int) -> List[int]:
+        """
+        Find all the functions in the file that contain the specific line number with the interval index of the file
+        :param file_path: the path of the file
+        :param line_number: the line number to be searched
+        :return: the ids of the functions from the innermost one to the outermost one
+        """
+        if not self.function_index.is_built(file_path):
+            intervals = []
+            for function_id in self.ts_parser.fileToFunctionIds.get(file_path, []):
+                function = self.environment[function_id]
+                intervals.append((function.start_line_number, function.end_line_number, function_id))
+            self.function_index.build(file_path, intervals)
+        return self.function_index.find(file_path, line_number)
 
     def find_node_by_line_number(
-        self, line_number: int
+        self, file_path: str, line_number: int
     ) -> List[Tuple[str, tree_sitter.Node]]:
         """
-        Find the node that contains the specific line number
+        Find the nodes on the specific line in the functions of the file containing the line
+        :param file_path: the path of the file
         :param line_number: the line number to be searched
+        :return: the (function_code, node) pairs, from the outermost function to the innermost one
         """
         code_node_list = []
-        for function_id in self.environment:
+        for function_id in reversed(self.find_enclosing_function_ids(file_path, line_number)):
             function = self.environment[function_id]
-            if (
-                not function.start_line_number
-                <= line_number
-                <= function.end_line_number
-            ):
+            line_nodes = self.get_line_node_index(function).get(line_number, [])
+            if len(line_nodes) == 0:
                 continue
-            all_nodes = TSAnalyzer.find_all_nodes(function.parse_tree_root_node)
-            for node in all_nodes:
-                start_line = (
-                    function.function_code[: node.start_byte].count("\n")
-                    + function.start_line_number
-                )
-                end_line = (
-                    function.function_code[: node.end_byte].count("\n")
-                    + function.start_line_number
-                )
-                if start_line == end_line == line_number:
-                    code_node_list.append((function.function_code, node))
+            function_code = function.function_code
+            for node in line_nodes:
+                code_node_list.append((function_code, node))
         return code_node_list
-    
\ No newline at end of file
+
+    def get_line_node_index(self, function: Function) -> Dict[int, List[tree_sitter.Node]]:
+        """
+        Get the index from the line numbers to the nodes starting and ending on the lines in the function.
+        The index is built with a single walk over the parse tree of the function, and kept in an LRU cache.
+        :param function: the function
+        """
+        line_nodes = self.lineNodeIndexDic.get(function.function_id)
+        if line_nodes is None:
+            line_nodes = build_line_node_index(self.get_parse_tree_root_node(function))
+        self.lineNodeIndexDic[function.function_id] = line_nodes
+        self.lineNodeIndexDic.move_to_end(function.function_id)
+        while len(self.lineNodeIndexDic) > self.max_line_node_index_count:
+            self.lineNodeIndexDic.popitem(last=False)
+        return line_nodes
+
+
+#################################################
+########## Parallel fact extraction #############
+#################################################
+
+# The parser owned by the current worker process, which is initialized by init_parse_worker
+worker_ts_parser = None
+
+
+def init_parse_worker(language_setting: str) -> None:
+    """
+    Initialize the parser in a worker process.
+    :param language_setting: the language of the source code
+    """
+    global worker_ts_parser
+    worker_ts_parser = TSParser({}, language_setting)
+
+
+def extract_facts_in_single_file(source_code: bytes) -> List[FunctionFacts]:
+    """
+    Parse a source file and extract the facts of its functions in a worker process.
+    :param source_code: the content of the source file
+    :return: the facts of the functions without tree_sitter nodes
+    """
+    tree = worker_ts_parser.parser.parse(source_code)
+    return worker_ts_parser.extract_facts_in_single_tree(memoryview(source_code), LineIndex(source_code), tree.root_node)
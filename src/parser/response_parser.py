@@ -1,4 +1,8 @@
-from typing import Tuple
+import re
+from typing import Optional, Tuple
+
+# A verdict line, e.g., "Yes.", "No", "**Yes**", or "Answer: No."
+VERDICT_PATTERN = re.compile(r"^\W*(?:answer\W*)?(yes|no)\W*$", re.IGNORECASE)
 
 # Function to parse a bug report response
 def parse_bug_report(response: str) -> Tuple[bool, bool]:
@@ -10,4 +14,29 @@ def parse_bug_report(response: str) -> Tuple[bool, bool]:
     return is_buggy, is_ill_formed
 
 
+def parse_verdict(response: str, is_complete: bool = True) -> Optional[bool]:
+    """
+    Parse the Yes/No verdict line of a response in the format "Answer: [explanation]" followed by "Yes/No.".
+    Only a line holding nothing but the verdict counts, so that the words in the explanation are not mistaken for it.
+    :param response: the response, or its prefix received so far
+    :param is_complete: whether the response is complete. The last line of an incomplete response may still grow
+    :return: True for Yes, False for No, or None if no verdict line has been received
+    """
+    lines = response.split("\n")
+    if not is_complete:
+        lines = lines[:-1]
+    for line in lines:
+        match = VERDICT_PATTERN.match(line)
+        if match is not None:
+            return match.group(1).lower() == "yes"
+    return None
+
+
+def stop_at_verdict(response: str) -> bool:
+    """
+    The stop condition of a streamed response, which is met as soon as its verdict line is received.
+    """
+    return parse_verdict(response, is_complete=False) is not None
+
+
 # TODO: Define the response parsers for different forms of LLM responses
\ No newline at end of file
@@ -0,0 +1,206 @@
+import errno
+import mmap
+import os
+import sys
+import threading
+from collections import deque
+from typing import Iterable, Iterator, List, Tuple
+
+# Files larger than this size are usually generated or vendored, and are skipped
+DEFAULT_MAX_FILE_SIZE = 16 * 1024 * 1024
+# The maximal size of the files read ahead of the parser
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# The size of the prefix checked for NUL bytes to detect binary files
+BINARY_SNIFF_SIZE = 8192
+# The errors of running out of file descriptors, which are not specific to a file
+FILE_DESCRIPTOR_ERRNOS = {errno.EMFILE, errno.ENFILE}
+# Before Python 3.13, each mmap holds a duplicated file descriptor for as long as it lives
+IS_MMAP_FD_TRACKED = sys.version_info < (3, 13)
+
+
+def get_default_max_mapped_file_count() -> int:
+    """
+    Get the maximal number of files mapped at the same time, which leaves half of the file descriptors
+    to the rest of the process.
+    """
+    try:
+        import resource
+
+        soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, OSError, ValueError):
+        return 256
+    if soft_limit == resource.RLIM_INFINITY:
+        return 65536
+    return max(0, soft_limit // 2)
+
+
+def is_binary(source_prefix: bytes) -> bool:
+    """
+    Check whether a file is binary according to the prefix of its content.
+    """
+    return b"\0" in source_prefix
+
+
+def decode_source(source) -> str:
+    """
+    Decode the content of a source file leniently.
+    Invalid UTF-8 sequences, e.g., in Latin-1 encoded files, are replaced instead of aborting the scan.
+    :param source: the content of the file, which is a bytes-like object
+    """
+    return str(source, "utf-8", errors="replace")
+
+
+def encode_source(source):
+    """
+    Get the bytes of the content of a source file, which are the unit of the byte offsets in parse trees.
+    :param source: the content of the file, which is a str or a bytes-like object
+    :return: the UTF-8 encoded content if it is a str, or the bytes-like object itself without copying
+    """
+    if isinstance(source, str):
+        return source.encode("utf-8", errors="surrogatepass")
+    return source
+
+
+class SourceLoader:
+    """
+    Streaming loader of source files.
+    The files are read lazily by a background thread, which stays ahead of the consumer
+    by at most the memory budget, so that reading overlaps with parsing,
+    and the project is never materialized before it is parsed.
+    Binary files and oversized files are skipped.
+    """
+
+    def __init__(
+        self,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        use_mmap: bool = False,
+        max_mapped_file_count: int = None,
+    ) -> None:
+        """
+        :param max_file_size: the maximal size of a source file in bytes
+        :param memory_budget: the maximal size of the files read ahead in bytes
+        :param use_mmap: whether to map the files into memory instead of reading them
+        :param max_mapped_file_count: the maximal number of mapped files, whose maps are kept by the parser for the
+        whole run and hold a file descriptor each before Python 3.13. The files beyond it are read instead.
+        It is derived from the limit of the file descriptors if it is None
+        """
+        self.max_file_size = max_file_size
+        self.memory_budget = memory_budget
+        self.use_mmap = use_mmap
+        self.max_mapped_file_count = (
+            max_mapped_file_count if max_mapped_file_count is not None else get_default_max_mapped_file_count()
+        )
+
+        self.mapped_file_count = 0
+        self.loaded_file_count = 0
+        self.loaded_byte_count = 0
+        self.skipped_files: List[Tuple[str, str]] = []  # A list of (file_path, reason) tuples
+
+    def load(self, file_path: str):
+        """
+        Load a source file.
+        :param file_path: the path of the file
+        :return: the content of the file, which is bytes, or a read-only mmap if use_mmap is enabled,
+        or None if the file is skipped
+        :raise OSError: if the process runs out of file descriptors, which is not a problem of the file
+        """
+        try:
+            with open(file_path, "rb") as source_file:
+                file_size = os.fstat(source_file.fileno()).st_size
+                if file_size > self.max_file_size:
+                    self.skipped_files.append((file_path, "oversized"))
+                    return None
+                source = self.map_file(source_file, file_size)
+                if source is None:
+                    source = source_file.read()
+        except OSError as error:
+            if error.errno in FILE_DESCRIPTOR_ERRNOS:
+                raise
+            self.skipped_files.append((file_path, error.strerror or "unreadable"))
+            return None
+
+        if is_binary(source[:BINARY_SNIFF_SIZE]):
+            self.skipped_files.append((file_path, "binary"))
+            return None
+        self.loaded_file_count += 1
+        self.loaded_byte_count += len(source)
+        return source
+
+    def map_file(self, source_file, file_size: int):
+        """
+        Map an opened file into memory.
+        :return: a read-only mmap, or None if the file is to be read instead
+        """
+        if not self.use_mmap or file_size == 0:
+            return None
+        if not IS_MMAP_FD_TRACKED:
+            return mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ, trackfd=False)
+        if self.mapped_file_count >= self.max_mapped_file_count:
+            return None
+        try:
+            source = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as error:
+            if error.errno in FILE_DESCRIPTOR_ERRNOS:
+                return None
+            raise
+        self.mapped_file_count += 1
+        return source
+
+    def iter_sources(self, file_paths: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+        """
+        Lazily load the source files in order.
+        :param file_paths: the paths of the files
+        :return: an iterator of (file_path, content) pairs, skipping the binary and oversized files
+        """
+        loaded_sources = deque()
+        condition = threading.Condition()
+        state = {"buffered_bytes": 0, "is_finished": False, "is_stopped": False, "error": None}
+
+        def read_ahead() -> None:
+            try:
+                for file_path in file_paths:
+                    source = self.load(file_path)
+                    if source is None:
+                        continue
+                    with condition:
+                        # A file larger than the budget is still loaded when nothing else is buffered
+                        while (
+                            not state["is_stopped"]
+                            and len(loaded_sources) > 0
+                            and state["buffered_bytes"] + len(source) > self.memory_budget
+                        ):
+                            condition.wait()
+                        if state["is_stopped"]:
+                            return
+                        loaded_sources.append((file_path, source))
+                        state["buffered_bytes"] += len(source)
+                        condition.notify_all()
+            except Exception as error:
+                # The error is raised in the consumer instead of silently ending the stream
+                state["error"] = error
+            finally:
+                with condition:
+                    state["is_finished"] = True
+                    condition.notify_all()
+
+        reader = threading.Thread(target=read_ahead, daemon=True)
+        reader.start()
+        try:
+            while True:
+                with condition:
+                    while len(loaded_sources) == 0 and not state["is_finished"]:
+                        condition.wait()
+                    if len(loaded_sources) == 0:
+                        if state["error"] is not None:
+                            raise state["error"]
+                        break
+                    (file_path, source) = loaded_sources.popleft()
+                    state["buffered_bytes"] -= len(source)
+                    condition.notify_all()
+                yield (file_path, source)
+        finally:
+            with condition:
+                state["is_stopped"] = True
+                condition.notify_all()
+        reader.join()
@@ -0,0 +1,217 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+
+class IgnoreRule:
+    """
+    A pattern in a .gitignore file or in the exclude list, following the syntax of .gitignore:
+    "!" negates the pattern, a trailing "/" only matches directories,
+    a pattern containing another "/" is relative to the directory of the .gitignore file,
+    and "*", "?", "[...]" and "**" are wildcards.
+    """
+
+    def __init__(self, pattern: str, base_path: str) -> None:
+        """
+        :param pattern: the pattern
+        :param base_path: the directory of the .gitignore file relative to the project path, which is "" for the project path
+        """
+        self.is_negated = pattern.startswith("!")
+        if self.is_negated:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        self.is_directory_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        is_anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        prefix = re.escape(base_path + "/") if base_path != "" else ""
+        if not is_anchored:
+            prefix += "(?:.*/)?"
+        self.regex = re.compile(prefix + IgnoreRule.translate(pattern) + "$")
+
+    @staticmethod
+    def translate(pattern: str) -> str:
+        """
+        Translate the wildcards in a pattern to a regular expression.
+        """
+        regex = ""
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith("**/", index):
+                regex += "(?:.*/)?"
+                index += 3
+                continue
+            if pattern.startswith("**", index):
+                regex += ".*"
+                index += 2
+                continue
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char == "[" and "]" in pattern[index + 1:]:
+                end_index = pattern.index("]", index + 1)
+                char_class = pattern[index + 1:end_index]
+                if char_class.startswith("!"):
+                    char_class = "^" + char_class[1:]
+                regex += "[" + char_class.replace("\\", "\\\\") + "]"
+                index = end_index
+            else:
+                regex += re.escape(char)
+            index += 1
+        return regex
+
+    def matches(self, relative_path: str, is_directory: bool) -> bool:
+        """
+        Check whether the rule matches a path.
+        :param relative_path: the path relative to the project path, separated by "/"
+        :param is_directory: whether the path is a directory
+        """
+        if self.is_directory_only and not is_directory:
+            return False
+        return self.regex.match(relative_path) is not None
+
+
+def parse_ignore_rules(lines: List[str], base_path: str) -> List[IgnoreRule]:
+    """
+    Parse the rules in the lines of a .gitignore file, skipping blank lines and comments.
+    """
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n").rstrip()
+        if line == "" or line.startswith("#"):
+            continue
+        rules.append(IgnoreRule(line, base_path))
+    return rules
+
+
+def is_ignored(rules: List[IgnoreRule], relative_path: str, is_directory: bool) -> bool:
+    """
+    Check whether a path is ignored. The last matching rule wins, so that a negated rule can re-include the path.
+    """
+    ignored = False
+    for rule in rules:
+        if rule.is_negated == ignored and rule.matches(relative_path, is_directory):
+            ignored = not rule.is_negated
+    return ignored
+
+
+class SourceScanner:
+    """
+    Find the source files in a project with a single walk over the directory tree.
+    All the suffixes are matched at once, so each file is visited and listed once.
+    The files ignored by the .gitignore files or the exclude list are skipped,
+    and the ignored directories are not walked at all.
+    Hidden files and directories are skipped, and symbolic links to directories are not followed.
+    """
+
+    def __init__(
+        self,
+        suffixes: List[str],
+        exclude_patterns: List[str] = None,
+        respect_gitignore: bool = True,
+        walk_jobs: int = 1,
+    ) -> None:
+        """
+        :param suffixes: the suffixes of the source files without dots, e.g., ["c", "h"]
+        :param exclude_patterns: the patterns of the excluded paths relative to the project path, e.g., ["Documentation/"]
+        :param respect_gitignore: whether to skip the files ignored by the .gitignore files
+        :param walk_jobs: the number of threads walking the top-level subdirectories in parallel
+        """
+        self.suffixes = set(suffixes)
+        self.exclude_patterns = exclude_patterns if exclude_patterns is not None else []
+        self.respect_gitignore = respect_gitignore
+        self.walk_jobs = walk_jobs
+
+        self.file_count = 0
+        self.byte_count = 0
+
+    def scan(self, project_path: str, is_largest_first: bool = False) -> List[str]:
+        """
+        Find the source files in the project path.
+        :param project_path: the path of the project
+        :param is_largest_first: whether to order the files by size from the largest, e.g., for parallel parsing,
+        so that a few giant files scheduled last do not become stragglers
+        :return: the paths of the source files, sorted by path or by size
+        """
+        root_rules = parse_ignore_rules(self.exclude_patterns, "")
+        (files, subdirectories, rules) = self.scan_directory(project_path, "", root_rules)
+
+        if self.walk_jobs > 1 and len(subdirectories) > 1:
+            with ThreadPoolExecutor(max_workers=self.walk_jobs) as executor:
+                subtree_files = executor.map(
+                    lambda subdirectory: self.walk(subdirectory[0], subdirectory[1], rules), subdirectories
+                )
+                for files_in_subtree in subtree_files:
+                    files.extend(files_in_subtree)
+        else:
+            for (directory_path, relative_path) in subdirectories:
+                files.extend(self.walk(directory_path, relative_path, rules))
+
+        if is_largest_first:
+            files.sort(key=lambda file: (-file[1], file[0]))
+        else:
+            files.sort()
+        self.file_count = len(files)
+        self.byte_count = sum(file_size for (_, file_size) in files)
+        return [file_path for (file_path, _) in files]
+
+    def walk(self, directory_path: str, relative_path: str, rules: List[IgnoreRule]) -> List[Tuple[str, int]]:
+        """
+        Walk a directory tree iteratively.
+        :return: the (file_path, file_size) pairs of the source files
+        """
+        files = []
+        worklist = [(directory_path, relative_path, rules)]
+        while len(worklist) > 0:
+            (directory_path, relative_path, rules) = worklist.pop()
+            (files_in_directory, subdirectories, sub_rules) = self.scan_directory(directory_path, relative_path, rules)
+            files.extend(files_in_directory)
+            for (subdirectory_path, relative_subdirectory_path) in subdirectories:
+                worklist.append((subdirectory_path, relative_subdirectory_path, sub_rules))
+        return files
+
+    def scan_directory(
+        self, directory_path: str, relative_path: str, rules: List[IgnoreRule]
+    ) -> Tuple[List[Tuple[str, int]], List[Tuple[str, str]], List[IgnoreRule]]:
+        """
+        Scan the entries of a single directory.
+        :return: the (file_path, file_size) pairs of the source files, the (path, relative_path) pairs of the subdirectories,
+        and the rules applied to the subdirectories, including the rules in the .gitignore file of the directory
+        """
+        if self.respect_gitignore:
+            gitignore_path = os.path.join(directory_path, ".gitignore")
+            try:
+                with open(gitignore_path, "r", errors="replace") as gitignore_file:
+                    rules = rules + parse_ignore_rules(gitignore_file.readlines(), relative_path)
+            except OSError:
+                pass
+
+        files = []
+        subdirectories = []
+        try:
+            entries = list(os.scandir(directory_path))
+        except OSError:
+            return (files, subdirectories, rules)
+
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            relative_entry_path = relative_path + "/" + entry.name if relative_path != "" else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_ignored(rules, relative_entry_path, True):
+                        subdirectories.append((entry.path, relative_entry_path))
+                    continue
+                if entry.name.rpartition(".")[2] not in self.suffixes or "." not in entry.name:
+                    continue
+                if not entry.is_file() or is_ignored(rules, relative_entry_path, False):
+                    continue
+                files.append((entry.path, entry.stat().st_size))
+            except OSError:
+                continue
+        return (files, subdirectories, rules)
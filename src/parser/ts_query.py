@@ -0,0 +1,254 @@
+from typing import Dict, Iterator, List, Set, Tuple
+
+import tree_sitter
+
+from parser.incremental import ranges_intersect
+
+# The capture name of function scopes in the fact query
+SCOPE_CAPTURE = "scope"
+
+# The kinds of facts that can be collected by FactQuery
+ALL_FACT_KINDS = ["function_headers", "call_sites", "parameters", "if_statements", "loop_statements"]
+
+# Node types of function scopes, in which the facts are collected
+SCOPE_NODE_TYPES = {
+    "C": {"function_definition"},
+    "C++": {"function_definition"},
+    "Java": {"method_declaration"},
+    "Python": {"function_definition"},
+}
+
+HEADER_NODE_TYPES = {
+    "C": {"function_declarator"},
+    "C++": {"function_declarator"},
+    "Java": {"method_declaration"},
+    "Python": {"function_definition"},
+}
+
+CALL_NODE_TYPES = {
+    "C": {"call_expression"},
+    "C++": {"call_expression"},
+    "Java": {"method_invocation"},
+    "Python": {"call"},
+}
+
+# (container node types, member node types) of parameters
+PARAMETER_NODE_TYPES = {
+    "C": ({"parameter_declaration"}, {"identifier"}),
+    "C++": ({"parameter_declaration"}, {"identifier"}),
+    "Java": ({"formal_parameter"}, {"identifier"}),
+    "Python": ({"parameters"}, set()),
+}
+
+IF_NODE_TYPES = {
+    "C": {"if_statement"},
+    "C++": {"if_statement"},
+    "Java": {"if_statement"},
+    "Python": {"if_statement"},
+}
+
+LOOP_NODE_TYPES = {
+    "C": {"for_statement", "while_statement"},
+    "C++": {"for_statement", "while_statement"},
+    "Java": {"for_statement", "enhanced_for_statement", "while_statement"},
+    "Python": {"for_statement", "while_statement"},
+}
+
+
+class FunctionScope:
+    """
+    The nodes collected in the subtree of a function node, grouped by the kinds of facts
+    """
+
+    def __init__(self, node: tree_sitter.Node) -> None:
+        self.node = node
+        self.facts = {}  # A dictionary mapping the kind of facts to the collected nodes in pre-order
+
+    def add(self, kind: str, fact) -> None:
+        if kind not in self.facts:
+            self.facts[kind] = []
+        self.facts[kind].append(fact)
+
+    def get(self, kind: str) -> List:
+        return self.facts.get(kind, [])
+
+
+def iter_nodes(root_node: tree_sitter.Node) -> Iterator[tree_sitter.Node]:
+    """
+    Lazily iterate the nodes in the subtree of the root node in pre-order.
+    A TreeCursor is used instead of recursion, so deep trees never hit the recursion limit.
+    :param root_node: the root node
+    """
+    cursor = root_node.walk()
+    while True:
+        yield cursor.node
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return
+
+
+def iter_nodes_by_type(root_node: tree_sitter.Node, node_type: str) -> Iterator[tree_sitter.Node]:
+    """
+    Lazily iterate the nodes of the given type in the subtree of the root node in pre-order.
+    :param root_node: the root node
+    :param node_type: the type of the nodes
+    """
+    for node in iter_nodes(root_node):
+        if node.type == node_type:
+            yield node
+
+
+def build_line_node_index(root_node: tree_sitter.Node) -> Dict[int, List[tree_sitter.Node]]:
+    """
+    Index the nodes in the subtree of the root node which start and end on the same line, with a single cursor walk.
+    The line numbers start from 1, and are taken from the points of the nodes, so no newline is counted.
+    :param root_node: the root node
+    :return: the nodes on each line in pre-order
+    """
+    line_nodes = {}
+    cursor = root_node.walk()
+    while True:
+        node = cursor.node
+        start_row = node.start_point[0]
+        if start_row == node.end_point[0]:
+            line_number = start_row + 1
+            if line_number not in line_nodes:
+                line_nodes[line_number] = []
+            line_nodes[line_number].append(node)
+        if cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return line_nodes
+
+
+def create_pattern(node_types: Set[str], capture_name: str) -> str:
+    """
+    Create the query pattern matching the nodes of any of the given types.
+    :param node_types: the types of the nodes
+    :param capture_name: the capture name of the matched nodes
+    """
+    return " ".join(f"({node_type}) @{capture_name}" for node_type in sorted(node_types))
+
+
+class FactQuery:
+    """
+    Compiled query of the nodes of all kinds of facts in a language.
+    The tree is traversed by the tree-sitter query engine, and only the captured nodes are visited in Python.
+    """
+
+    def __init__(self, language_setting: str, language: tree_sitter.Language, fact_kinds: List[str] = ALL_FACT_KINDS) -> None:
+        self.language_setting = language_setting
+        self.fact_kinds = fact_kinds
+        self.scope_node_types = SCOPE_NODE_TYPES[language_setting]
+        self.header_is_scope = HEADER_NODE_TYPES[language_setting] == SCOPE_NODE_TYPES[language_setting]
+        (container_node_types, member_node_types) = PARAMETER_NODE_TYPES[language_setting]
+
+        fact_node_types = {
+            "function_headers": HEADER_NODE_TYPES[language_setting],
+            "call_sites": CALL_NODE_TYPES[language_setting],
+            "parameters": container_node_types,
+            "if_statements": IF_NODE_TYPES[language_setting],
+            "loop_statements": LOOP_NODE_TYPES[language_setting],
+        }
+        # The scope pattern comes first so that a scope is opened before the facts captured at the same node
+        patterns = [create_pattern(SCOPE_NODE_TYPES[language_setting], SCOPE_CAPTURE)]
+        for fact_kind in fact_kinds:
+            patterns.append(create_pattern(fact_node_types[fact_kind], fact_kind))
+        self.query = language.query("\n".join(patterns))
+
+        self.member_query = None
+        if "parameters" in fact_kinds and len(member_node_types) > 0:
+            self.member_query = language.query(create_pattern(member_node_types, "member"))
+
+    def visit(self, root_node: tree_sitter.Node) -> List[FunctionScope]:
+        """
+        Collect the facts in the subtree of the root node.
+        :param root_node: the root node, such as the root of a file or a function node
+        :return: the function scopes in pre-order
+        """
+        scopes = []
+        open_scopes = []
+        for (node, capture_name) in self.query.captures(root_node):
+            while len(open_scopes) > 0 and node.start_byte >= open_scopes[-1].node.end_byte:
+                open_scopes.pop()
+            if capture_name == SCOPE_CAPTURE:
+                scope = FunctionScope(node)
+                scopes.append(scope)
+                open_scopes.append(scope)
+            elif capture_name == "function_headers" and self.header_is_scope:
+                open_scopes[-1].add(capture_name, node)
+            elif capture_name == "parameters":
+                fact = (node, self.find_member_nodes(node))
+                for scope in open_scopes:
+                    scope.add(capture_name, fact)
+            else:
+                for scope in open_scopes:
+                    scope.add(capture_name, node)
+        return scopes
+
+    def find_outermost_scope_nodes(
+        self, root_node: tree_sitter.Node, byte_ranges: List[Tuple[int, int]]
+    ) -> List[tree_sitter.Node]:
+        """
+        Find the outermost function scopes intersecting any of the byte ranges.
+        Only the nodes on the paths to the ranges are visited.
+        :param root_node: the root node of the parse tree
+        :param byte_ranges: the (start_byte, end_byte) ranges
+        :return: the scope nodes in the order of their positions
+        """
+        scope_nodes = {}
+        for (start_byte, end_byte) in byte_ranges:
+            covering_node = root_node.descendant_for_byte_range(start_byte, end_byte)
+            if covering_node is None:
+                covering_node = root_node
+
+            outermost_scope_node = None
+            node = covering_node
+            while node is not None:
+                if node.type in self.scope_node_types:
+                    outermost_scope_node = node
+                node = node.parent
+            if outermost_scope_node is not None:
+                if ranges_intersect(start_byte, end_byte, outermost_scope_node.start_byte, outermost_scope_node.end_byte):
+                    scope_nodes[outermost_scope_node.id] = outermost_scope_node
+                continue
+
+            # No function encloses the ranges, so find the functions inside the range
+            worklist = [covering_node]
+            while len(worklist) > 0:
+                node = worklist.pop()
+                for child_node in node.children:
+                    if not ranges_intersect(start_byte, end_byte, child_node.start_byte, child_node.end_byte):
+                        continue
+                    if child_node.type in self.scope_node_types:
+                        scope_nodes[child_node.id] = child_node
+                    else:
+                        worklist.append(child_node)
+        return sorted(scope_nodes.values(), key=lambda node: node.start_byte)
+
+    def find_member_nodes(self, container_node: tree_sitter.Node) -> List[tree_sitter.Node]:
+        """
+        Find the member nodes of a parameter container in pre-order.
+        """
+        if self.member_query is None:
+            return []
+        return [node for (node, _) in self.member_query.captures(container_node)]
+
+
+# The compiled fact queries are shared by all the parsers of the same language in a process
+fact_query_cache: Dict[str, FactQuery] = {}
+
+
+def get_fact_query(language_setting: str, language: tree_sitter.Language) -> FactQuery:
+    """
+    Get the fact query of a language, which is compiled once per language.
+    :param language_setting: the language of the source code
+    :param language: the tree-sitter language
+    """
+    if language_setting not in fact_query_cache:
+        fact_query_cache[language_setting] = FactQuery(language_setting, language)
+    return fact_query_cache[language_setting]
+
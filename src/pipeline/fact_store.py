@@ -0,0 +1,306 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+# The number of rows buffered per table before they are inserted in a batch
+DEFAULT_BATCH_SIZE = 10000
+
+FACT_TABLES = {
+    "files": "file_id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE",
+    "functions": "function_id INTEGER PRIMARY KEY, name TEXT NOT NULL, file_id INTEGER NOT NULL, "
+    "start_line INTEGER NOT NULL, end_line INTEGER NOT NULL",
+    "parameters": "function_id INTEGER NOT NULL, name TEXT NOT NULL, line INTEGER NOT NULL, position INTEGER NOT NULL",
+    "if_statements": "function_id INTEGER NOT NULL, start_line INTEGER NOT NULL, end_line INTEGER NOT NULL, "
+    "condition_str TEXT, condition_start_line INTEGER, condition_end_line INTEGER, "
+    "true_branch_start_line INTEGER, true_branch_end_line INTEGER, "
+    "else_branch_start_line INTEGER, else_branch_end_line INTEGER",
+    "loop_statements": "function_id INTEGER NOT NULL, start_line INTEGER NOT NULL, end_line INTEGER NOT NULL, "
+    "header_str TEXT, header_start_line INTEGER, header_end_line INTEGER, "
+    "body_start_line INTEGER, body_end_line INTEGER",
+    "call_edges": "caller_id INTEGER NOT NULL, callee_id INTEGER NOT NULL",
+}
+
+# The indexes are created after the bulk load, which is faster than maintaining them during the inserts
+FACT_INDEXES = {
+    "functions_by_name": "functions(name)",
+    "functions_by_file": "functions(file_id, start_line)",
+    "parameters_by_function": "parameters(function_id)",
+    "parameters_by_name": "parameters(name)",
+    "if_statements_by_function": "if_statements(function_id, start_line)",
+    "loop_statements_by_function": "loop_statements(function_id, start_line)",
+    "call_edges_by_caller": "call_edges(caller_id, callee_id)",
+    "call_edges_by_callee": "call_edges(callee_id, caller_id)",
+}
+
+
+def get_prefix_upper_bound(prefix: str) -> str:
+    """
+    Get the smallest string greater than all the strings with the prefix,
+    so that a prefix match is an index range scan instead of a LIKE pattern.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix != "" else ""
+
+
+class FactStore:
+    """
+    SQLite store of the facts of the functions, with normalized tables of the files, the functions,
+    the parameters, the if statements, the loop statements, and the call edges.
+    The rows are buffered and inserted in batches in WAL mode, and the indexes on the names,
+    the files, and the lines are created when the store is finished.
+    The query methods return the rows as dictionaries, and are answered with the indexes.
+    The paths of the files are stored relative to the project root and separated by "/",
+    so that they are queried the same way wherever the scan ran from.
+    """
+
+    def __init__(
+        self, db_path: str, overwrite: bool = False, batch_size: int = DEFAULT_BATCH_SIZE, project_path: str = None
+    ) -> None:
+        """
+        :param db_path: the path of the database file
+        :param overwrite: whether to remove the previous facts in the database before new facts are added
+        :param batch_size: the number of rows buffered per table before they are inserted
+        :param project_path: the root of the project, to which the paths of the added files are made relative.
+        The paths are stored as they are given if it is None
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir != "":
+            os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.project_path = project_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        with self.connection:
+            for table_name in FACT_TABLES:
+                if overwrite:
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+                self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({FACT_TABLES[table_name]})")
+
+        self.file_ids: Dict[str, int] = {
+            row["path"]: row["file_id"] for row in self.connection.execute("SELECT file_id, path FROM files")
+        }
+        self.pending_rows: Dict[str, List[Tuple]] = {table_name: [] for table_name in FACT_TABLES}
+
+    #################################################
+    ########## Writing ##############################
+    #################################################
+    def get_relative_path(self, file_path: str) -> str:
+        """
+        Get the path of a file relative to the project root, which is the path stored in the files table.
+        """
+        if self.project_path is not None:
+            file_path = os.path.relpath(file_path, self.project_path)
+        return file_path.replace(os.sep, "/")
+
+    def get_file_id(self, file_path: str) -> int:
+        file_path = self.get_relative_path(file_path)
+        if file_path not in self.file_ids:
+            self.file_ids[file_path] = len(self.file_ids) + 1
+            self.add_row("files", (self.file_ids[file_path], file_path))
+        return self.file_ids[file_path]
+
+    def add_row(self, table_name: str, row: Tuple) -> None:
+        self.pending_rows[table_name].append(row)
+        if len(self.pending_rows[table_name]) >= self.batch_size:
+            self.flush()
+
+    def add_function(self, function) -> None:
+        """
+        Add the facts of a function.
+        :param function: the function, whose facts are extracted by TSAnalyzer
+        """
+        function_id = function.function_id
+        self.add_row(
+            "functions",
+            (
+                function_id,
+                function.function_name,
+                self.get_file_id(function.file_path),
+                function.start_line_number,
+                function.end_line_number,
+            ),
+        )
+        for (parameter_name, line_number, position) in sorted(function.paras, key=lambda para: para[2]):
+            self.add_row("parameters", (function_id, parameter_name, line_number, position))
+        for ((start_line, end_line), if_statement) in function.if_statements.items():
+            (
+                condition_start_line,
+                condition_end_line,
+                condition_str,
+                (true_branch_start_line, true_branch_end_line),
+                (else_branch_start_line, else_branch_end_line),
+            ) = if_statement
+            self.add_row(
+                "if_statements",
+                (
+                    function_id,
+                    start_line,
+                    end_line,
+                    condition_str,
+                    condition_start_line,
+                    condition_end_line,
+                    true_branch_start_line,
+                    true_branch_end_line,
+                    else_branch_start_line,
+                    else_branch_end_line,
+                ),
+            )
+        for ((start_line, end_line), loop_statement) in function.loop_statements.items():
+            (header_start_line, header_end_line, header_str, body_start_line, body_end_line) = loop_statement
+            self.add_row(
+                "loop_statements",
+                (function_id, start_line, end_line, header_str, header_start_line, header_end_line, body_start_line, body_end_line),
+            )
+
+    def add_call_edges(self, caller_ids: Iterable[int], callee_ids: Iterable[int]) -> None:
+        """
+        Add the call edges.
+        :param caller_ids: the function ids of the callers
+        :param callee_ids: the function ids of the callees
+        """
+        for (caller_id, callee_id) in zip(caller_ids, callee_ids):
+            self.add_row("call_edges", (int(caller_id), int(callee_id)))
+
+    def flush(self) -> None:
+        """
+        Insert the buffered rows of all the tables in a single transaction.
+        """
+        with self.connection:
+            for (table_name, rows) in self.pending_rows.items():
+                if len(rows) == 0:
+                    continue
+                placeholders = ", ".join(["?"] * len(rows[0]))
+                self.connection.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", rows)
+                self.pending_rows[table_name] = []
+
+    def finish(self) -> None:
+        """
+        Insert the buffered rows, and create the indexes and the statistics of the query planner.
+        """
+        self.flush()
+        with self.connection:
+            for (index_name, index_columns) in FACT_INDEXES.items():
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {index_columns}")
+        self.connection.execute("ANALYZE")
+
+    def close(self) -> None:
+        self.finish()
+        self.connection.close()
+
+    #################################################
+    ########## Queries ##############################
+    #################################################
+    def query(self, sql: str, parameters: Tuple = ()) -> List[Dict]:
+        """
+        Run a query on the store.
+        :return: the rows as dictionaries
+        """
+        self.flush()
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def find_functions(self, function_name: str = None, file_prefix: str = None) -> List[Dict]:
+        """
+        Find the functions with the name and in the files under the path prefix. A condition is skipped if it is None.
+        The prefix is a directory or a file relative to the project root, e.g., "drivers/net",
+        which matches whole path components, so "drivers/net" does not match "drivers/network".
+        """
+        (conditions, parameters) = self.get_function_conditions(function_name, file_prefix)
+        return self.query(
+            "SELECT functions.function_id, functions.name, files.path AS file_path, "
+            "functions.start_line, functions.end_line "
+            "FROM functions JOIN files ON functions.file_id = files.file_id"
+            + conditions
+            + " ORDER BY functions.function_id",
+            parameters,
+        )
+
+    def find_functions_by_line(self, file_path: str, line_number: int) -> List[Dict]:
+        """
+        Find the functions in the file containing the line, from the innermost one to the outermost one.
+        :param file_path: the path of the file relative to the project root
+        """
+        return self.query(
+            "SELECT functions.function_id, functions.name, files.path AS file_path, "
+            "functions.start_line, functions.end_line "
+            "FROM functions JOIN files ON functions.file_id = files.file_id "
+            "WHERE files.path = ? AND functions.start_line <= ? AND functions.end_line >= ? "
+            "ORDER BY functions.end_line - functions.start_line",
+            (file_path, line_number, line_number),
+        )
+
+    def get_parameters(self, function_id: int) -> List[Dict]:
+        return self.query(
+            "SELECT * FROM parameters WHERE function_id = ? ORDER BY position", (function_id,)
+        )
+
+    def find_if_statements(
+        self, function_name: str = None, file_prefix: str = None, condition_pattern: str = None
+    ) -> List[Dict]:
+        """
+        Find the if statements in the functions with the name and in the files under the path prefix,
+        whose conditions contain the pattern. A condition is skipped if it is None.
+        """
+        (conditions, parameters) = self.get_function_conditions(function_name, file_prefix)
+        if condition_pattern is not None:
+            conditions += (" AND" if conditions != "" else " WHERE") + " instr(if_statements.condition_str, ?) > 0"
+            parameters += (condition_pattern,)
+        return self.query(
+            "SELECT if_statements.*, functions.name AS function_name, files.path AS file_path "
+            "FROM if_statements JOIN functions ON if_statements.function_id = functions.function_id "
+            "JOIN files ON functions.file_id = files.file_id"
+            + conditions
+            + " ORDER BY if_statements.function_id, if_statements.start_line",
+            parameters,
+        )
+
+    def find_loop_statements(
+        self, function_name: str = None, file_prefix: str = None, header_pattern: str = None
+    ) -> List[Dict]:
+        """
+        Find the loop statements in the functions with the name and in the files under the path prefix,
+        whose headers contain the pattern. A condition is skipped if it is None.
+        """
+        (conditions, parameters) = self.get_function_conditions(function_name, file_prefix)
+        if header_pattern is not None:
+            conditions += (" AND" if conditions != "" else " WHERE") + " instr(loop_statements.header_str, ?) > 0"
+            parameters += (header_pattern,)
+        return self.query(
+            "SELECT loop_statements.*, functions.name AS function_name, files.path AS file_path "
+            "FROM loop_statements JOIN functions ON loop_statements.function_id = functions.function_id "
+            "JOIN files ON functions.file_id = files.file_id"
+            + conditions
+            + " ORDER BY loop_statements.function_id, loop_statements.start_line",
+            parameters,
+        )
+
+    def get_callees(self, function_id: int) -> List[int]:
+        rows = self.query("SELECT callee_id FROM call_edges WHERE caller_id = ? ORDER BY callee_id", (function_id,))
+        return [row["callee_id"] for row in rows]
+
+    def get_callers(self, function_id: int) -> List[int]:
+        rows = self.query("SELECT caller_id FROM call_edges WHERE callee_id = ? ORDER BY caller_id", (function_id,))
+        return [row["caller_id"] for row in rows]
+
+    @staticmethod
+    def get_function_conditions(function_name: str, file_prefix: str) -> Tuple[str, Tuple]:
+        """
+        Get the WHERE clause on the function name and the file path prefix, which are matched with the indexes.
+        The files under the prefix are matched by the range of the paths starting with the prefix and "/",
+        and the file of the prefix itself is matched exactly.
+        :return: the clause and its parameters
+        """
+        conditions = []
+        parameters = ()
+        if function_name is not None:
+            conditions.append("functions.name = ?")
+            parameters += (function_name,)
+        file_prefix = file_prefix.rstrip("/") if file_prefix is not None else ""
+        if file_prefix not in ["", "."]:
+            conditions.append("(files.path = ? OR (files.path >= ? AND files.path < ?))")
+            parameters += (file_prefix, file_prefix + "/", get_prefix_upper_bound(file_prefix + "/"))
+        if len(conditions) == 0:
+            return ("", ())
+        return (" WHERE " + " AND ".join(conditions), parameters)
@@ -3,6 +3,9 @@ import os
 from parser.response_parser import *
 from parser.program_parser import *
 from model.llm import *
+from pipeline.fact_store import FactStore
+from pipeline.result_writer import JsonlResultWriter
+from prompt.apiscan_prompt import prompt_dict
 from pathlib import Path
 
 class MetaScanPipeline:
@@ -12,18 +15,56 @@ class MetaScanPipeline:
                  all_files,
                  inference_model_name,
                  inference_key_str,
-                 temperature):
+                 temperature,
+                 jobs=1,
+                 fact_cache=None,
+                 output_format="json",
+                 compression="none",
+                 shard_count=1,
+                 fact_store_path=None,
+                 response_cache=None,
+                 llm_base_url=None,
+                 token_ledger=None,
+                 project_path=None):
         self.project_name = project_name
         self.language = language
         self.all_files = all_files
         self.inference_model_name = inference_model_name
         self.inference_key_str = inference_key_str
         self.temperature = temperature
+        self.jobs = jobs
+        self.fact_cache = fact_cache
+        self.output_format = output_format
+        self.compression = compression
+        self.shard_count = shard_count
+        self.fact_store_path = fact_store_path
+        self.response_cache = response_cache
+        self.llm_base_url = llm_base_url
+        self.token_ledger = token_ledger
+        self.project_path = project_path
 
         self.detection_result = []
         self.buggy_traces = []
-        self.ts_analyzer = TSAnalyzer(self.all_files, self.language)
-        self.model = LLM(self.inference_model_name, self.inference_key_str, self.temperature)
+        self.ts_analyzer = TSAnalyzer(self.all_files, self.language, self.jobs, self.fact_cache)
+        self.llm = None
+
+    @property
+    def model(self) -> LLM:
+        """
+        The LLM of the scanner, which is created on its first use, so that the extraction of meta data needs no keys
+        """
+        if self.llm is None:
+            self.llm = LLM(
+                self.inference_model_name,
+                self.inference_key_str,
+                self.temperature,
+                self.response_cache,
+                base_url=self.llm_base_url,
+                token_ledger=self.token_ledger,
+                scanner_name="metascan",
+                prompt_templates=list(prompt_dict.values()),
+            )
+        return self.llm
 
     def start_scan(self):
         """
@@ -35,60 +76,98 @@ class MetaScanPipeline:
         if not os.path.exists(log_dir_path):
             os.makedirs(log_dir_path)
 
-        function_meta_data_dict = {}
+        if self.fact_store_path is not None:
+            self.store_facts()
 
-        for function_id in self.ts_analyzer.environment:
-            function_meta_data = {}
-            function = self.ts_analyzer.environment[function_id]
-            function_meta_data["function_id"] = function.function_id
-            function_meta_data["function_name"] = function.function_name
-            function_meta_data["function_start_line"] = function.start_line_number
-            function_meta_data["function_end_line"] = function.end_line_number
+        if self.output_format == "json":
+            # The legacy output, which holds the results of all the functions in a single JSON file
+            function_meta_data_dict = {}
+            for function_id in self.ts_analyzer.environment:
+                function = self.ts_analyzer.environment[function_id]
+                function_meta_data_dict[function_id] = self.get_function_meta_data(function)
+            with open(log_dir_path + "/meta_scan_result.json", 'w') as f:
+                json.dump(function_meta_data_dict, f, indent=4, sort_keys=True)
+            return
+
+        # The results are streamed to disk as they are produced, with a line per function
+        writer = JsonlResultWriter(
+            log_dir_path + "/meta_scan_result",
+            self.compression,
+            self.shard_count,
+            {"project_name": self.project_name, "language": self.language},
+        )
+        with writer:
+            for function_id in self.ts_analyzer.environment:
+                function = self.ts_analyzer.environment[function_id]
+                writer.write(
+                    function.file_path,
+                    function.function_id,
+                    function.function_name,
+                    self.get_function_meta_data(function),
+                )
+        return
 
-            function_meta_data["parameters"] = list(function.paras)
+    def store_facts(self) -> None:
+        """
+        Write the facts of all the functions and the call edges into the SQLite fact store,
+        where the paths of the files are relative to the project path.
+        """
+        fact_store = FactStore(self.fact_store_path, overwrite=True, project_path=self.project_path)
+        for function in self.ts_analyzer.environment.values():
+            fact_store.add_function(function)
+        (caller_ids, callee_ids) = self.ts_analyzer.call_graph.get_edges()
+        fact_store.add_call_edges(caller_ids.tolist(), callee_ids.tolist())
+        fact_store.close()
+        return
 
-            function_meta_data["if_statements"] = []
-            for (if_statement_start_line, if_statement_end_line) in self.ts_analyzer.environment[function_id].if_statements:
-                (
-                    condition_start_line,
-                    condition_end_line,
-                    condition_str,
-                    (true_branch_start_line, true_branch_end_line),
-                    (else_branch_start_line, else_branch_end_line)
-                ) = self.ts_analyzer.environment[function_id].if_statements[(if_statement_start_line, if_statement_end_line)]
-                if_statement = {}
-                if_statement["condition_str"] = condition_str
-                if_statement["condition_start_line"] = condition_start_line
-                if_statement["condition_end_line"] = condition_end_line
-                if_statement["true_branch_start_line"] = true_branch_start_line
-                if_statement["true_branch_end_line"] = true_branch_end_line
-                if_statement["else_branch_start_line"] = else_branch_start_line
-                if_statement["else_branch_end_line"] = else_branch_end_line
-                function_meta_data["if_statements"].append(if_statement)
+    def get_function_meta_data(self, function: Function) -> dict:
+        """
+        Collect the meta data of a function.
+        :param function: the function
+        """
+        function_meta_data = {}
+        function_meta_data["function_id"] = function.function_id
+        function_meta_data["function_name"] = function.function_name
+        function_meta_data["function_start_line"] = function.start_line_number
+        function_meta_data["function_end_line"] = function.end_line_number
 
-            function_meta_data_dict[function_id] = function_meta_data
+        function_meta_data["parameters"] = list(function.paras)
 
-            function_meta_data["loop_statements"] = []
-            for (loop_statement_start_line, loop_statement_end_line) in self.ts_analyzer.environment[function_id].loop_statements:
-                (
-                    
-                    header_start_line,
-                    header_end_line,
-                    header_str,
-                    loop_body_start_line,
-                    loop_body_end_line
-                ) = self.ts_analyzer.environment[function_id].loop_statements[(loop_statement_start_line, loop_statement_end_line)]
-                loop_statement = {}
-                loop_statement["loop_statement_start_line"] = loop_statement_start_line
-                loop_statement["loop_statement_end_line"] = loop_statement_end_line
-                loop_statement["header_str"] = header_str
-                loop_statement["header_start_line"] = header_start_line
-                loop_statement["header_end_line"] = header_end_line
-                loop_statement["loop_body_start_line"] = loop_body_start_line
-                loop_statement["loop_body_end_line"] = loop_body_end_line
-                function_meta_data["loop_statements"].append(loop_statement)
+        function_meta_data["if_statements"] = []
+        for (if_statement_start_line, if_statement_end_line) in function.if_statements:
+            (
+                condition_start_line,
+                condition_end_line,
+                condition_str,
+                (true_branch_start_line, true_branch_end_line),
+                (else_branch_start_line, else_branch_end_line)
+            ) = function.if_statements[(if_statement_start_line, if_statement_end_line)]
+            if_statement = {}
+            if_statement["condition_str"] = condition_str
+            if_statement["condition_start_line"] = condition_start_line
+            if_statement["condition_end_line"] = condition_end_line
+            if_statement["true_branch_start_line"] = true_branch_start_line
+            if_statement["true_branch_end_line"] = true_branch_end_line
+            if_statement["else_branch_start_line"] = else_branch_start_line
+            if_statement["else_branch_end_line"] = else_branch_end_line
+            function_meta_data["if_statements"].append(if_statement)
 
-        with open(log_dir_path + "/meta_scan_result.json", 'w') as f:
-            json.dump(function_meta_data_dict, f, indent=4, sort_keys=True)
-        return
-    
\ No newline at end of file
+        function_meta_data["loop_statements"] = []
+        for (loop_statement_start_line, loop_statement_end_line) in function.loop_statements:
+            (
+                header_start_line,
+                header_end_line,
+                header_str,
+                loop_body_start_line,
+                loop_body_end_line
+            ) = function.loop_statements[(loop_statement_start_line, loop_statement_end_line)]
+            loop_statement = {}
+            loop_statement["loop_statement_start_line"] = loop_statement_start_line
+            loop_statement["loop_statement_end_line"] = loop_statement_end_line
+            loop_statement["header_str"] = header_str
+            loop_statement["header_start_line"] = header_start_line
+            loop_statement["header_end_line"] = header_end_line
+            loop_statement["loop_body_start_line"] = loop_body_start_line
+            loop_statement["loop_body_end_line"] = loop_body_end_line
+            function_meta_data["loop_statements"].append(loop_statement)
+        return function_meta_data
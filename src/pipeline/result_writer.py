@@ -0,0 +1,246 @@
+import gzip
+import json
+import os
+import zlib
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# The version of the layout of the output, which is bumped when the layout changes
+RESULT_FORMAT_VERSION = 1
+COMPRESSIONS = ["none", "gzip", "zstd"]
+SHARD_SUFFIXES = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+MANIFEST_FILE_NAME = "manifest.json"
+INDEX_FILE_NAME = "index.jsonl"
+
+
+def get_codec(compression: str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """
+    Get the (compress, decompress) functions of a compression.
+    The zstd compression requires the optional zstandard package, which is imported on demand.
+    """
+    if compression == "none":
+        return (bytes, bytes)
+    if compression == "gzip":
+        # The modification time is fixed, so that the same results are written to the same bytes
+        return (lambda data: gzip.compress(data, compresslevel=6, mtime=0), gzip.decompress)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("The zstd compression requires the zstandard package (pip install zstandard)")
+        return (zstandard.ZstdCompressor().compress, lambda data: zstandard.ZstdDecompressor().decompress(data))
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def get_shard_file_name(shard: int, compression: str) -> str:
+    return f"shard-{shard:05d}{SHARD_SUFFIXES[compression]}"
+
+
+class JsonlResultWriter:
+    """
+    Streaming writer of the results of a scan, with a compact JSON object per line for each function.
+    The functions are sharded by their files, so that all the functions of a file are in the same shard.
+    The lines of the functions of a file are written as a block, which is a gzip member or a zstd frame if compressed.
+    A shard is thus still a valid JSONL file, or a valid compressed stream of it,
+    while the index locates the block and the line of each function, so that a function is read
+    by decompressing its block only. The manifest is written when the writer is closed,
+    so an output without a manifest is incomplete.
+    """
+
+    def __init__(self, output_dir: str, compression: str = "none", shard_count: int = 1, metadata: Dict = None) -> None:
+        """
+        :param output_dir: the directory of the shards, the index, and the manifest
+        :param compression: the compression of the shards, which is "none", "gzip", or "zstd"
+        :param shard_count: the number of shards
+        :param metadata: the extra fields of the manifest, e.g., the project name and the language
+        """
+        self.output_dir = output_dir
+        self.compression = compression
+        self.shard_count = max(1, shard_count)
+        self.metadata = metadata if metadata is not None else {}
+        (self.compress, _) = get_codec(compression)
+
+        os.makedirs(output_dir, exist_ok=True)
+        # Remove the previous output, including the shards of a different shard count
+        for file_name in os.listdir(output_dir):
+            if file_name == MANIFEST_FILE_NAME or file_name == INDEX_FILE_NAME or file_name.startswith("shard-"):
+                os.remove(os.path.join(output_dir, file_name))
+
+        self.shard_files = [
+            open(os.path.join(output_dir, get_shard_file_name(shard, compression)), "wb")
+            for shard in range(self.shard_count)
+        ]
+        self.shard_function_counts = [0] * self.shard_count
+        self.shard_block_counts = [0] * self.shard_count
+        self.index_file = open(os.path.join(output_dir, INDEX_FILE_NAME), "w")
+        self.file_paths = set([])
+        self.function_count = 0
+
+        # The block of the current file, which holds the lines and the (function_id, function_name, offset, length)
+        # entries of its functions until the functions of another file are written
+        self.block_file_path = None
+        self.block_lines: List[bytes] = []
+        self.block_entries: List[Tuple[int, str, int, int]] = []
+        self.block_size = 0
+
+    def get_shard(self, file_path: str) -> int:
+        """
+        Get the shard of a file, which is stable across runs.
+        """
+        return zlib.crc32(file_path.encode("utf-8", errors="surrogatepass")) % self.shard_count
+
+    def write(self, file_path: str, function_id: int, function_name: str, record: Dict) -> None:
+        """
+        Write the result of a function.
+        :param file_path: the path of the file of the function
+        :param record: the result of the function, which is serializable to JSON
+        """
+        if file_path != self.block_file_path:
+            self.flush_block()
+            self.block_file_path = file_path
+            self.file_paths.add(file_path)
+        line = json.dumps(record, sort_keys=True, separators=(",", ":")).encode("utf-8") + b"\n"
+        self.block_entries.append((function_id, function_name, self.block_size, len(line)))
+        self.block_lines.append(line)
+        self.block_size += len(line)
+        self.function_count += 1
+
+    def flush_block(self) -> None:
+        """
+        Write the block of the current file to its shard, and the index entries of its functions.
+        """
+        if len(self.block_entries) == 0:
+            return
+        shard = self.get_shard(self.block_file_path)
+        shard_file = self.shard_files[shard]
+        block = self.compress(b"".join(self.block_lines))
+        block_offset = shard_file.tell()
+        shard_file.write(block)
+
+        for (function_id, function_name, record_offset, record_length) in self.block_entries:
+            index_entry = {
+                "function_id": function_id,
+                "function_name": function_name,
+                "file_path": self.block_file_path,
+                "shard": shard,
+                "block_offset": block_offset,
+                "block_length": len(block),
+                "record_offset": record_offset,
+                "record_length": record_length,
+            }
+            self.index_file.write(json.dumps(index_entry, separators=(",", ":")) + "\n")
+        self.shard_function_counts[shard] += len(self.block_entries)
+        self.shard_block_counts[shard] += 1
+
+        self.block_lines = []
+        self.block_entries = []
+        self.block_size = 0
+
+    def close(self) -> None:
+        """
+        Flush the last block, close the shards and the index, and write the manifest.
+        """
+        self.flush_block()
+        shards = []
+        for (shard, shard_file) in enumerate(self.shard_files):
+            shards.append(
+                {
+                    "path": get_shard_file_name(shard, self.compression),
+                    "function_count": self.shard_function_counts[shard],
+                    "block_count": self.shard_block_counts[shard],
+                    "byte_count": shard_file.tell(),
+                }
+            )
+            shard_file.close()
+        self.index_file.close()
+
+        manifest = dict(self.metadata)
+        manifest.update(
+            {
+                "format_version": RESULT_FORMAT_VERSION,
+                "compression": self.compression,
+                "shard_count": self.shard_count,
+                "function_count": self.function_count,
+                "file_count": len(self.file_paths),
+                "index": INDEX_FILE_NAME,
+                "shards": shards,
+            }
+        )
+        manifest_path = os.path.join(self.output_dir, MANIFEST_FILE_NAME)
+        with open(manifest_path + ".tmp", "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def __enter__(self) -> "JsonlResultWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class JsonlResultReader:
+    """
+    Reader of the results written by JsonlResultWriter.
+    A function is read by seeking to its block in its shard, without loading the other functions.
+    """
+
+    def __init__(self, output_dir: str) -> None:
+        """
+        :param output_dir: the directory of the shards, the index, and the manifest
+        """
+        self.output_dir = output_dir
+        with open(os.path.join(output_dir, MANIFEST_FILE_NAME), "r") as manifest_file:
+            self.manifest = json.load(manifest_file)
+        (_, self.decompress) = get_codec(self.manifest["compression"])
+
+        self.index_entries: Dict[int, Dict] = {}
+        self.file_function_ids: Dict[str, List[int]] = {}
+        with open(os.path.join(output_dir, self.manifest["index"]), "r") as index_file:
+            for line in index_file:
+                index_entry = json.loads(line)
+                self.index_entries[index_entry["function_id"]] = index_entry
+                self.file_function_ids.setdefault(index_entry["file_path"], []).append(index_entry["function_id"])
+
+        # The last decompressed block, which is shared by the functions of the same file
+        self.cached_block_key = None
+        self.cached_block = b""
+
+    def read_block(self, shard: int, block_offset: int, block_length: int) -> bytes:
+        """
+        Read and decompress a block of a shard.
+        """
+        block_key = (shard, block_offset)
+        if block_key != self.cached_block_key:
+            shard_path = os.path.join(self.output_dir, self.manifest["shards"][shard]["path"])
+            with open(shard_path, "rb") as shard_file:
+                shard_file.seek(block_offset)
+                self.cached_block = self.decompress(shard_file.read(block_length))
+            self.cached_block_key = block_key
+        return self.cached_block
+
+    def get_function(self, function_id: int) -> Dict:
+        """
+        Get the result of a function, or None if the function is not in the results.
+        """
+        index_entry = self.index_entries.get(function_id)
+        if index_entry is None:
+            return None
+        block = self.read_block(index_entry["shard"], index_entry["block_offset"], index_entry["block_length"])
+        record_offset = index_entry["record_offset"]
+        return json.loads(block[record_offset:record_offset + index_entry["record_length"]])
+
+    def get_functions_in_file(self, file_path: str) -> List[Dict]:
+        """
+        Get the results of the functions in a file.
+        """
+        return [self.get_function(function_id) for function_id in self.file_function_ids.get(file_path, [])]
+
+    def iter_functions(self) -> Iterator[Dict]:
+        """
+        Iterate the results of all the functions, reading each block once.
+        """
+        ordered_entries = sorted(
+            self.index_entries.values(),
+            key=lambda index_entry: (index_entry["shard"], index_entry["block_offset"], index_entry["record_offset"]),
+        )
+        for index_entry in ordered_entries:
+            yield self.get_function(index_entry["function_id"])
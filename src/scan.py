@@ -1,8 +1,13 @@
 import os
 import argparse
-import glob
 from model.utils import *
 from pipeline.metascan import *
+from parser.fact_cache import FactCache
+from parser.source_loader import SourceLoader
+from parser.source_scanner import SourceScanner
+from pipeline.result_writer import COMPRESSIONS
+from model.llm import CACHE_MODES, ResponseCache
+from model.token_accounting import TokenLedger
 
 class BatchScan:
     def __init__(
@@ -12,16 +17,45 @@ class BatchScan:
         inference_model_name: str,
         inference_key_str: str,
         temperature: float,
-        scanners: list
+        scanners: list,
+        jobs: int = 1,
+        fact_cache: FactCache = None,
+        source_loader: SourceLoader = None,
+        exclude_patterns: list = None,
+        respect_gitignore: bool = True,
+        walk_jobs: int = 1,
+        output_format: str = "json",
+        compression: str = "none",
+        shard_count: int = 1,
+        fact_store_path: str = None,
+        response_cache: ResponseCache = None,
+        llm_base_url: str = None,
+        token_ledger: TokenLedger = None,
+        ledger_path: str = None
     ):
         """
         Initialize BatchScan object with project details.
+        The source files are not loaded until they are parsed.
         """
         self.project_path = project_path
         self.language = language
         self.scanners = scanners
+        self.jobs = jobs
+        self.fact_cache = fact_cache
+        self.source_loader = source_loader if source_loader is not None else SourceLoader()
+        self.exclude_patterns = exclude_patterns if exclude_patterns is not None else []
+        self.respect_gitignore = respect_gitignore
+        self.walk_jobs = walk_jobs
+        self.output_format = output_format
+        self.compression = compression
+        self.shard_count = shard_count
+        self.fact_store_path = fact_store_path
+        self.response_cache = response_cache
+        self.llm_base_url = llm_base_url
+        self.token_ledger = token_ledger
+        self.ledger_path = ledger_path
 
-        self.all_files = {}
+        self.all_file_paths = []
         self.inference_model_name = inference_model_name
         self.inference_key_str = inference_key_str
         self.temperature = temperature
@@ -37,11 +71,9 @@ class BatchScan:
         elif self.language == "Python":
             suffixs = ["py"]
         
-        # Load all files with the specified suffix in the project path
+        # Find all files with the specified suffix in the project path
         self.travese_files(project_path, suffixs)
 
-        print(len(self.all_files))
-
     def start_batch_scan(self) -> None:
         """
         Start the batch scan process.
@@ -52,22 +84,73 @@ class BatchScan:
             metascan_pipeline = MetaScanPipeline(
                 project_name,
                 self.language,
-                self.all_files,
+                self.source_loader.iter_sources(self.all_file_paths),
                 self.inference_model_name,
                 self.inference_key_str,
-                self.temperature
+                self.temperature,
+                self.jobs,
+                self.fact_cache,
+                self.output_format,
+                self.compression,
+                self.shard_count,
+                self.fact_store_path,
+                self.response_cache,
+                self.llm_base_url,
+                self.token_ledger,
+                self.project_path
             )
             metascan_pipeline.start_scan()
+            self.report_skipped_files()
+        self.report_fact_cache()
+        self.report_response_cache()
+        self.report_token_ledger()
+
+    def report_skipped_files(self) -> None:
+        """
+        Report the files skipped by the source loader.
+        """
+        if len(self.source_loader.skipped_files) == 0:
+            return
+        print(f"Skipped {len(self.source_loader.skipped_files)} files:")
+        for (file_path, reason) in self.source_loader.skipped_files:
+            print(f"    {file_path} ({reason})")
     
+    def report_fact_cache(self) -> None:
+        """
+        Report the hit rate of the fact cache and evict its stale entries.
+        """
+        if self.fact_cache is None:
+            return
+        print(f"Fact cache: {self.fact_cache.hit_count} hits, {self.fact_cache.miss_count} misses")
+        self.fact_cache.evict()
+
+    def report_response_cache(self) -> None:
+        """
+        Report the hit rate of the LLM response cache and evict its stale entries.
+        """
+        if self.response_cache is None:
+            return
+        print(f"LLM response cache: {self.response_cache.hit_count} hits, {self.response_cache.miss_count} misses")
+        self.response_cache.evict()
+
+    def report_token_ledger(self) -> None:
+        """
+        Report the tokens and the estimated cost of the LLM requests per scanner, model, and key.
+        """
+        if self.token_ledger is None:
+            return
+        self.token_ledger.report()
+        if self.ledger_path is not None:
+            self.token_ledger.save(self.ledger_path)
+
     def travese_files(self, project_path: str, suffixs: List) -> None:
         """
-        Traverse all files in the project path.
+        Traverse all files in the project path in a single walk, and report the number and the size of the files.
+        The files are streamed to the worker processes from the largest if they are parsed in parallel.
         """
-        for suffix in suffixs:
-            for file in glob.glob(f"{project_path}/**/*.{suffix}", recursive=True):
-                with open(file, "r") as c_file:
-                    c_file_content = c_file.read()
-                    self.all_files[file] = c_file_content
+        source_scanner = SourceScanner(suffixs, self.exclude_patterns, self.respect_gitignore, self.walk_jobs)
+        self.all_file_paths = source_scanner.scan(project_path, self.jobs > 1)
+        print(f"Found {source_scanner.file_count} files ({source_scanner.byte_count / 1024 / 1024:.1f} MB)")
 
 
 def run_dev_mode():
@@ -110,14 +193,157 @@ def run_dev_mode():
         choices=["metascan"],
         help="Specify which scanners to invoke",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Specify the number of worker processes for parsing",
+    )
+    parser.add_argument(
+        "--fact-cache-dir",
+        type=str,
+        default=None,
+        help="Specify the directory of the on-disk fact cache. The cache is disabled if omitted",
+    )
+    parser.add_argument(
+        "--fact-cache-size",
+        type=int,
+        default=512,
+        help="Specify the size cap of the fact cache in MB",
+    )
+    parser.add_argument(
+        "--exclude",
+        nargs="*",
+        default=[],
+        help="Specify the excluded paths in the syntax of .gitignore, e.g., Documentation/ tools/testing/",
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="Scan the files ignored by the .gitignore files",
+    )
+    parser.add_argument(
+        "--walk-jobs",
+        type=int,
+        default=1,
+        help="Specify the number of threads walking the top-level subdirectories of the project",
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        default=16,
+        help="Specify the maximal size of a source file in MB. Larger files are skipped",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=256,
+        help="Specify the maximal size of the source files read ahead of the parser in MB",
+    )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Map the source files into memory instead of reading them",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["json", "jsonl"],
+        default="json",
+        help="Specify the format of the scan results. json writes a single file, and jsonl streams a line per function",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default="none",
+        help="Specify the compression of the jsonl results. zstd requires the zstandard package",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Specify the number of shards of the jsonl results, which are split by source files",
+    )
+    parser.add_argument(
+        "--fact-store",
+        type=str,
+        default=None,
+        help="Specify the path of an SQLite database to store the facts in indexed tables. It is disabled if omitted",
+    )
+    parser.add_argument(
+        "--llm-cache-dir",
+        type=str,
+        default=None,
+        help="Specify the directory of the on-disk LLM response cache. The cache is disabled if omitted",
+    )
+    parser.add_argument(
+        "--llm-cache-size",
+        type=int,
+        default=256,
+        help="Specify the size cap of the LLM response cache in MB",
+    )
+    parser.add_argument(
+        "--llm-cache-ttl",
+        type=float,
+        default=30 * 24 * 3600,
+        help="Specify the time to live of the LLM responses in seconds. A non-positive value never expires",
+    )
+    parser.add_argument(
+        "--llm-cache-mode",
+        choices=CACHE_MODES,
+        default="read-write",
+        help="Specify whether the LLM response cache is read and written, only read, or bypassed",
+    )
+    parser.add_argument(
+        "--llm-base-url",
+        type=str,
+        default=None,
+        help="Specify the base URL of an OpenAI-compatible server, e.g., http://127.0.0.1:8000/v1 of bench/mock_llm_server.py",
+    )
+    parser.add_argument(
+        "--llm-budget",
+        type=float,
+        default=None,
+        help="Specify the budget of the estimated LLM cost in USD, after which no new request is sent",
+    )
+    parser.add_argument(
+        "--llm-token-budget",
+        type=int,
+        default=None,
+        help="Specify the budget of the LLM input and output tokens, after which no new request is sent",
+    )
+    parser.add_argument(
+        "--llm-ledger",
+        type=str,
+        default=None,
+        help="Specify the path of a JSON file to save the tokens and the cost per scanner, model, and key",
+    )
 
     args = parser.parse_args()
+    if args.output_format != "jsonl" and (args.compression != "none" or args.shards != 1):
+        parser.error("--compression and --shards require --output-format jsonl")
     project_path = args.project_path
     language = args.language
     inference_model = args.inference_model
     global_temperature = float(args.global_temperature)
     scanners = args.scanners if args.scanners else []
-    inference_model_key = standard_keys[0]
+    jobs = args.jobs
+    fact_cache = None
+    if args.fact_cache_dir:
+        fact_cache = FactCache(args.fact_cache_dir, args.fact_cache_size * 1024 * 1024)
+    response_cache = None
+    if args.llm_cache_dir:
+        response_cache = ResponseCache(
+            args.llm_cache_dir,
+            args.llm_cache_size * 1024 * 1024,
+            args.llm_cache_ttl if args.llm_cache_ttl > 0 else None,
+            args.llm_cache_mode,
+        )
+    token_ledger = None
+    if args.llm_budget is not None or args.llm_token_budget is not None or args.llm_ledger is not None:
+        # The tokens are only counted when they are limited or saved, which needs the tokenizer
+        token_ledger = TokenLedger(args.llm_budget, args.llm_token_budget)
+    source_loader = SourceLoader(args.max_file_size * 1024 * 1024, args.memory_budget * 1024 * 1024, args.mmap)
+    inference_model_key = standard_keys[0] if len(standard_keys) > 0 else ""
 
     batch_scan = BatchScan(
         project_path,
@@ -125,7 +351,21 @@ def run_dev_mode():
         inference_model,
         inference_model_key,
         global_temperature,
-        scanners
+        scanners,
+        jobs,
+        fact_cache,
+        source_loader,
+        args.exclude,
+        not args.no_gitignore,
+        args.walk_jobs,
+        args.output_format,
+        args.compression,
+        args.shards,
+        args.fact_store,
+        response_cache,
+        args.llm_base_url,
+        token_ledger,
+        args.llm_ledger
     )
     print("Starting batch scan...")
     batch_scan.start_batch_scan()
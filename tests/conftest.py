@@ -0,0 +1,24 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules are imported as in src/scan.py, e.g., "from parser.line_index import LineIndex"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+@pytest.fixture
+def mock_llm_server():
+    """
+    A local mock of the chat completions API serving in a thread, whose config is changed by the tests
+    """
+    from bench.mock_llm_server import MockLLMConfig, MockLLMServer
+
+    server = MockLLMServer("127.0.0.1", 0, MockLLMConfig(seed=0))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+from model.batch_job import JOB_STATE_FILE_NAME, BatchJobRunner, BatchProvider, LocalBatchProvider, get_custom_id
+
+
+class CountingProvider(LocalBatchProvider):
+    """
+    A local provider counting the submitted jobs, which is interrupted while it polls if asked to
+    """
+
+    def __init__(self, job_dir, respond=None, is_interrupted=False):
+        super().__init__(job_dir, respond)
+        self.submitted_paths = []
+        self.is_interrupted = is_interrupted
+
+    def submit(self, input_path):
+        self.submitted_paths.append(input_path)
+        return super().submit(input_path)
+
+    def get_status(self, job_id):
+        if self.is_interrupted:
+            raise KeyboardInterrupt()
+        return super().get_status(job_id)
+
+
+def get_runner(provider, work_dir, max_requests_per_job=2):
+    return BatchJobRunner(provider, str(work_dir), "gpt-4o-mini", 0.0, "system", 0, max_requests_per_job)
+
+
+REQUESTS = {get_custom_id("scanner", "a.c", index): f"prompt {index}" for index in range(5)}
+
+
+def test_get_custom_id_is_stable():
+    assert get_custom_id("scanner", "a.c", "main") == get_custom_id("scanner", "a.c", "main")
+    assert get_custom_id("scanner", "a.c", "main") != get_custom_id("scanner", "a.cmain")
+    assert get_custom_id("x").startswith("request-")
+
+
+def test_batch_provider_is_abstract():
+    with pytest.raises(TypeError):
+        BatchProvider()
+
+
+def test_run(tmp_path):
+    provider = CountingProvider(str(tmp_path / "jobs"))
+    results = get_runner(provider, tmp_path / "work").run(REQUESTS)
+    assert list(results) == list(REQUESTS)
+    assert {custom_id: output for (custom_id, (output, _, _)) in results.items()} == REQUESTS
+    for (_, input_token_count, output_token_count) in results.values():
+        assert input_token_count > 0 and output_token_count == 2
+    # The requests are split into jobs of at most 2 requests
+    assert len(provider.submitted_paths) == 3
+
+
+def test_failed_requests_have_empty_outputs(tmp_path):
+    def respond(body):
+        if body["messages"][-1]["content"] == "prompt 1":
+            raise ValueError("invalid request")
+        return "yes"
+
+    provider = LocalBatchProvider(str(tmp_path / "jobs"), respond)
+    results = get_runner(provider, tmp_path / "work", 10).run(REQUESTS)
+    assert results[get_custom_id("scanner", "a.c", 1)] == ("", 0, 0)
+    assert sorted(output for (output, _, _) in results.values()) == ["", "yes", "yes", "yes", "yes"]
+
+
+def test_interrupted_run_resumes_the_submitted_jobs(tmp_path):
+    interrupted_provider = CountingProvider(str(tmp_path / "jobs"), is_interrupted=True)
+    with pytest.raises(KeyboardInterrupt):
+        get_runner(interrupted_provider, tmp_path / "work").run(REQUESTS)
+    assert len(interrupted_provider.submitted_paths) == 3
+    with open(tmp_path / "work" / JOB_STATE_FILE_NAME, "r") as state_file:
+        assert len(json.load(state_file)) == 3
+
+    # The same requests in another order are written to the same batch files, whose jobs are polled again
+    provider = CountingProvider(str(tmp_path / "jobs"))
+    shuffled_requests = dict(reversed(list(REQUESTS.items())))
+    results = get_runner(provider, tmp_path / "work").run(shuffled_requests)
+    assert provider.submitted_paths == []
+    assert {custom_id: output for (custom_id, (output, _, _)) in results.items()} == REQUESTS
+
+    # The downloaded outputs are reused
+    output_paths = sorted(file_name for file_name in os.listdir(tmp_path / "work") if file_name.startswith("output-"))
+    assert len(output_paths) == 3
+
+
+def test_failed_job_is_submitted_again(tmp_path):
+    class FailingProvider(LocalBatchProvider):
+        def get_status(self, job_id):
+            return "expired"
+
+    results = get_runner(FailingProvider(str(tmp_path / "jobs")), tmp_path / "work", 10).run(REQUESTS)
+    assert set(results.values()) == {("", 0, 0)}
+    with open(tmp_path / "work" / JOB_STATE_FILE_NAME, "r") as state_file:
+        assert json.load(state_file) == {}
+
+    provider = CountingProvider(str(tmp_path / "jobs"))
+    results = get_runner(provider, tmp_path / "work", 10).run(REQUESTS)
+    assert len(provider.submitted_paths) == 1
+    assert {custom_id: output for (custom_id, (output, _, _)) in results.items()} == REQUESTS
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from parser.call_graph import CallGraph
+
+
+def build_graph(function_ids, edges):
+    call_graph = CallGraph()
+    call_graph.add_functions(function_ids)
+    for (caller_id, callee_id) in edges:
+        call_graph.add_edges(caller_id, [callee_id])
+    return call_graph
+
+
+def to_sets(components):
+    return sorted(sorted(component.tolist()) for component in components)
+
+
+# 1 -> 2 -> 3 -> 4, 3 -> 2 is a cycle, and 5 -> 4
+EDGES = [(1, 2), (2, 3), (3, 2), (3, 4), (5, 4)]
+
+
+def test_callees_and_callers():
+    call_graph = build_graph([1, 2, 3, 4, 5], EDGES)
+    assert call_graph.callees(3).tolist() == [2, 4]
+    assert call_graph.callers(4).tolist() == [3, 5]
+    assert call_graph.callees(4).tolist() == []
+    assert call_graph.callees(100).tolist() == []
+    assert call_graph.get_edge_count() == len(EDGES)
+
+
+def test_duplicate_edges_are_merged():
+    call_graph = build_graph([1, 2], [(1, 2), (1, 2)])
+    call_graph.add_edges(1, [2, 2])
+    assert call_graph.get_edge_count() == 1
+    (callers, callees) = call_graph.get_edges()
+    assert (callers.tolist(), callees.tolist()) == ([1], [2])
+
+
+def test_removed_functions_drop_their_edges():
+    call_graph = build_graph([1, 2, 3, 4, 5], EDGES)
+    assert call_graph.get_edge_count() == len(EDGES)
+    call_graph.remove_functions([3])
+    assert call_graph.callees(2).tolist() == []
+    assert call_graph.callers(4).tolist() == [5]
+    assert call_graph.callees(3).tolist() == []
+    # The edges to functions never added are dropped as well
+    call_graph.add_edges(1, [42])
+    assert call_graph.callees(1).tolist() == [2]
+
+
+def test_set_edges_replaces_all_edges():
+    call_graph = build_graph([1, 2, 3], [(1, 2)])
+    call_graph.set_edges(np.array([2, 3]), np.array([3, 1]))
+    assert call_graph.callees(1).tolist() == []
+    assert call_graph.callees(2).tolist() == [3]
+    assert call_graph.callees(3).tolist() == [1]
+
+
+def test_k_hop_and_reachable():
+    call_graph = build_graph([1, 2, 3, 4, 5], EDGES)
+    assert call_graph.k_hop_callees([1], 1).tolist() == [2]
+    assert call_graph.k_hop_callees([1], 2).tolist() == [2, 3]
+    assert call_graph.reachable_callees([1]).tolist() == [2, 3, 4]
+    assert call_graph.k_hop_callers([4], 1).tolist() == [3, 5]
+    assert call_graph.reachable_callers([4]).tolist() == [1, 2, 3, 5]
+    # A function is included only if it is reached through a cycle
+    assert call_graph.reachable_callees([2]).tolist() == [2, 3, 4]
+    assert call_graph.reachable_callees([100]).tolist() == []
+
+
+def test_strongly_connected_components():
+    call_graph = build_graph([1, 2, 3, 4, 5], EDGES)
+    components = call_graph.strongly_connected_components()
+    assert to_sets(components) == [[1], [2, 3], [4], [5]]
+    # The callees come before the callers
+    positions = {}
+    for (position, component) in enumerate(components):
+        for function_id in component.tolist():
+            positions[function_id] = position
+    for (caller_id, callee_id) in EDGES:
+        assert positions[callee_id] <= positions[caller_id]
+
+
+def test_strongly_connected_components_of_self_recursion():
+    call_graph = build_graph([1, 2], [(1, 1), (1, 2)])
+    assert [component.tolist() for component in call_graph.strongly_connected_components()] == [[2], [1]]
+
+
+def test_topological_levels():
+    call_graph = build_graph([1, 2, 3, 4, 5, 6], EDGES)
+    levels = [level.tolist() for level in call_graph.topological_levels()]
+    assert levels == [[4, 6], [2, 3, 5], [1]]
+
+
+def test_topological_levels_without_edges():
+    call_graph = build_graph([3, 1, 2], [])
+    assert [level.tolist() for level in call_graph.topological_levels()] == [[1, 2, 3]]
+    assert CallGraph().topological_levels() == []
+    assert CallGraph().strongly_connected_components() == []
+
+
+def test_deep_chain_does_not_recurse():
+    function_ids = list(range(5000))
+    call_graph = build_graph(function_ids, [])
+    call_graph.set_edges(np.array(function_ids[:-1]), np.array(function_ids[1:]))
+    assert len(call_graph.strongly_connected_components()) == len(function_ids)
+    assert len(call_graph.topological_levels()) == len(function_ids)
+
+
+def test_to_networkx():
+    pytest.importorskip("networkx")
+    graph = build_graph([1, 2, 3, 4, 5], EDGES).to_networkx()
+    assert sorted(graph.nodes) == [1, 2, 3, 4, 5]
+    assert sorted(graph.edges) == sorted(EDGES)
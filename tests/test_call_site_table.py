@@ -0,0 +1,66 @@
+from parser.call_site_table import CallSiteTable
+
+
+def build_table():
+    call_site_table = CallSiteTable()
+    call_site_table.add_call_sites(2, "b.c", [("foo", 30, 35), ("printf", 10, 20)])
+    call_site_table.add_call_sites(1, "a.c", [("bar", 5, 9), ("foo", 12, 15), ("foo", 20, 25)])
+    call_site_table.add_call_sites(3, "a.c", [])
+    return call_site_table
+
+
+def to_pairs(caller_ids, callee_ids):
+    return sorted(zip(caller_ids.tolist(), callee_ids.tolist()))
+
+
+def test_call_sites_are_sorted_by_caller_and_offset():
+    call_site_table = build_table()
+    assert len(call_site_table) == 5
+    assert call_site_table.get_call_sites(1) == [("bar", 5, 9), ("foo", 12, 15), ("foo", 20, 25)]
+    assert call_site_table.get_call_sites(2) == [("printf", 10, 20), ("foo", 30, 35)]
+    assert call_site_table.get_call_sites(3) == []
+    assert call_site_table.get_callee_names(1) == {"bar", "foo"}
+    assert call_site_table.get_callers_of_name("foo").tolist() == [1, 2]
+    assert call_site_table.get_callers_of_name("missing").tolist() == []
+
+
+def test_resolve():
+    call_site_table = build_table()
+    (caller_ids, callee_ids) = call_site_table.resolve({"foo": {10, 11}, "bar": {12}, "unused": {13}})
+    # A pair per call site and callee of its name
+    assert to_pairs(caller_ids, callee_ids) == [
+        (1, 10), (1, 10), (1, 11), (1, 11), (1, 12), (2, 10), (2, 11)
+    ]
+    # The call sites without any function of their names are unresolved
+    assert call_site_table.get_resolved_call_site_ranges(1) == [(5, 9), (12, 15), (20, 25)]
+    assert call_site_table.get_resolved_call_site_ranges(2) == [(30, 35)]
+
+
+def test_resolve_empty_table():
+    (caller_ids, callee_ids) = CallSiteTable().resolve({"foo": {1}})
+    assert caller_ids.tolist() == [] and callee_ids.tolist() == []
+
+
+def test_remove_callers():
+    call_site_table = build_table()
+    call_site_table.remove_callers([1])
+    assert len(call_site_table) == 2
+    assert call_site_table.get_call_sites(1) == []
+    (caller_ids, callee_ids) = call_site_table.resolve({"foo": {10}})
+    assert to_pairs(caller_ids, callee_ids) == [(2, 10)]
+
+
+def test_remove_pending_callers_before_adding_new_call_sites():
+    call_site_table = build_table()
+    call_site_table.remove_callers([2])
+    call_site_table.add_call_sites(2, "b.c", [("bar", 1, 4)])
+    assert call_site_table.get_call_sites(2) == [("bar", 1, 4)]
+
+
+def test_shift_callers():
+    call_site_table = build_table()
+    call_site_table.shift_callers({2: 100, 4: 7})
+    assert call_site_table.get_call_sites(1) == [("bar", 5, 9), ("foo", 12, 15), ("foo", 20, 25)]
+    assert call_site_table.get_call_sites(2) == [("printf", 110, 120), ("foo", 130, 135)]
+    call_site_table.shift_callers({})
+    assert call_site_table.get_call_sites(2) == [("printf", 110, 120), ("foo", 130, 135)]
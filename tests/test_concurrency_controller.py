@@ -0,0 +1,88 @@
+import threading
+import time
+
+from model.concurrency_controller import AdaptiveConcurrencyController
+
+
+def test_window_is_clamped():
+    assert AdaptiveConcurrencyController(initial_window=100, max_window=8).get_window() == 8
+    assert AdaptiveConcurrencyController(initial_window=0, min_window=2).get_window() == 2
+
+
+def test_window_grows_additively():
+    controller = AdaptiveConcurrencyController(initial_window=4, max_window=6)
+    # A window of healthy completions grows the window by about one request
+    for _ in range(4):
+        controller.release(controller.acquire(), True)
+    assert controller.get_window() == 4
+    controller.release(controller.acquire(), True)
+    assert controller.get_window() == 5
+    for _ in range(100):
+        controller.release(controller.acquire(), True)
+    assert controller.get_window() == 6
+
+
+def test_slow_completions_do_not_grow_the_window():
+    controller = AdaptiveConcurrencyController(initial_window=4)
+    controller.smoothed_latency = 0.001
+    controller.release(time.monotonic() - 1.0, True)
+    assert controller.window == 4.0
+
+
+def test_burst_of_overloads_decreases_the_window_once():
+    controller = AdaptiveConcurrencyController(initial_window=16)
+    start_times = [controller.acquire() for _ in range(8)]
+    for start_time in start_times:
+        controller.release(start_time, False, is_overload=True)
+    assert controller.get_window() == 8
+    # A request started after the decrease decreases the window again
+    controller.release(controller.acquire(), False, is_overload=True)
+    assert controller.get_window() == 4
+
+
+def test_window_is_floored_at_min_window():
+    controller = AdaptiveConcurrencyController(initial_window=2, min_window=1)
+    for _ in range(5):
+        controller.release(controller.acquire(), False, is_overload=True)
+    assert controller.get_window() == 1
+
+
+def test_other_errors_leave_the_window_unchanged():
+    controller = AdaptiveConcurrencyController(initial_window=4)
+    controller.release(controller.acquire(), False)
+    stats = controller.get_stats()
+    assert (stats["window"], stats["error_count"], stats["overload_count"], stats["in_flight"]) == (4, 1, 0, 0)
+
+
+def test_acquire_waits_for_room_in_the_window():
+    controller = AdaptiveConcurrencyController(initial_window=1, max_window=1)
+    first_start_time = controller.acquire()
+    acquired = threading.Event()
+
+    def acquire_second():
+        controller.release(controller.acquire(), True)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_second)
+    thread.start()
+    assert not acquired.wait(0.1)
+    controller.release(first_start_time, True)
+    assert acquired.wait(5)
+    thread.join()
+    assert controller.get_stats()["success_count"] == 2
+
+
+def test_retry_after_pauses_the_requests():
+    controller = AdaptiveConcurrencyController(initial_window=4)
+    controller.release(controller.acquire(), False, is_overload=True, retry_after=0.2)
+    start_time = time.monotonic()
+    controller.release(controller.acquire(), True)
+    assert time.monotonic() - start_time >= 0.15
+
+
+def test_throughput():
+    controller = AdaptiveConcurrencyController()
+    assert controller.get_throughput() >= 0.0
+    for _ in range(3):
+        controller.release(controller.acquire(), True)
+    assert controller.get_stats()["throughput"] > 0
@@ -0,0 +1,84 @@
+import os
+
+from parser.fact_cache import FactCache
+from parser.program_parser import TSAnalyzer
+
+
+SOURCE = (
+    b"int helper(int a) {\n    return a;\n}\n\n"
+    b"int main() {\n    if (1) {\n        return helper(0);\n    }\n    return 0;\n}\n"
+)
+
+
+def test_key_depends_on_content_language_and_version():
+    key = FactCache.get_key(SOURCE, "C", 1)
+    assert key == FactCache.get_key(memoryview(SOURCE), "C", 1)
+    assert key != FactCache.get_key(SOURCE + b"\n", "C", 1)
+    assert key != FactCache.get_key(SOURCE, "C++", 1)
+    assert key != FactCache.get_key(SOURCE, "C", 2)
+
+
+def test_load_and_store(tmp_path):
+    fact_cache = FactCache(str(tmp_path))
+    assert fact_cache.load(SOURCE, "C", 1) is None
+    fact_cache.store(SOURCE, "C", 1, [("main", 1, 3)])
+    assert fact_cache.load(SOURCE, "C", 1) == [("main", 1, 3)]
+    assert fact_cache.load(SOURCE, "C", 2) is None
+    assert (fact_cache.hit_count, fact_cache.miss_count) == (1, 2)
+
+
+def test_corrupted_entry_is_dropped(tmp_path):
+    fact_cache = FactCache(str(tmp_path))
+    fact_cache.store(SOURCE, "C", 1, [])
+    entry_path = fact_cache.get_entry_path(FactCache.get_key(SOURCE, "C", 1))
+    with open(entry_path, "wb") as entry_file:
+        entry_file.write(b"not a pickle")
+    assert fact_cache.load(SOURCE, "C", 1) is None
+    assert not os.path.exists(entry_path)
+    assert fact_cache.miss_count == 1
+
+
+def test_evict_least_recently_used(tmp_path):
+    fact_cache = FactCache(str(tmp_path))
+    sources = [b"int f%d;" % index for index in range(3)]
+    for (index, source) in enumerate(sources):
+        fact_cache.store(source, "C", 1, [b"x" * 1000])
+        os.utime(fact_cache.get_entry_path(FactCache.get_key(source, "C", 1)), (index, index))
+    entry_size = os.path.getsize(fact_cache.get_entry_path(FactCache.get_key(sources[0], "C", 1)))
+
+    # Loading an entry makes it the most recently used one
+    assert fact_cache.load(sources[0], "C", 1) is not None
+    fact_cache.max_size = entry_size * 2
+    fact_cache.evict()
+    assert fact_cache.load(sources[1], "C", 1) is None
+    assert fact_cache.load(sources[0], "C", 1) is not None
+    assert fact_cache.load(sources[2], "C", 1) is not None
+
+
+def get_facts(analyzer):
+    return sorted(
+        (
+            function.file_path,
+            function.function_name,
+            function.start_line_number,
+            function.end_line_number,
+            function.function_code,
+            sorted(function.paras),
+            sorted(function.if_statements.items()),
+            sorted(function.loop_statements.items()),
+            sorted(
+                analyzer.environment[callee_id].function_name
+                for callee_id in analyzer.call_graph.callees(function_id).tolist()
+            ),
+        )
+        for (function_id, function) in analyzer.environment.items()
+    )
+
+
+def test_cached_facts_match_parsed_facts(tmp_path):
+    fact_cache = FactCache(str(tmp_path))
+    uncached = get_facts(TSAnalyzer({"main.c": SOURCE}, "C"))
+    assert get_facts(TSAnalyzer({"main.c": SOURCE}, "C", fact_cache=fact_cache)) == uncached
+    assert (fact_cache.hit_count, fact_cache.miss_count) == (0, 1)
+    assert get_facts(TSAnalyzer({"main.c": SOURCE}, "C", fact_cache=fact_cache)) == uncached
+    assert (fact_cache.hit_count, fact_cache.miss_count) == (1, 1)
@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+import pytest
+
+from pipeline.fact_store import FactStore, get_prefix_upper_bound
+
+
+def make_function(function_id, function_name, file_path, start_line, end_line, paras=None, ifs=None, loops=None):
+    return SimpleNamespace(
+        function_id=function_id,
+        function_name=function_name,
+        file_path=file_path,
+        start_line_number=start_line,
+        end_line_number=end_line,
+        paras=paras if paras is not None else set(),
+        if_statements=ifs if ifs is not None else {},
+        loop_statements=loops if loops is not None else {},
+    )
+
+
+FUNCTIONS = [
+    make_function(
+        1,
+        "parse",
+        "src/parser/parse.c",
+        1,
+        30,
+        paras={("buffer", 1, 0), ("size", 1, 1)},
+        ifs={(5, 9): (5, 5, "buffer == NULL", (6, 8), (0, 0)), (12, 20): (12, 12, "size > 0", (13, 15), (16, 20))},
+        loops={(22, 28): (22, 22, "for (i = 0; i < size; i++)", 23, 28)},
+    ),
+    make_function(2, "inner", "src/parser/parse.c", 10, 18, paras={("x", 10, 0)}),
+    make_function(3, "parse", "src/util/parse.c", 1, 5),
+    make_function(4, "main", "src/main.c", 1, 10, loops={(3, 8): (3, 3, "while (running)", 4, 8)}),
+    make_function(5, "helper", "srcx/helper.c", 1, 3),
+]
+
+
+@pytest.fixture
+def fact_store(tmp_path):
+    # A tiny batch size, so that the rows are inserted in several batches
+    fact_store = FactStore(str(tmp_path / "facts" / "facts.db"), batch_size=2)
+    for function in FUNCTIONS:
+        fact_store.add_function(function)
+    fact_store.add_call_edges([4, 4, 1], [1, 3, 2])
+    fact_store.finish()
+    yield fact_store
+    fact_store.connection.close()
+
+
+def get_ids(rows):
+    return [row["function_id"] for row in rows]
+
+
+def test_get_prefix_upper_bound():
+    assert get_prefix_upper_bound("src/") == "src0"
+    assert get_prefix_upper_bound("a") == "b"
+    assert get_prefix_upper_bound("") == ""
+
+
+def test_find_functions(fact_store):
+    assert get_ids(fact_store.find_functions("parse")) == [1, 3]
+    assert get_ids(fact_store.find_functions("parse", "src/parser/")) == [1]
+    assert get_ids(fact_store.find_functions(file_prefix="src/")) == [1, 2, 3, 4]
+    # The prefix matches whole path components, so "src" does not match "srcx"
+    assert get_ids(fact_store.find_functions(file_prefix="src")) == [1, 2, 3, 4]
+    assert get_ids(fact_store.find_functions(file_prefix="src/main.c")) == [4]
+    assert get_ids(fact_store.find_functions(file_prefix="src/mai")) == []
+    assert get_ids(fact_store.find_functions(file_prefix=".")) == [1, 2, 3, 4, 5]
+    assert get_ids(fact_store.find_functions()) == [1, 2, 3, 4, 5]
+    assert fact_store.find_functions("missing") == []
+    assert fact_store.find_functions("main")[0] == {
+        "function_id": 4, "name": "main", "file_path": "src/main.c", "start_line": 1, "end_line": 10
+    }
+
+
+def test_find_functions_by_line(fact_store):
+    assert get_ids(fact_store.find_functions_by_line("src/parser/parse.c", 12)) == [2, 1]
+    assert get_ids(fact_store.find_functions_by_line("src/parser/parse.c", 25)) == [1]
+    assert get_ids(fact_store.find_functions_by_line("src/parser/parse.c", 31)) == []
+    assert get_ids(fact_store.find_functions_by_line("missing.c", 1)) == []
+
+
+def test_get_parameters(fact_store):
+    assert [(row["name"], row["position"]) for row in fact_store.get_parameters(1)] == [("buffer", 0), ("size", 1)]
+    assert fact_store.get_parameters(3) == []
+
+
+def test_find_if_statements(fact_store):
+    rows = fact_store.find_if_statements("parse")
+    assert [(row["start_line"], row["condition_str"]) for row in rows] == [(5, "buffer == NULL"), (12, "size > 0")]
+    assert rows[1]["else_branch_start_line"] == 16 and rows[1]["file_path"] == "src/parser/parse.c"
+    assert [row["start_line"] for row in fact_store.find_if_statements(condition_pattern="NULL")] == [5]
+    assert fact_store.find_if_statements("parse", "src/util/") == []
+
+
+def test_find_loop_statements(fact_store):
+    assert [row["function_name"] for row in fact_store.find_loop_statements()] == ["parse", "main"]
+    rows = fact_store.find_loop_statements(header_pattern="while")
+    assert [(row["function_id"], row["body_start_line"]) for row in rows] == [(4, 4)]
+    assert fact_store.find_loop_statements("main", header_pattern="for") == []
+
+
+def test_call_edges(fact_store):
+    assert fact_store.get_callees(4) == [1, 3]
+    assert fact_store.get_callers(1) == [4]
+    assert fact_store.get_callers(4) == []
+
+
+def test_query_flushes_pending_rows(fact_store):
+    fact_store.add_function(make_function(6, "late", "src/late.c", 1, 2))
+    assert get_ids(fact_store.find_functions("late")) == [6]
+
+
+def test_reopen_and_overwrite(tmp_path):
+    db_path = str(tmp_path / "facts.db")
+    fact_store = FactStore(db_path)
+    fact_store.add_function(FUNCTIONS[0])
+    fact_store.close()
+
+    # The file ids are kept when the facts are appended
+    fact_store = FactStore(db_path)
+    fact_store.add_function(FUNCTIONS[1])
+    assert fact_store.query("SELECT COUNT(*) AS count FROM files") == [{"count": 1}]
+    assert get_ids(fact_store.find_functions(file_prefix="src/parser/")) == [1, 2]
+    fact_store.close()
+
+    fact_store = FactStore(db_path, overwrite=True)
+    assert fact_store.find_functions() == []
+    fact_store.close()
+
+
+def test_paths_are_relative_to_the_project(tmp_path):
+    project_path = str(tmp_path / "benchmark" / "C")
+    fact_store = FactStore(str(tmp_path / "facts.db"), project_path=project_path)
+    for (function_id, file_path) in enumerate(
+        ["drivers/net/eth.c", "drivers/net/wifi/wlan.c", "drivers/network/phy.c", "drivers/net.c"]
+    ):
+        fact_store.add_function(make_function(function_id, "probe", project_path + "/" + file_path, 1, 5))
+    fact_store.finish()
+
+    assert [row["file_path"] for row in fact_store.find_functions(file_prefix="drivers/net")] == [
+        "drivers/net/eth.c",
+        "drivers/net/wifi/wlan.c",
+    ]
+    assert get_ids(fact_store.find_functions("probe", "drivers/net/wifi/")) == [1]
+    assert get_ids(fact_store.find_functions_by_line("drivers/network/phy.c", 3)) == [2]
+    fact_store.close()
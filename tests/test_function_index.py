@@ -0,0 +1,55 @@
+from parser.function_index import FileIntervals, FunctionIndex
+
+
+# 1 [1, 20] encloses 2 [3, 8], which encloses 3 [4, 5]; 4 [10, 12] is nested in 1; 5 [25, 30] is separate
+INTERVALS = [(25, 30, 5), (10, 12, 4), (1, 20, 1), (4, 5, 3), (3, 8, 2)]
+
+
+def brute_force_find(intervals, line_number):
+    enclosing = [interval for interval in intervals if interval[0] <= line_number <= interval[1]]
+    return [function_id for (_, _, function_id) in sorted(enclosing, key=lambda interval: (-interval[0], interval[1]))]
+
+
+def test_file_intervals_find_innermost_first():
+    file_intervals = FileIntervals(INTERVALS)
+    assert file_intervals.find(4) == [3, 2, 1]
+    assert file_intervals.find(6) == [2, 1]
+    assert file_intervals.find(9) == [1]
+    assert file_intervals.find(11) == [4, 1]
+    assert file_intervals.find(22) == []
+    assert file_intervals.find(30) == [5]
+    assert file_intervals.find(0) == []
+    assert file_intervals.find(31) == []
+
+
+def test_file_intervals_match_brute_force():
+    for line_number in range(0, 32):
+        assert FileIntervals(INTERVALS).find(line_number) == brute_force_find(INTERVALS, line_number)
+
+
+def test_file_intervals_with_same_ranges():
+    # A function and a nested one starting on the same line, e.g., a lambda in a one-line function
+    file_intervals = FileIntervals([(5, 5, 2), (5, 5, 1), (5, 9, 0)])
+    assert file_intervals.find(5) == [2, 1, 0]
+    assert file_intervals.find(7) == [0]
+
+
+def test_file_intervals_empty():
+    assert FileIntervals([]).find(1) == []
+
+
+def test_function_index_is_built_per_file():
+    function_index = FunctionIndex()
+    assert not function_index.is_built("a.c")
+    assert function_index.find("a.c", 4) == []
+    function_index.build("a.c", iter(INTERVALS))
+    function_index.build("b.c", [(1, 2, 6)])
+    assert function_index.is_built("a.c")
+    assert function_index.find("a.c", 4) == [3, 2, 1]
+    assert function_index.find("b.c", 2) == [6]
+
+    function_index.invalidate("a.c")
+    function_index.invalidate("missing.c")
+    assert not function_index.is_built("a.c")
+    assert function_index.find("a.c", 4) == []
+    assert function_index.find("b.c", 1) == [6]
@@ -0,0 +1,190 @@
+import pytest
+
+from parser.incremental import compute_text_edits, map_range, ranges_intersect, split_lines
+from parser.program_parser import TSAnalyzer
+
+
+def apply_edits(old_text, new_text, edits):
+    """
+    Rebuild the new text from the old text and the new ranges of the edits
+    """
+    pieces = []
+    position = 0
+    for edit in edits:
+        pieces.append(old_text[position:edit.old_start_byte])
+        pieces.append(new_text[edit.new_start_byte:edit.new_end_byte])
+        position = edit.old_end_byte
+    pieces.append(old_text[position:])
+    return b"".join(pieces)
+
+
+def test_split_lines():
+    assert split_lines(b"") == []
+    assert split_lines(b"a") == [b"a"]
+    assert split_lines(b"a\n") == [b"a\n"]
+    assert split_lines(b"a\nb") == [b"a\n", b"b"]
+    assert split_lines(b"a\n\nb\n") == [b"a\n", b"\n", b"b\n"]
+
+
+def test_compute_text_edits_of_same_text():
+    assert compute_text_edits(b"a\nb\n", b"a\nb\n") == []
+
+
+@pytest.mark.parametrize(
+    "old_text, new_text",
+    [
+        (b"", b"a\nb\n"),
+        (b"a\nb\n", b""),
+        (b"a\nb\nc\n", b"a\nx\nc\n"),
+        (b"a\nb\nc\n", b"a\nb\nb2\nc\n"),
+        (b"a\nb\nc\nd\ne\n", b"x\nb\nc\ny\nz\ne\n"),
+        (b"a\nb\nc", b"a\nb\nc2"),
+    ],
+)
+def test_compute_text_edits_rebuild_new_text(old_text, new_text):
+    edits = compute_text_edits(old_text, new_text)
+    assert len(edits) > 0
+    assert apply_edits(old_text, new_text, edits) == new_text
+    for (edit, next_edit) in zip(edits, edits[1:]):
+        assert edit.old_end_byte <= next_edit.old_start_byte
+    for edit in edits:
+        assert edit.old_start_row == old_text[:edit.old_start_byte].count(b"\n")
+        assert edit.line_delta == (
+            new_text.count(b"\n", edit.new_start_byte, edit.new_end_byte)
+            - old_text.count(b"\n", edit.old_start_byte, edit.old_end_byte)
+        )
+    assert sum(edit.byte_delta for edit in edits) == len(new_text) - len(old_text)
+
+
+def test_compute_text_edits_keep_distant_changes_apart():
+    old_text = b"".join(b"line %d\n" % index for index in range(10))
+    new_text = old_text.replace(b"line 1\n", b"line one\n").replace(b"line 8\n", b"")
+    edits = compute_text_edits(old_text, new_text)
+    assert [(edit.old_start_row, edit.line_delta) for edit in edits] == [(1, 0), (8, -1)]
+
+
+def test_map_range():
+    old_text = b"a\nb\nc\nd\n"
+    new_text = b"a\nb\nxx\nyy\nd\n"
+    (edit,) = compute_text_edits(old_text, new_text)
+    # Before the edit
+    assert map_range([edit], 0, 2) == (0, 2)
+    # After the edit, shifted by the growth of the edit
+    assert map_range([edit], 6, 8) == (6 + edit.byte_delta, 8 + edit.byte_delta)
+    # Across the edit, the inner bound is moved outwards
+    assert map_range([edit], 2, 5) == (2, edit.new_end_byte)
+    assert map_range([edit], 5, 8) == (edit.new_start_byte, 8 + edit.byte_delta)
+
+
+def test_ranges_intersect():
+    assert ranges_intersect(0, 5, 4, 10)
+    assert not ranges_intersect(0, 4, 4, 10)
+    assert not ranges_intersect(10, 12, 4, 10)
+    # A deletion intersects a node only if it is strictly inside the node
+    assert ranges_intersect(5, 5, 4, 10)
+    assert not ranges_intersect(4, 4, 4, 10)
+    assert not ranges_intersect(10, 10, 4, 10)
+
+
+OLD_SOURCE = """int helper(int a) {
+    return a + 1;
+}
+
+int changed(int b) {
+    if (b > 0) {
+        return helper(b);
+    }
+    return 0;
+}
+
+int tail(int c) {
+    while (c > 0) {
+        c--;
+    }
+    return c;
+}
+"""
+
+NEW_SOURCE = """int helper(int a, int d) {
+    int e = a + d;
+    return e + 1;
+}
+
+int changed(int b) {
+    if (b > 0) {
+        return helper(b, b);
+    }
+    return 0;
+}
+
+int added(int f) {
+    return tail(f);
+}
+
+int tail(int c) {
+    while (c > 0) {
+        c--;
+    }
+    return c;
+}
+"""
+
+
+def get_facts(analyzer):
+    """
+    Get the facts of the functions keyed by their file paths, names and start lines
+    """
+    def get_key(function_id):
+        function = analyzer.environment[function_id]
+        return (function.file_path, function.function_name, function.start_line_number)
+
+    facts = {}
+    for (function_id, function) in analyzer.environment.items():
+        facts[get_key(function_id)] = (
+            function.end_line_number,
+            function.function_code,
+            sorted(function.paras),
+            sorted(function.if_statements.items()),
+            sorted(function.loop_statements.items()),
+            sorted(get_key(callee_id) for callee_id in analyzer.call_graph.callees(function_id).tolist()),
+            sorted(get_key(caller_id) for caller_id in analyzer.call_graph.callers(function_id).tolist()),
+        )
+    return facts
+
+
+def test_update_file_matches_full_parse():
+    analyzer = TSAnalyzer({"main.c": OLD_SOURCE, "other.c": "int caller() {\n    return added(1);\n}\n"}, "C")
+    kept_function = analyzer.find_function_by_line_number("main.c", 13)[0]
+    analyzer.update_file("main.c", NEW_SOURCE)
+
+    expected = TSAnalyzer({"main.c": NEW_SOURCE, "other.c": "int caller() {\n    return added(1);\n}\n"}, "C")
+    assert get_facts(analyzer) == get_facts(expected)
+    # The function outside the changed regions is kept and shifted
+    assert analyzer.environment[kept_function.function_id] is kept_function
+    assert kept_function.function_name == "tail"
+    assert kept_function.start_line_number == 17
+    # The call from the other file is linked to the added function
+    (added_function,) = analyzer.find_function_by_line_number("main.c", 14)
+    assert added_function.function_name == "added"
+    assert [
+        analyzer.environment[caller_id].function_name
+        for caller_id in analyzer.call_graph.callers(added_function.function_id).tolist()
+    ] == ["caller"]
+
+
+def test_update_file_without_change():
+    analyzer = TSAnalyzer({"main.c": OLD_SOURCE}, "C")
+    facts = get_facts(analyzer)
+    analyzer.update_file("main.c", OLD_SOURCE)
+    assert get_facts(analyzer) == facts
+
+
+def test_update_file_of_new_file():
+    analyzer = TSAnalyzer({"main.c": OLD_SOURCE}, "C")
+    analyzer.update_file("new.c", "int new_function() {\n    return helper(0);\n}\n")
+    (new_function,) = analyzer.find_function_by_line_number("new.c", 2)
+    assert new_function.function_name == "new_function"
+    assert [
+        analyzer.environment[callee_id].function_name
+        for callee_id in analyzer.call_graph.callees(new_function.function_id).tolist()
+    ] == ["helper"]
@@ -0,0 +1,177 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from model import inference_engine
+from model.inference_engine import (
+    BUDGET_EXCEEDED_ERROR,
+    InferenceEngine,
+    KeyPool,
+    TokenBucket,
+    estimate_token_count,
+    get_retry_after,
+    get_retry_delay,
+    is_overload_error,
+    is_retryable_error,
+)
+from model.token_accounting import TokenLedger
+
+
+class StatusError(Exception):
+    """
+    An error of a provider SDK with a status code and the headers of its response
+    """
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers if headers is not None else {})
+
+
+class APITimeoutError(Exception):
+    """
+    An error matched by the name of the timeout error of the OpenAI SDK
+    """
+
+
+def test_retryable_and_overload_errors():
+    assert is_retryable_error(StatusError(429)) and is_overload_error(StatusError(429))
+    assert is_retryable_error(StatusError(503)) and not is_overload_error(StatusError(503))
+    assert not is_retryable_error(StatusError(400)) and not is_overload_error(StatusError(401))
+    assert is_retryable_error(asyncio.TimeoutError()) and is_overload_error(asyncio.TimeoutError())
+    assert is_retryable_error(APITimeoutError()) and is_overload_error(APITimeoutError())
+    assert is_retryable_error(ConnectionResetError())
+    assert not is_retryable_error(ValueError())
+
+
+def test_get_retry_after():
+    assert get_retry_after(StatusError(429, {"retry-after": "2"})) == 2.0
+    assert get_retry_after(StatusError(429, {"retry-after-ms": "1500", "retry-after": "2"})) == 1.5
+    assert get_retry_after(StatusError(429, {"retry-after": "soon"})) is None
+    assert get_retry_after(StatusError(429)) is None
+    assert get_retry_after(ValueError()) is None
+
+
+def test_get_retry_delay_is_bounded():
+    for attempt in range(1, 10):
+        for _ in range(20):
+            assert 0 <= get_retry_delay(attempt, 1, 8) <= min(8, 2 ** (attempt - 1))
+
+
+def test_estimate_token_count():
+    assert estimate_token_count("") == 0
+    assert estimate_token_count("abcd") == 1
+    assert estimate_token_count("abcde") == 2
+
+
+def test_token_bucket_waits_for_refill():
+    async def run():
+        token_bucket = TokenBucket(6000)
+        await token_bucket.acquire(6000)
+        start_time = time.monotonic()
+        # 10 tokens are refilled in 0.1 seconds
+        await token_bucket.acquire(10)
+        return time.monotonic() - start_time
+
+    assert 0.05 <= asyncio.run(run()) < 1
+
+
+def test_token_bucket_settle():
+    token_bucket = TokenBucket(60)
+    token_bucket.tokens = 0.0
+    # The unused reservation is returned
+    token_bucket.settle(30, 10)
+    assert 20 <= token_bucket.tokens < 21
+    # The tokens used beyond the reservation are charged, which may go into debt
+    token_bucket.settle(10, 60)
+    assert -31 <= token_bucket.tokens < -29
+    # A reservation is capped by the capacity, and the bucket never exceeds its capacity
+    token_bucket.settle(1000, 0)
+    assert 29 <= token_bucket.tokens < 31
+    token_bucket.settle(60, 0)
+    assert token_bucket.tokens == 60
+
+
+def test_key_pool_round_robin_skips_busy_keys():
+    async def run():
+        key_pool = KeyPool(["a", "b", "c"], 1, 100000)
+        first = await key_pool.acquire(1)
+        second = await key_pool.acquire(1)
+        key_pool.release(first)
+        third = await key_pool.acquire(1)
+        # The key "a" is free again, but the key "c" is next
+        fourth = await key_pool.acquire(1)
+        return [slot.key for slot in [first, second, third, fourth]]
+
+    assert asyncio.run(run()) == ["a", "b", "c", "a"]
+
+
+def test_key_pool_needs_a_key():
+    with pytest.raises(ValueError):
+        KeyPool([], 1, 100)
+
+
+def test_infer_batch(mock_llm_server):
+    engine = InferenceEngine(
+        "gpt-4o-mini", ["sk-first-key", "sk-second-key"], 0.0, "system", 2, base_url=mock_llm_server.get_base_url()
+    )
+    messages = [f"prompt number {index}" for index in range(10)]
+    results = engine.infer_batch(messages)
+    assert [result.request_id for result in results] == list(range(10))
+    assert [result.output for result in results] == messages
+    assert all(result.error is None for result in results)
+    assert set(result.key_index for result in results) == {0, 1}
+    assert [result.output_token_count for result in results] == [3] * 10
+    assert mock_llm_server.stats["request_count"] == 10
+
+
+def test_infer_batch_retries_rate_limited_requests(mock_llm_server, monkeypatch):
+    monkeypatch.setattr(inference_engine, "get_retry_delay", lambda attempt: 0)
+    mock_llm_server.config.rate_limit_rate = 1.0
+    mock_llm_server.config.retry_after = 0.3
+    engine = InferenceEngine(
+        "gpt-4o-mini", ["key"], 0.0, "system", max_attempts=2, base_url=mock_llm_server.get_base_url()
+    )
+    start_time = time.monotonic()
+    (result,) = engine.infer_batch(["prompt"])
+    assert result.output == "" and "429" in result.error
+    assert mock_llm_server.stats["request_count"] == 2
+    # The retry waits for the Retry-After hint of the server
+    assert time.monotonic() - start_time >= 0.3
+
+
+def test_infer_batch_closes_the_clients(mock_llm_server, monkeypatch):
+    key_pools = []
+
+    class RecordingKeyPool(KeyPool):
+        def __init__(self, *args):
+            super().__init__(*args)
+            key_pools.append(self)
+
+    monkeypatch.setattr(inference_engine, "KeyPool", RecordingKeyPool)
+    engine = InferenceEngine(
+        "gpt-4o-mini", ["sk-first-key", "sk-second-key"], 0.0, "system", 1, base_url=mock_llm_server.get_base_url()
+    )
+    for _ in range(2):
+        assert [result.output for result in engine.infer_batch(["first", "second"])] == ["first", "second"]
+    assert len(key_pools) == 2
+    assert all(slot.client is None for key_pool in key_pools for slot in key_pool.slots)
+
+
+def test_infer_batch_stops_at_budget(mock_llm_server):
+    token_ledger = TokenLedger(max_tokens=1)
+    engine = InferenceEngine(
+        "gpt-4o-mini",
+        ["sk-ledger-key"],
+        0.0,
+        "system",
+        1,
+        base_url=mock_llm_server.get_base_url(),
+        token_ledger=token_ledger,
+    )
+    results = engine.infer_batch(["first prompt", "second prompt", "third prompt"])
+    assert [result.error for result in results] == [None, BUDGET_EXCEEDED_ERROR, BUDGET_EXCEEDED_ERROR]
+    (row,) = token_ledger.get_rows()
+    assert (row["key"], row["request_count"], row["output_token_count"]) == ("...-key", 1, 2)
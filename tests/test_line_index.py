@@ -0,0 +1,41 @@
+import pytest
+
+from parser.line_index import LineIndex
+
+
+SOURCES = [
+    b"",
+    b"int x;",
+    b"\n",
+    b"a\nb\nc",
+    b"a\nb\nc\n",
+    b"\n\nint main() {\n  return 0;\n}\n\n",
+]
+
+
+def test_find_newline_offsets():
+    assert LineIndex.find_newline_offsets(b"") == []
+    assert LineIndex.find_newline_offsets(b"abc") == []
+    assert LineIndex.find_newline_offsets(b"a\nb\n\nc") == [1, 3, 4]
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_line_number_matches_newline_count(source):
+    line_index = LineIndex(source)
+    for offset in range(len(source) + 1):
+        assert line_index.line_number(offset) == source[:offset].count(b"\n") + 1
+
+
+def test_line_number_of_newline_is_its_own_line():
+    line_index = LineIndex(b"ab\ncd\n")
+    assert line_index.line_number(2) == 1
+    assert line_index.line_number(3) == 2
+    assert line_index.line_number(5) == 2
+    assert line_index.line_number(6) == 3
+
+
+def test_line_index_of_bytearray_source():
+    source = b"x\ny\nz"
+    line_index = LineIndex(bytearray(source))
+    assert line_index.newline_offsets == [1, 3]
+    assert line_index.line_number(4) == 3
@@ -0,0 +1,109 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+from model import llm, utils
+from model.llm import LLM
+
+
+class StatusError(Exception):
+    """
+    An error of a provider SDK with a status code and the headers of its response
+    """
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers if headers is not None else {})
+
+
+class FailingSend:
+    """
+    A request failing with the given errors before it returns the output
+    """
+
+    def __init__(self, errors, output="output"):
+        self.errors = list(errors)
+        self.output = output
+        self.call_count = 0
+
+    def __call__(self):
+        self.call_count += 1
+        if len(self.errors) > 0:
+            raise self.errors.pop(0)
+        return self.output
+
+
+def record_sleeps(monkeypatch):
+    """
+    Replace the backoff of the retries, whose delays are recorded instead of slept
+    """
+    sleeps = []
+    monkeypatch.setattr(llm, "get_retry_delay", lambda attempt: 0.1 * 2 ** (attempt - 1))
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_send_with_retry_backs_off_on_retryable_errors(monkeypatch):
+    sleeps = record_sleeps(monkeypatch)
+    send = FailingSend([StatusError(429), StatusError(503), TimeoutError()])
+    assert LLM("gpt-4o-mini", "key", 0.0, max_attempts=5).send_with_retry(send) == "output"
+    assert send.call_count == 4
+    assert sleeps == [0.1, 0.2, 0.4]
+
+
+def test_send_with_retry_honors_retry_after(monkeypatch):
+    sleeps = record_sleeps(monkeypatch)
+    send = FailingSend([StatusError(429, {"retry-after": "3"}), StatusError(429, {"retry-after-ms": "50"})])
+    assert LLM("gpt-4o-mini", "key", 0.0, max_attempts=5).send_with_retry(send) == "output"
+    # The hint of the provider is honored unless the backoff is longer
+    assert sleeps == [3.0, 0.2]
+
+
+def test_send_with_retry_does_not_retry_invalid_requests(monkeypatch):
+    sleeps = record_sleeps(monkeypatch)
+    send = FailingSend([StatusError(400)])
+    assert LLM("gpt-4o-mini", "key", 0.0, max_attempts=5).send_with_retry(send) == ""
+    assert send.call_count == 1
+    assert sleeps == []
+
+
+def test_send_with_retry_gives_up_after_max_attempts(monkeypatch):
+    sleeps = record_sleeps(monkeypatch)
+    send = FailingSend([StatusError(500)] * 5)
+    assert LLM("gpt-4o-mini", "key", 0.0, max_attempts=3).send_with_retry(send) == ""
+    assert send.call_count == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_openai_client_is_created_once_per_key(mock_llm_server, monkeypatch):
+    monkeypatch.setattr(utils, "standard_keys", ["sk-only-key"])
+    created_clients = []
+
+    class SlowOpenAI(openai.OpenAI):
+        """
+        A client which is slow to create, so that the threads racing to create it overlap
+        """
+
+        def __init__(self, **kwargs):
+            time.sleep(0.05)
+            super().__init__(**kwargs)
+            created_clients.append(self)
+
+    monkeypatch.setattr(openai, "OpenAI", SlowOpenAI)
+    model = LLM("gpt-4o-mini", "sk-only-key", 0.0, base_url=mock_llm_server.get_base_url())
+    outputs = [None] * 8
+
+    def infer(index):
+        outputs[index] = model.infer_with_openai_model(f"prompt number {index}")
+
+    threads = [threading.Thread(target=infer, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outputs == [f"prompt number {index}" for index in range(8)]
+    assert len(created_clients) == 1
+    assert model.openai_clients == {"sk-only-key": created_clients[0]}
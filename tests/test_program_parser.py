@@ -0,0 +1,180 @@
+from parser.program_parser import TSAnalyzer
+
+
+# The comments and the strings before the function and the statements hold multi-byte UTF-8 characters,
+# so the byte offsets of tree-sitter differ from the character offsets
+NON_ASCII_SOURCE = """// héllo wörld, 你好
+const char *greeting = "grüße";
+
+int count(const char *name) {
+    /* ünïcödé */
+    if (name[0] == 'é' || strlen("日本語") > 0) {
+        return 1;
+    }
+    for (int i = 0; name[i] != 'ß' && i < 10; i++) {
+        printf("ß %d", i);
+    }
+    return 0;
+}
+"""
+
+
+def test_facts_of_non_ascii_source():
+    analyzer = TSAnalyzer({"main.c": NON_ASCII_SOURCE}, "C")
+    (function,) = analyzer.environment.values()
+    assert function.function_name == "count"
+    assert (function.start_line_number, function.end_line_number) == (4, 13)
+    assert function.function_code == NON_ASCII_SOURCE[NON_ASCII_SOURCE.index("int count"):].rstrip("\n")
+    assert [para[0] for para in function.paras] == ["name"]
+
+    ((if_range, if_statement),) = function.if_statements.items()
+    assert if_range == (6, 8)
+    assert if_statement[2] == "(name[0] == 'é' || strlen(\"日本語\") > 0)"
+    ((loop_range, loop_statement),) = function.loop_statements.items()
+    assert loop_range == (9, 11)
+    assert loop_statement[2] == "int i = 0; name[i] != 'ß' && i < 10; i++"
+
+
+def test_facts_of_source_bytes_with_invalid_utf8():
+    source = "int f(int a) {\n    if (a > 0) {\n        return a;\n    }\n    return 0;\n}\n"
+    analyzer = TSAnalyzer({"latin1.c": b"/* caf\xe9 */\n" + source.encode()}, "C")
+    (function,) = analyzer.environment.values()
+    assert function.function_code == source.rstrip("\n")
+    assert list(function.if_statements) == [(3, 5)]
+
+
+def get_facts(analyzer):
+    """
+    Get the facts of the functions keyed by their file paths, names and start lines, which do not depend on their ids
+    """
+    def get_key(function_id):
+        function = analyzer.environment[function_id]
+        return (function.file_path, function.function_name, function.start_line_number)
+
+    facts = {}
+    for (function_id, function) in analyzer.environment.items():
+        facts[get_key(function_id)] = (
+            function.end_line_number,
+            function.function_code,
+            sorted(function.paras),
+            sorted(function.if_statements.items()),
+            sorted(function.loop_statements.items()),
+            sorted(get_key(callee_id) for callee_id in analyzer.call_graph.callees(function_id).tolist()),
+            sorted(get_key(caller_id) for caller_id in analyzer.call_graph.callers(function_id).tolist()),
+        )
+    return facts
+
+
+def get_project(file_count):
+    """
+    Get a project whose functions call the functions of the neighboring files and themselves
+    """
+    project = {}
+    for index in range(file_count):
+        callee_index = (index + 1) % file_count
+        project[f"dir_{index % 3}/file_{index}.c"] = (
+            f"int leaf_{index}(int a) {{\n"
+            f"    while (a > 0) {{\n"
+            f"        a--;\n"
+            f"    }}\n"
+            f"    return a;\n"
+            f"}}\n\n"
+            f"int node_{index}(int a, int b) {{\n"
+            f"    if (a > b) {{\n"
+            f"        return leaf_{callee_index}(a) + node_{index}(a - 1, b);\n"
+            f"    }} else {{\n"
+            f"        return leaf_{index}(b);\n"
+            f"    }}\n"
+            f"}}\n"
+        )
+    return project
+
+
+def test_parallel_parse_matches_serial_parse():
+    project = get_project(12)
+    serial_facts = get_facts(TSAnalyzer(project, "C", jobs=1))
+    assert len(serial_facts) == 24
+    assert serial_facts[("dir_0/file_0.c", "node_0", 8)][5] == [
+        ("dir_0/file_0.c", "leaf_0", 1), ("dir_0/file_0.c", "node_0", 8), ("dir_1/file_1.c", "leaf_1", 1)
+    ]
+    assert get_facts(TSAnalyzer(project, "C", jobs=3)) == serial_facts
+    # The files are streamed into the workers as well, as SourceScanner.scan yields their bytes
+    source_stream = ((file_path, source.encode()) for (file_path, source) in project.items())
+    assert get_facts(TSAnalyzer(source_stream, "C", jobs=2)) == serial_facts
+
+
+TWO_FUNCTION_SOURCE = """int first(int a) {
+    int b = a + 1;
+    return b;
+}
+
+int second(int c) {
+    int d = c * 2;
+    return d;
+}
+"""
+
+
+def get_node_texts(code_node_list):
+    return [(function_code.split("(")[0], node.type, node.text.decode()) for (function_code, node) in code_node_list]
+
+
+def test_find_node_by_line_number_in_two_functions():
+    analyzer = TSAnalyzer({"main.c": TWO_FUNCTION_SOURCE}, "C")
+    assert get_node_texts(analyzer.find_node_by_line_number("main.c", 2)) == [
+        ("int first", "declaration", "int b = a + 1;"),
+        ("int first", "primitive_type", "int"),
+        ("int first", "init_declarator", "b = a + 1"),
+        ("int first", "identifier", "b"),
+        ("int first", "=", "="),
+        ("int first", "binary_expression", "a + 1"),
+        ("int first", "identifier", "a"),
+        ("int first", "+", "+"),
+        ("int first", "number_literal", "1"),
+        ("int first", ";", ";"),
+    ]
+    assert get_node_texts(analyzer.find_node_by_line_number("main.c", 8)) == [
+        ("int second", "return_statement", "return d;"),
+        ("int second", "return", "return"),
+        ("int second", "identifier", "d"),
+        ("int second", ";", ";"),
+    ]
+    # The lines outside the functions and outside the file have no nodes
+    assert analyzer.find_node_by_line_number("main.c", 5) == []
+    assert analyzer.find_node_by_line_number("main.c", 100) == []
+
+
+def test_line_node_index_maps_the_lines_of_the_function():
+    analyzer = TSAnalyzer({"main.c": TWO_FUNCTION_SOURCE}, "C")
+    (first, second) = sorted(analyzer.environment.values(), key=lambda function: function.start_line_number)
+    line_nodes = analyzer.get_line_node_index(second)
+    # Only the nodes starting and ending on the same line are indexed, so the function body spanning lines 6-9 is not
+    assert sorted(line_nodes) == [6, 7, 8, 9]
+    assert [node.type for node in line_nodes[9]] == ["}"]
+    assert all(node.start_point[0] + 1 == line_number for line_number in line_nodes for node in line_nodes[line_number])
+    assert analyzer.get_line_node_index(first).keys() == {1, 2, 3, 4}
+
+
+def test_line_node_index_evicts_the_least_recently_used_function():
+    analyzer = TSAnalyzer({"main.c": TWO_FUNCTION_SOURCE}, "C", max_line_node_index_count=1)
+    (first, second) = sorted(analyzer.environment.values(), key=lambda function: function.start_line_number)
+    first_line_nodes = analyzer.get_line_node_index(first)
+    assert analyzer.get_line_node_index(first) is first_line_nodes
+    assert list(analyzer.lineNodeIndexDic) == [first.function_id]
+
+    analyzer.find_node_by_line_number("main.c", 7)
+    assert list(analyzer.lineNodeIndexDic) == [second.function_id]
+    # The evicted index is rebuilt on demand
+    rebuilt_line_nodes = analyzer.get_line_node_index(first)
+    assert rebuilt_line_nodes is not first_line_nodes
+    assert rebuilt_line_nodes.keys() == first_line_nodes.keys()
+    assert list(analyzer.lineNodeIndexDic) == [first.function_id]
+
+
+def test_extract_meta_data_of_functions_then_resolve_call_sites_once():
+    analyzer = TSAnalyzer(get_project(3), "C")
+    facts = get_facts(analyzer)
+    for function in analyzer.environment.values():
+        analyzer.extract_meta_data_in_single_function(function)
+    analyzer.resolve_call_sites()
+    assert get_facts(analyzer) == facts
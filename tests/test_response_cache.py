@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+
+from model.llm import LLM, ResponseCache
+from model.token_accounting import TokenCounter
+
+
+class WhitespaceEncoding:
+    """
+    An encoding counting the words as tokens, which replaces the tokenizer of tiktoken without a download
+    """
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+REQUEST = ("openai", "gpt-4o-mini", 0.0, "system role", "prompt")
+
+
+def test_key_depends_on_all_fields():
+    key = ResponseCache.get_key(*REQUEST)
+    assert key == ResponseCache.get_key(*REQUEST)
+    for index in range(len(REQUEST)):
+        changed_request = list(REQUEST)
+        changed_request[index] = 0.5 if index == 2 else changed_request[index] + "x"
+        assert ResponseCache.get_key(*changed_request) != key
+
+
+def test_load_and_store(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    assert response_cache.load(*REQUEST) is None
+    response_cache.store(*REQUEST, "output", 10, 2)
+    assert response_cache.load(*REQUEST) == ("output", 10, 2)
+    response_cache.store("openai", "gpt-4o-mini", 0.0, "system role", "other prompt", "other output")
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "system role", "other prompt") == ("other output", None, None)
+    assert (response_cache.hit_count, response_cache.miss_count) == (2, 1)
+
+
+def test_expired_entry_is_dropped(tmp_path):
+    response_cache = ResponseCache(str(tmp_path), ttl=60)
+    response_cache.store(*REQUEST, "output")
+    assert response_cache.load(*REQUEST) is not None
+    # Expire the entry without waiting
+    response_cache.ttl = -1
+    assert response_cache.load(*REQUEST) is None
+    assert not os.path.exists(response_cache.get_entry_path(ResponseCache.get_key(*REQUEST)))
+
+    response_cache = ResponseCache(str(tmp_path), ttl=None)
+    response_cache.store(*REQUEST, "output")
+    assert response_cache.load(*REQUEST) is not None
+
+
+def test_corrupted_entry_is_dropped(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    response_cache.store(*REQUEST, "output")
+    entry_path = response_cache.get_entry_path(ResponseCache.get_key(*REQUEST))
+    with open(entry_path, "w") as entry_file:
+        entry_file.write("{")
+    assert response_cache.load(*REQUEST) is None
+    assert not os.path.exists(entry_path)
+
+
+def test_read_only_mode(tmp_path):
+    ResponseCache(str(tmp_path)).store(*REQUEST, "output")
+    response_cache = ResponseCache(str(tmp_path), mode="read-only")
+    assert response_cache.load(*REQUEST) == ("output", None, None)
+    response_cache.store("openai", "gpt-4o-mini", 0.0, "system role", "other prompt", "other output")
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "system role", "other prompt") is None
+    # An expired entry is not removed from a read-only cache
+    response_cache.ttl = -1
+    assert response_cache.load(*REQUEST) is None
+    assert os.path.exists(response_cache.get_entry_path(ResponseCache.get_key(*REQUEST)))
+
+
+def test_bypass_mode(tmp_path):
+    ResponseCache(str(tmp_path / "cache")).store(*REQUEST, "output")
+    response_cache = ResponseCache(str(tmp_path / "cache"), mode="bypass")
+    assert response_cache.load(*REQUEST) is None
+    assert response_cache.miss_count == 0
+    # A bypassed cache never creates its directory
+    ResponseCache(str(tmp_path / "missing"), mode="bypass").store(*REQUEST, "output")
+    assert not os.path.exists(tmp_path / "missing")
+
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path), mode="write-only")
+
+
+def test_evict_least_recently_used(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    prompts = ["first", "second", "third"]
+    now = time.time()
+    entry_sizes = {}
+    for (index, prompt) in enumerate(prompts):
+        response_cache.store("openai", "gpt-4o-mini", 0.0, "", prompt, "output")
+        entry_path = response_cache.get_entry_path(ResponseCache.get_key("openai", "gpt-4o-mini", 0.0, "", prompt))
+        os.utime(entry_path, (now - 100 + index, now - 100 + index))
+        entry_sizes[prompt] = os.path.getsize(entry_path)
+
+    # Loading an entry makes it the most recently used one
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "", "first") is not None
+    response_cache.max_size = entry_sizes["first"] + entry_sizes["third"]
+    response_cache.evict()
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "", "second") is None
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "", "first") is not None
+    assert response_cache.load("openai", "gpt-4o-mini", 0.0, "", "third") is not None
+
+
+def test_llm_infers_cached_responses(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    llm = LLM("gpt-4o-mini", "key", 0.0, response_cache=response_cache)
+    llm.token_counter = TokenCounter(lambda: WhitespaceEncoding())
+    llm.store_response("first prompt", "yes it is", None, None)
+    llm.store_response("second prompt", "no", 3, 1)
+    llm.store_response("failed prompt", "", None, None)
+
+    assert llm.infer("first prompt") == ("yes it is", 0, 0)
+    # The costs not measured when the response was stored are measured on demand
+    input_token_cost = llm.token_counter.count_prompt(llm.systemRole, "first prompt")
+    assert llm.infer("first prompt", is_measure_cost=True) == ("yes it is", input_token_cost, 3)
+    assert llm.load_cached_responses(["second prompt", "failed prompt"], True) == [("no", 3, 1), None]
+
+
+def test_responses_of_other_servers_are_cached_apart(tmp_path):
+    response_cache = ResponseCache(str(tmp_path))
+    LLM("gpt-4o-mini", "key", 0.0, response_cache=response_cache).store_response("prompt", "output", None, None)
+    llm = LLM("gpt-4o-mini", "key", 0.0, response_cache=response_cache, base_url="http://127.0.0.1:8000/v1")
+    assert llm.load_cached_response("prompt", False) is None
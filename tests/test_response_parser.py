@@ -0,0 +1,92 @@
+import functools
+import time
+
+import pytest
+
+from model import utils
+from model.llm import LLM, ResponseCache
+from parser.response_parser import parse_bug_report, parse_verdict, stop_at_verdict
+
+
+@pytest.mark.parametrize(
+    "response, verdict",
+    [
+        ("Answer: the pointer is checked before use.\nNo.", False),
+        ("Answer: the value may be null.\nYes.", True),
+        ("Answer: the value may be null.\n**Yes**\n", True),
+        ("Answer: No.", False),
+        ("yes", True),
+        ("Answer: yes, the pointer is null on this path, so it is a bug.", None),
+        ("Answer: there is no check on this path.\nIt depends.", None),
+        ("", None),
+    ],
+)
+def test_parse_verdict(response, verdict):
+    assert parse_verdict(response) is verdict
+
+
+def test_parse_verdict_of_incomplete_response():
+    # The last line may still grow, e.g., "No" into "Nothing"
+    assert parse_verdict("Answer: explanation.\nNo", is_complete=False) is None
+    assert parse_verdict("Answer: explanation.\nNo\n", is_complete=False) is False
+
+
+def test_stop_at_verdict():
+    assert not stop_at_verdict("Answer: the value")
+    assert not stop_at_verdict("Answer: the value may be null.\nYe")
+    assert not stop_at_verdict("Answer: the value may be null.\nYes.")
+    assert stop_at_verdict("Answer: the value may be null.\nYes.\n")
+    assert stop_at_verdict("Answer: the value may be null.\nYes.\nBecause")
+
+
+def test_parse_bug_report():
+    assert parse_bug_report("Yes.") == (True, False)
+    assert parse_bug_report("No.") == (False, False)
+    assert parse_bug_report("Maybe.") == (False, True)
+
+
+def local_stop_condition(response):
+    return False
+
+
+def test_get_cache_variant():
+    assert LLM.get_cache_variant(None, None) == ""
+    assert LLM.get_cache_variant(stop_at_verdict, None) == (
+        "stop=parser.response_parser.stop_at_verdict;max_output_tokens=None"
+    )
+    assert LLM.get_cache_variant(None, 16) == "stop=;max_output_tokens=16"
+    # The anonymous stop conditions bypass the cache, since they cannot be told apart
+    assert LLM.get_cache_variant(lambda response: True, None) is None
+    assert LLM.get_cache_variant(functools.partial(parse_verdict, is_complete=False), None) is None
+
+    def nested_stop_condition(response):
+        return False
+
+    assert LLM.get_cache_variant(nested_stop_condition, None) is None
+    assert LLM.get_cache_variant(local_stop_condition, 8).startswith("stop=")
+
+
+STREAMED_RESPONSE = "Answer: the pointer may be null on this path.\nYes.\n" + "The rest is never needed. " * 50
+
+
+def test_streamed_response_stops_at_verdict(mock_llm_server, monkeypatch, tmp_path):
+    monkeypatch.setattr(utils, "standard_keys", ["sk-stream-test-key"])
+    mock_llm_server.config.response_mode = "canned"
+    mock_llm_server.config.canned_responses = [STREAMED_RESPONSE]
+    mock_llm_server.config.token_latency = 0.005
+    response_cache = ResponseCache(str(tmp_path))
+    llm = LLM("gpt-4o-mini", "", 0.0, response_cache=response_cache, base_url=mock_llm_server.get_base_url())
+
+    (output, _, _) = llm.infer("prompt", stop_condition=stop_at_verdict)
+    assert parse_verdict(output) is True
+    assert "rest" not in output
+    # The generation is cancelled on the server once the connection is closed
+    deadline = time.monotonic() + 5
+    while mock_llm_server.stats["cancelled_count"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert mock_llm_server.stats["cancelled_count"] == 1
+
+    # The truncated response is cached apart from the whole response
+    assert llm.infer("prompt", stop_condition=stop_at_verdict) == (output, 0, 0)
+    assert mock_llm_server.stats["request_count"] == 1
+    assert llm.load_cached_response("prompt", False) is None
@@ -0,0 +1,118 @@
+import gzip
+import importlib.util
+import json
+import os
+
+import pytest
+
+from pipeline.result_writer import (
+    MANIFEST_FILE_NAME,
+    JsonlResultReader,
+    JsonlResultWriter,
+    get_codec,
+    get_shard_file_name,
+)
+
+
+def get_records():
+    """
+    Get the (file_path, function_id, function_name, record) tuples of three files
+    """
+    records = []
+    function_id = 0
+    for file_index in range(3):
+        file_path = f"src/file_{file_index}.c"
+        for function_index in range(4):
+            function_name = f"function_{file_index}_{function_index}"
+            record = {"function_name": function_name, "file_path": file_path, "paras": [["x", 1, 0]], "ifs": {}}
+            records.append((file_path, function_id, function_name, record))
+            function_id += 1
+    return records
+
+
+def write_records(output_dir, compression, shard_count, records):
+    with JsonlResultWriter(str(output_dir), compression, shard_count, {"language": "C"}) as writer:
+        for (file_path, function_id, function_name, record) in records:
+            writer.write(file_path, function_id, function_name, record)
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip", "zstd"])
+@pytest.mark.parametrize("shard_count", [1, 4])
+def test_round_trip(tmp_path, compression, shard_count):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    records = get_records()
+    write_records(tmp_path, compression, shard_count, records)
+
+    reader = JsonlResultReader(str(tmp_path))
+    assert reader.manifest["language"] == "C"
+    assert reader.manifest["compression"] == compression
+    assert reader.manifest["function_count"] == len(records)
+    assert reader.manifest["file_count"] == 3
+    assert len(reader.manifest["shards"]) == shard_count
+    assert sum(shard["function_count"] for shard in reader.manifest["shards"]) == len(records)
+
+    for (_, function_id, _, record) in records:
+        assert reader.get_function(function_id) == record
+    assert reader.get_function(len(records)) is None
+    assert reader.get_functions_in_file("src/file_1.c") == [
+        record for (file_path, _, _, record) in records if file_path == "src/file_1.c"
+    ]
+    assert reader.get_functions_in_file("missing.c") == []
+    assert sorted(reader.iter_functions(), key=lambda record: record["function_name"]) == [record for (_, _, _, record) in records]
+
+
+def test_shards_are_valid_jsonl(tmp_path):
+    records = get_records()
+    write_records(tmp_path, "gzip", 2, records)
+    lines = []
+    for shard in range(2):
+        with open(os.path.join(tmp_path, get_shard_file_name(shard, "gzip")), "rb") as shard_file:
+            lines.extend(gzip.decompress(shard_file.read()).splitlines())
+    assert sorted(json.loads(line)["function_name"] for line in lines) == sorted(record[2] for record in records)
+
+
+def test_functions_of_a_file_are_in_one_shard(tmp_path):
+    write_records(tmp_path, "none", 4, get_records())
+    reader = JsonlResultReader(str(tmp_path))
+    for function_ids in reader.file_function_ids.values():
+        assert len(set(reader.index_entries[function_id]["shard"] for function_id in function_ids)) == 1
+
+
+def test_writer_removes_previous_output(tmp_path):
+    write_records(tmp_path, "none", 4, get_records())
+    write_records(tmp_path, "gzip", 1, get_records()[:2])
+    shard_files = sorted(file_name for file_name in os.listdir(tmp_path) if file_name.startswith("shard-"))
+    assert shard_files == [get_shard_file_name(0, "gzip")]
+    assert JsonlResultReader(str(tmp_path)).manifest["function_count"] == 2
+
+
+def test_output_is_deterministic(tmp_path):
+    write_records(tmp_path / "first", "gzip", 2, get_records())
+    write_records(tmp_path / "second", "gzip", 2, get_records())
+    for file_name in sorted(os.listdir(tmp_path / "first")):
+        with open(tmp_path / "first" / file_name, "rb") as first_file:
+            with open(tmp_path / "second" / file_name, "rb") as second_file:
+                assert first_file.read() == second_file.read()
+
+
+def test_manifest_is_written_on_close(tmp_path):
+    writer = JsonlResultWriter(str(tmp_path))
+    writer.write("a.c", 0, "main", {})
+    assert not os.path.exists(os.path.join(tmp_path, MANIFEST_FILE_NAME))
+    writer.close()
+    assert os.path.exists(os.path.join(tmp_path, MANIFEST_FILE_NAME))
+
+
+def test_get_codec():
+    (compress, decompress) = get_codec("gzip")
+    assert decompress(compress(b"data")) == b"data"
+    with pytest.raises(ValueError):
+        get_codec("lz4")
+
+
+def test_zstd_requires_zstandard():
+    if importlib.util.find_spec("zstandard") is not None:
+        pytest.skip("zstandard is installed")
+    with pytest.raises(ImportError, match="zstandard"):
+        get_codec("zstd")
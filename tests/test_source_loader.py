@@ -0,0 +1,87 @@
+import mmap
+import os
+
+import pytest
+
+from parser import source_loader
+from parser.source_loader import SourceLoader, decode_source, encode_source, get_default_max_mapped_file_count
+
+
+def write_files(directory, contents):
+    file_paths = []
+    for (index, content) in enumerate(contents):
+        file_path = os.path.join(directory, f"file_{index}.c")
+        with open(file_path, "wb") as source_file:
+            source_file.write(content)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def test_encode_and_decode_source():
+    assert encode_source("int x;") == b"int x;"
+    source = b"int x;"
+    assert encode_source(source) is source
+    assert decode_source(b"caf\xe9") == "caf�"
+
+
+def test_load_skips_binary_oversized_and_missing_files(tmp_path):
+    file_paths = write_files(str(tmp_path), [b"int x;\n", b"\x7fELF\0\0", b"x" * 100, b""])
+    source_loader = SourceLoader(max_file_size=50)
+    assert source_loader.load(file_paths[0]) == b"int x;\n"
+    assert source_loader.load(file_paths[1]) is None
+    assert source_loader.load(file_paths[2]) is None
+    assert source_loader.load(file_paths[3]) == b""
+    assert source_loader.load(str(tmp_path / "missing.c")) is None
+    assert [reason for (_, reason) in source_loader.skipped_files[:2]] == ["binary", "oversized"]
+    assert len(source_loader.skipped_files) == 3
+    assert (source_loader.loaded_file_count, source_loader.loaded_byte_count) == (2, 7)
+
+
+def test_iter_sources_keeps_the_order_within_the_budget(tmp_path):
+    contents = [b"int f%d;\n" % index * (index + 1) for index in range(20)]
+    file_paths = write_files(str(tmp_path), contents)
+    # The budget is smaller than most of the files, which are still loaded one by one
+    source_loader = SourceLoader(memory_budget=16)
+    assert list(source_loader.iter_sources(file_paths)) == list(zip(file_paths, contents))
+
+
+def test_iter_sources_stops_early(tmp_path):
+    file_paths = write_files(str(tmp_path), [b"int x;\n"] * 10)
+    sources = SourceLoader(memory_budget=8).iter_sources(file_paths)
+    assert next(sources)[0] == file_paths[0]
+    sources.close()
+
+
+def test_iter_sources_raises_reader_errors(tmp_path, monkeypatch):
+    file_paths = write_files(str(tmp_path), [b"int x;\n"] * 3)
+    source_loader = SourceLoader()
+
+    def load(file_path):
+        if file_path == file_paths[1]:
+            raise OSError(24, "Too many open files")
+        return b"int x;\n"
+
+    monkeypatch.setattr(source_loader, "load", load)
+    sources = source_loader.iter_sources(file_paths)
+    assert next(sources)[0] == file_paths[0]
+    with pytest.raises(OSError):
+        list(sources)
+
+
+def test_mapped_files_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(source_loader, "IS_MMAP_FD_TRACKED", True)
+    file_paths = write_files(str(tmp_path), [b"int x;\n"] * 5)
+    loader = SourceLoader(use_mmap=True, max_mapped_file_count=2)
+    sources = [loader.load(file_path) for file_path in file_paths]
+    assert [isinstance(source, mmap.mmap) for source in sources] == [True, True, False, False, False]
+    assert [bytes(source) for source in sources] == [b"int x;\n"] * 5
+    assert loader.mapped_file_count == 2
+    for source in sources[:2]:
+        source.close()
+
+
+def test_get_default_max_mapped_file_count():
+    resource = pytest.importorskip("resource")
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit != resource.RLIM_INFINITY:
+        assert get_default_max_mapped_file_count() == soft_limit // 2
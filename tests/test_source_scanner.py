@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from parser.source_scanner import IgnoreRule, SourceScanner, is_ignored, parse_ignore_rules
+
+
+def create_project(root, files):
+    for (relative_path, content) in files.items():
+        file_path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as project_file:
+            project_file.write(content)
+
+
+def get_relative_paths(root, file_paths):
+    return [os.path.relpath(file_path, root).replace(os.sep, "/") for file_path in file_paths]
+
+
+@pytest.mark.parametrize(
+    "pattern, base_path, relative_path, is_directory, is_matched",
+    [
+        ("*.o", "", "a/b/c.o", False, True),
+        ("*.o", "", "a/b/c.c", False, False),
+        ("build/", "", "a/build", True, True),
+        ("build/", "", "a/build", False, False),
+        ("/build", "", "build", True, True),
+        ("/build", "", "a/build", True, False),
+        ("doc/*.c", "", "doc/a.c", False, True),
+        ("doc/*.c", "", "doc/x/a.c", False, False),
+        ("doc/**/*.c", "", "doc/x/y/a.c", False, True),
+        ("**/test", "", "a/test", True, True),
+        ("gen_?.c", "src", "src/x/gen_1.c", False, True),
+        ("gen_?.c", "src", "lib/gen_1.c", False, False),
+        ("file[0-9].c", "", "file7.c", False, True),
+        ("file[!0-9].c", "", "file7.c", False, False),
+    ],
+)
+def test_ignore_rule_matches(pattern, base_path, relative_path, is_directory, is_matched):
+    assert IgnoreRule(pattern, base_path).matches(relative_path, is_directory) is is_matched
+
+
+def test_last_matching_rule_wins():
+    rules = parse_ignore_rules(["# generated files", "", "*.c", "!keep.c\n"], "")
+    assert len(rules) == 2
+    assert is_ignored(rules, "drop.c", False)
+    assert not is_ignored(rules, "keep.c", False)
+    assert not is_ignored(rules, "main.h", False)
+
+
+PROJECT = {
+    "main.c": "int main() {}\n",
+    "util.h": "int util();\n",
+    "README.md": "docs\n",
+    "src/large.c": "x" * 300,
+    "src/medium.c": "x" * 200,
+    "src/generated/gen.c": "gen\n",
+    "src/keep.c": "keep\n",
+    "src/drop.c": "drop\n",
+    "src/.gitignore": "generated/\n*.c\n!keep.c\n!large.c\n!medium.c\n",
+    "build/out.c": "out\n",
+    ".hidden/secret.c": "secret\n",
+    "Documentation/doc.c": "doc\n",
+}
+
+
+@pytest.mark.parametrize("walk_jobs", [1, 4])
+def test_scan(tmp_path, walk_jobs):
+    create_project(str(tmp_path), PROJECT)
+    with open(tmp_path / ".gitignore", "w") as gitignore_file:
+        gitignore_file.write("/build\n")
+    scanner = SourceScanner(["c", "h"], ["Documentation/"], walk_jobs=walk_jobs)
+    file_paths = scanner.scan(str(tmp_path))
+    assert get_relative_paths(str(tmp_path), file_paths) == [
+        "main.c", "src/keep.c", "src/large.c", "src/medium.c", "util.h"
+    ]
+    assert scanner.file_count == 5
+    assert scanner.byte_count == sum(os.path.getsize(file_path) for file_path in file_paths)
+
+
+def test_scan_without_gitignore(tmp_path):
+    create_project(str(tmp_path), PROJECT)
+    scanner = SourceScanner(["c"], respect_gitignore=False)
+    assert get_relative_paths(str(tmp_path), scanner.scan(str(tmp_path))) == [
+        "Documentation/doc.c",
+        "build/out.c",
+        "main.c",
+        "src/drop.c",
+        "src/generated/gen.c",
+        "src/keep.c",
+        "src/large.c",
+        "src/medium.c",
+    ]
+
+
+def test_scan_largest_first(tmp_path):
+    create_project(str(tmp_path), PROJECT)
+    file_paths = SourceScanner(["c", "h"], ["Documentation/", "build/"]).scan(str(tmp_path), is_largest_first=True)
+    assert get_relative_paths(str(tmp_path), file_paths)[:2] == ["src/large.c", "src/medium.c"]
+    sizes = [os.path.getsize(file_path) for file_path in file_paths]
+    assert sizes == sorted(sizes, reverse=True)
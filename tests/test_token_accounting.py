@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from model.token_accounting import (
+    BudgetExceededError,
+    TokenCounter,
+    TokenLedger,
+    get_key_label,
+    get_model_prices,
+    get_template_prefix,
+)
+
+
+class WhitespaceEncoding:
+    """
+    An encoding counting the words as tokens, which replaces the tokenizer of tiktoken without a download
+    """
+
+    def __init__(self):
+        self.encoded_texts = []
+
+    def encode_ordinary(self, text):
+        self.encoded_texts.append(text)
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.encoded_texts.extend(texts)
+        return [text.split() for text in texts]
+
+
+TEMPLATE = "Task: check the function below\nHere is the function:\n{function_code}\nAnswer: {answer_format}"
+
+
+def test_get_model_prices():
+    assert get_model_prices("gpt-4o-mini-2024-07-18") == (0.15, 0.6)
+    assert get_model_prices("gpt-4o") == (2.5, 10.0)
+    assert get_model_prices("gpt-4-0613") == (30.0, 60.0)
+    assert get_model_prices("unknown") == (0.0, 0.0)
+
+
+def test_get_template_prefix():
+    assert get_template_prefix(TEMPLATE) == "Task: check the function below\nHere is the function:\n"
+    assert get_template_prefix("{code} only") == ""
+    assert get_template_prefix("no fields") == "no fields"
+    assert get_template_prefix("escaped {{braces}} then {field}") == "escaped {braces} then "
+
+
+def test_get_key_label():
+    assert get_key_label("sk-1234567890abcd") == "...abcd"
+    assert get_key_label("short") == "key"
+
+
+def test_encoding_is_loaded_on_first_count():
+    encodings = []
+    token_counter = TokenCounter(lambda: encodings.append(WhitespaceEncoding()) or encodings[-1])
+    token_counter.add_template(TEMPLATE)
+    assert token_counter.count_prompts("system role", []) == []
+    assert encodings == []
+    assert token_counter.count("two words") == 2
+    assert token_counter.count("three more words") == 3
+    assert len(encodings) == 1
+
+
+def test_count_prompt_encodes_fixed_texts_once():
+    encoding = WhitespaceEncoding()
+    token_counter = TokenCounter(lambda: encoding)
+    token_counter.add_template(TEMPLATE)
+    prompts = [TEMPLATE.format(function_code=f"int f{index}() {{}}", answer_format="Yes/No") for index in range(3)]
+    counts = [token_counter.count_prompt("system role", prompt) for prompt in prompts]
+    # The whitespace between the prefix and the variable part separates words, so the counts are exact here
+    assert counts == [2 + len(prompt.split()) for prompt in prompts]
+    prefix = get_template_prefix(TEMPLATE)
+    assert encoding.encoded_texts.count(prefix) == 1
+    assert encoding.encoded_texts.count("system role") == 1
+    assert token_counter.count_prompts("system role", prompts) == counts
+    assert encoding.encoded_texts.count(prefix) == 1
+
+
+def test_split_prompt_matches_the_longest_prefix():
+    token_counter = TokenCounter(WhitespaceEncoding)
+    token_counter.add_prefix("Task: ")
+    token_counter.add_prefix("Task: check ")
+    token_counter.add_prefix("")
+    token_counter.add_prefix("Task: ")
+    assert token_counter.prefixes == ["Task: check ", "Task: "]
+    assert token_counter.split_prompt("Task: check this") == ("Task: check ", "this")
+    assert token_counter.split_prompt("Task: run") == ("Task: ", "run")
+    assert token_counter.split_prompt("Other") == ("", "Other")
+
+
+def test_fixed_counts_are_bounded():
+    token_counter = TokenCounter(WhitespaceEncoding, max_fixed_text_count=2)
+    for text in ["a", "b", "c"]:
+        token_counter.count_fixed(text)
+    assert list(token_counter.fixed_counts) == ["b", "c"]
+
+
+def test_ledger_records_per_scanner_model_and_key(tmp_path):
+    token_ledger = TokenLedger()
+    token_ledger.record("npd", "gpt-4o-mini", "...abcd", 1000000, 0)
+    token_ledger.record("npd", "gpt-4o-mini", "...abcd", 0, 1000000)
+    token_ledger.record("apiscan", "gpt-4o-mini", "...wxyz", 1000000, 1000000, is_batch=True)
+    rows = token_ledger.get_rows()
+    assert [(row["scanner"], row["key"], row["request_count"]) for row in rows] == [
+        ("apiscan", "...wxyz", 1),
+        ("npd", "...abcd", 2),
+    ]
+    assert rows[0]["cost"] == pytest.approx((0.15 + 0.6) * 0.5)
+    assert rows[1]["cost"] == pytest.approx(0.15 + 0.6)
+    assert token_ledger.total_tokens == 4000000
+    assert not token_ledger.is_exhausted()
+
+    ledger_path = str(tmp_path / "ledger.json")
+    token_ledger.save(ledger_path)
+    with open(ledger_path, "r") as ledger_file:
+        saved_ledger = json.load(ledger_file)
+    assert saved_ledger["total_cost"] == pytest.approx(token_ledger.total_cost)
+    assert len(saved_ledger["rows"]) == 2
+
+
+def test_ledger_budget():
+    token_ledger = TokenLedger(max_cost=1.0)
+    token_ledger.record("npd", "gpt-4o-mini", "key", 1000000, 1000000)
+    token_ledger.check_budget()
+    token_ledger.record("npd", "gpt-4o-mini", "key", 2000000, 0)
+    assert token_ledger.is_exhausted()
+    with pytest.raises(BudgetExceededError):
+        token_ledger.check_budget()
+
+    token_ledger = TokenLedger(max_tokens=10)
+    token_ledger.record("npd", "unknown", "key", 5, 4)
+    assert not token_ledger.is_exhausted()
+    token_ledger.record("npd", "unknown", "key", 1, 0)
+    assert token_ledger.is_exhausted()
+
+
+def test_llm_registers_the_template_prefixes():
+    from model.llm import LLM
+
+    llm = LLM("gpt-4o-mini", "key", 0.0, prompt_templates=[TEMPLATE, "{only_field}"])
+    assert llm.token_counter.prefixes == [get_template_prefix(TEMPLATE)]